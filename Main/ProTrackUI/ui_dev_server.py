@@ -18,18 +18,190 @@ PORT = 8080
 # WebSocket for live reload
 import json
 import hashlib
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
 from http.server import SimpleHTTPRequestHandler
 
+# Upper edges of the latency histogram buckets, in ms
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float('inf'))
+# Timing samples kept per measurement
+MAX_SAMPLES = 1000
+# The reload script's polling and the stats endpoints, left out of the request stats
+UNTIMED_PATHS = ('/reload-check', '/__stats', '/__stats/paint')
+
+class DevStats:
+    """Request and reload timings, shared by the HTTP handler and the file watcher"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.requests = {}
+        self.timings = {
+            'event_to_copy': deque(maxlen=MAX_SAMPLES),
+            'copy_to_reload': deque(maxlen=MAX_SAMPLES),
+            'reload_to_paint': deque(maxlen=MAX_SAMPLES),
+            'load_to_paint': deque(maxlen=MAX_SAMPLES),
+        }
+        self.first_unseen_copy = None
+        self.last_reload = None
+    
+    def record_request(self, path, status, size, seconds):
+        """Counts a served request against its path, without the query string"""
+        if path in UNTIMED_PATHS:
+            return
+        ms = seconds * 1000.0
+        with self.lock:
+            entry = self.requests.setdefault(path, {
+                'count': 0,
+                'errors': 0,
+                'bytes': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'histogram': [0] * len(LATENCY_BUCKETS_MS),
+            })
+            entry['count'] += 1
+            entry['errors'] += status >= 400
+            entry['bytes'] += size
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+            bucket = next(i for i, edge in enumerate(LATENCY_BUCKETS_MS) if ms <= edge)
+            entry['histogram'][bucket] += 1
+    
+    def record_copy(self, event_time):
+        """Called once a watcher event has been copied to the test folder"""
+        now = time.perf_counter()
+        with self.lock:
+            self.timings['event_to_copy'].append(now - event_time)
+            # The reload shows every copy since the last one, so time it from the oldest.
+            if self.first_unseen_copy is None:
+                self.first_unseen_copy = now
+    
+    def record_reload(self):
+        """Called when a client is told to reload"""
+        now = time.perf_counter()
+        with self.lock:
+            if self.first_unseen_copy is not None:
+                self.timings['copy_to_reload'].append(now - self.first_unseen_copy)
+                self.first_unseen_copy = None
+            self.last_reload = now
+    
+    def record_paint(self, load_ms):
+        """Called when a page reports its first paint, with its own navigation to paint time"""
+        now = time.perf_counter()
+        with self.lock:
+            if load_ms is not None:
+                self.timings['load_to_paint'].append(load_ms / 1000.0)
+            # Only the first page to paint after a reload was the one reloaded.
+            if self.last_reload is not None:
+                self.timings['reload_to_paint'].append(now - self.last_reload)
+                self.last_reload = None
+    
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {'count': 0}
+        ordered = sorted(samples)
+        def percentile(p):
+            return ordered[min(int(p * len(ordered)), len(ordered) - 1)] * 1000.0
+        return {
+            'count': len(ordered),
+            'mean_ms': sum(ordered) / len(ordered) * 1000.0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': ordered[-1] * 1000.0,
+        }
+    
+    def snapshot(self):
+        """Everything recorded so far, as served from /__stats"""
+        with self.lock:
+            requests = {}
+            for path, entry in sorted(self.requests.items()):
+                requests[path] = {
+                    'count': entry['count'],
+                    'errors': entry['errors'],
+                    'bytes': entry['bytes'],
+                    'mean_ms': entry['total_ms'] / entry['count'],
+                    'max_ms': entry['max_ms'],
+                    'histogram': {
+                        f'<={edge:g}ms' if edge != float('inf') else f'>{LATENCY_BUCKETS_MS[-2]:g}ms': n
+                        for edge, n in zip(LATENCY_BUCKETS_MS, entry['histogram'])
+                    },
+                }
+            return {
+                'uptime_s': time.perf_counter() - self.started,
+                'requests': requests,
+                'reload': {name: self._summary(samples) for name, samples in self.timings.items()},
+            }
+    
+    def print_summary(self):
+        """Prints the slowest paths and the reload timings"""
+        stats = self.snapshot()
+        print(f"\nServed {sum(e['count'] for e in stats['requests'].values())} requests "
+              f"in {stats['uptime_s']:.0f}s")
+        if stats['requests']:
+            slowest = sorted(stats['requests'].items(), key=lambda item: -item[1]['mean_ms'])[:10]
+            print(f"  {'path':<48}{'count':>7}{'KB':>9}{'mean ms':>9}{'max ms':>9}")
+            for path, entry in slowest:
+                print(f"  {path[-48:]:<48}{entry['count']:>7}{entry['bytes'] / 1024:>9.1f}"
+                      f"{entry['mean_ms']:>9.1f}{entry['max_ms']:>9.1f}")
+        for name, summary in stats['reload'].items():
+            if summary['count']:
+                print(f"  {name:<16} n={summary['count']:<5} mean {summary['mean_ms']:.0f}ms  "
+                      f"p95 {summary['p95_ms']:.0f}ms  max {summary['max_ms']:.0f}ms")
+
 class LiveReloadHandler(SimpleHTTPRequestHandler):
     """HTTP handler that injects live reload script"""
     
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+    
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'content-length':
+            self._size = int(value)
+        super().send_header(keyword, value)
+    
     def end_headers(self):
         # Add CORS headers
         self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
         self.send_header('Expires', '0')
         super().end_headers()
     
+    def _send_json(self, response):
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        content = json.dumps(response).encode('utf-8')
+        self.send_header('Content-Length', len(content))
+        self.end_headers()
+        self.wfile.write(content)
+    
     def do_GET(self):
+        # Time every request against its path
+        start = time.perf_counter()
+        self._status = 0
+        self._size = 0
+        try:
+            self._handle_get()
+        finally:
+            self.server.stats.record_request(
+                urlsplit(self.path).path, self._status, self._size, time.perf_counter() - start
+            )
+    
+    def _handle_get(self):
+        # Dev server stats, and paint reports from the reload script
+        url = urlsplit(self.path)
+        if url.path == '/__stats':
+            self._send_json(self.server.stats.snapshot())
+            return
+        if url.path == '/__stats/paint':
+            try:
+                load_ms = float(parse_qs(url.query)['ms'][0])
+            except (KeyError, ValueError):
+                load_ms = None
+            self.server.stats.record_paint(load_ms)
+            self._send_json({'ok': True})
+            return
+        
         # Inject live reload script into HTML files
         if self.path.endswith('.html') or self.path == '/':
             try:
@@ -55,6 +227,11 @@ class LiveReloadHandler(SimpleHTTPRequestHandler):
         }
     }, 1000);
 
+    // Report the first paint, so the server can time save to screen
+    requestAnimationFrame(() => requestAnimationFrame(() => {
+        fetch('/__stats/paint?ms=' + Math.round(performance.now())).catch(() => {});
+    }));
+
     let lastCheck = Date.now();
     setInterval(async () => {
         try {
@@ -91,13 +268,10 @@ class LiveReloadHandler(SimpleHTTPRequestHandler):
         if self.path.startswith('/reload-check'):
             response = {'reload': getattr(self.server, 'needs_reload', False)}
             self.server.needs_reload = False
+            if response['reload']:
+                self.server.stats.record_reload()
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            content = json.dumps(response).encode('utf-8')
-            self.send_header('Content-Length', len(content))
-            self.end_headers()
-            self.wfile.write(content)
+            self._send_json(response)
             return
         
         # Default behavior for other files
@@ -122,8 +296,9 @@ class SyncHandler(FileSystemEventHandler):
         self.last_modified[src_path] = mtime
         return True
     
-    def _sync_file(self, src_path, change_type):
+    def _sync_file(self, src_path, change_type, event_time=None):
         """Sync a single file to the test folder"""
+        event_time = event_time or time.perf_counter()
         try:
             rel_path = Path(src_path).relative_to(SOURCE_DIR)
             target_path = TEST_FOLDER / rel_path
@@ -137,6 +312,7 @@ class SyncHandler(FileSystemEventHandler):
                     else:
                         shutil.rmtree(target_path)
                     print(f"  → Deleted")
+                    self.server.stats.record_copy(event_time)
                     self.server.needs_reload = True
             
             elif change_type in ["Created", "Modified"]:
@@ -148,26 +324,31 @@ class SyncHandler(FileSystemEventHandler):
                     time.sleep(0.05)  # Brief delay to ensure file is ready
                     shutil.copy2(src_path, target_path)
                     print(f"  → {'Copied' if change_type == 'Created' else 'Updated'}")
+                    self.server.stats.record_copy(event_time)
                     self.server.needs_reload = True
         
         except Exception as e:
             print(f"  → Error: {e}")
     
     def on_created(self, event):
+        event_time = time.perf_counter()
         if not event.is_directory and self._should_sync(event.src_path):
-            self._sync_file(event.src_path, "Created")
+            self._sync_file(event.src_path, "Created", event_time)
     
     def on_modified(self, event):
+        event_time = time.perf_counter()
         if not event.is_directory and self._should_sync(event.src_path):
-            self._sync_file(event.src_path, "Modified")
+            self._sync_file(event.src_path, "Modified", event_time)
     
     def on_deleted(self, event):
-        self._sync_file(event.src_path, "Deleted")
+        event_time = time.perf_counter()
+        self._sync_file(event.src_path, "Deleted", event_time)
     
     def on_moved(self, event):
-        self._sync_file(event.src_path, "Deleted")
+        event_time = time.perf_counter()
+        self._sync_file(event.src_path, "Deleted", event_time)
         if not event.is_directory:
-            self._sync_file(event.dest_path, "Created")
+            self._sync_file(event.dest_path, "Created", event_time)
 
 def initial_sync():
     """Perform initial sync using shutil"""
@@ -199,7 +380,9 @@ def start_server(handler_class):
         needs_reload = False
     
     with ReusableTCPServer(("127.0.0.1", PORT), handler_class) as httpd:
+        httpd.stats = DevStats()
         print(f"Starting HTTP server at http://localhost:{PORT}")
+        print(f"Stats at http://localhost:{PORT}/__stats")
         print(f"Watching for changes in {SOURCE_DIR}...")
         print("Press Ctrl+C to stop\n")
         
@@ -215,6 +398,7 @@ def start_server(handler_class):
             print("\nStopping...")
             observer.stop()
             observer.join()
+            httpd.stats.print_summary()
             print("Stopped.")
 
 if __name__ == "__main__":
@@ -27,6 +27,7 @@ local AdvMoveMode = require("protrack.modes.advancedmovemode")
 
 local TrackPointGizmo = require("protrack.gizmo.trackpointgizmo")
 local TrackReferenceGizmo = require("protrack.gizmo.trackreferencegizmo")
+local Polyline = require("protrack.gizmo.polyline")
 
 local Cam = require("protrack.cam")
 local Datastore = require("protrack.datastore")
@@ -48,6 +49,8 @@ protrackManager.inCamera = false
 protrackManager.cameraIsHeartlineMode = false
 protrackManager.inputEventHandler = nil
 protrackManager.line = nil
+--- Draw the ride path in more detail near the camera.
+protrackManager.lineLevelOfDetail = false
 
 ---@type WorldAPIs_InputManager
 protrackManager.inputManagerAPI = nil
@@ -551,7 +554,13 @@ function protrackManager.NewWalk(self)
             datapoint.measurements[1].transform:ToWorldDir(Datastore.heartlineOffset)
         )
     end
-    self.line:SetPoints(tPoints)
+
+    -- One point per simulation step is far more than the line needs, so drop the ones it won't miss.
+    local lodOrigin = nil
+    if self.lineLevelOfDetail then
+        lodOrigin = api.transform.GetTransform(api.camera.GetMainCameraID()):GetPos()
+    end
+    self.line:SetPoints(Polyline.Decimate(tPoints, Polyline.TOLERANCE, lodOrigin))
 
     if self.inCamera then
         self.line:ClearPoints()
@@ -0,0 +1,125 @@
+local global   = _G
+local math     = global.math
+
+local Polyline = {}
+
+--- Largest distance in metres a dropped point may be from the line drawn instead.
+Polyline.TOLERANCE = 0.05
+--- Tolerance at the camera when level of detail is on.
+Polyline.LOD_NEAR_TOLERANCE = 0.005
+--- Distance from the camera in metres at which the tolerance reaches Polyline.TOLERANCE.
+Polyline.LOD_DISTANCE = 100
+
+--- Returns the squared distance from point i to the segment between points a and b.
+---@param xs number[]
+---@param ys number[]
+---@param zs number[]
+---@param i integer
+---@param a integer
+---@param b integer
+---@return number
+local function squaredDistanceToSegment(xs, ys, zs, i, a, b)
+    local ax, ay, az = xs[a], ys[a], zs[a]
+    local abx, aby, abz = xs[b] - ax, ys[b] - ay, zs[b] - az
+    local apx, apy, apz = xs[i] - ax, ys[i] - ay, zs[i] - az
+
+    local lengthSq = abx * abx + aby * aby + abz * abz
+    local t = 0
+    if lengthSq > 0 then
+        t = math.max(0, math.min(1, (apx * abx + apy * aby + apz * abz) / lengthSq))
+    end
+
+    local dx, dy, dz = apx - abx * t, apy - aby * t, apz - abz * t
+    return dx * dx + dy * dy + dz * dz
+end
+
+--- Returns the squared tolerance for every point. Points nearer lodOrigin get a tighter tolerance.
+---@param xs number[]
+---@param ys number[]
+---@param zs number[]
+---@param tolerance number
+---@param lodOrigin any? Vector3 to tighten the tolerance around, or nil for a constant tolerance.
+---@return number[]
+local function getSquaredTolerances(xs, ys, zs, tolerance, lodOrigin)
+    local tolerancesSq = {}
+    if lodOrigin == nil then
+        local toleranceSq = tolerance * tolerance
+        for i = 1, #xs do
+            tolerancesSq[i] = toleranceSq
+        end
+        return tolerancesSq
+    end
+
+    local ox, oy, oz = lodOrigin:GetX(), lodOrigin:GetY(), lodOrigin:GetZ()
+    local nearTolerance = math.min(Polyline.LOD_NEAR_TOLERANCE, tolerance)
+    for i = 1, #xs do
+        local dx, dy, dz = xs[i] - ox, ys[i] - oy, zs[i] - oz
+        local fraction = math.min(math.sqrt(dx * dx + dy * dy + dz * dz) / Polyline.LOD_DISTANCE, 1)
+        local pointTolerance = nearTolerance + (tolerance - nearTolerance) * fraction
+        tolerancesSq[i] = pointTolerance * pointTolerance
+    end
+    return tolerancesSq
+end
+
+--- Drops points that lie within tolerance of the line through their neighbours (Ramer-Douglas-Peucker).
+--- The first and last points are always kept.
+---@param tPoints any[] Vector3 points.
+---@param tolerance number? Largest distance a dropped point may be from the kept line, in metres.
+---@param lodOrigin any? Vector3, usually the camera, to tighten the tolerance around. nil to disable.
+---@return any[] points The kept points, in order.
+function Polyline.Decimate(tPoints, tolerance, lodOrigin)
+    tolerance = tolerance or Polyline.TOLERANCE
+    local numPoints = #tPoints
+    if numPoints <= 2 then
+        local copy = {}
+        for i = 1, numPoints do
+            copy[i] = tPoints[i]
+        end
+        return copy
+    end
+
+    -- Read the components once, rather than calling into Vector3 for every distance.
+    local xs, ys, zs = {}, {}, {}
+    for i = 1, numPoints do
+        local point = tPoints[i]
+        xs[i], ys[i], zs[i] = point:GetX(), point:GetY(), point:GetZ()
+    end
+    local tolerancesSq = getSquaredTolerances(xs, ys, zs, tolerance, lodOrigin)
+
+    local keep = { [1] = true, [numPoints] = true }
+
+    -- Explicit stack of spans to split, so long rides can't overflow the call stack.
+    local stack = { 1, numPoints }
+    local top = 2
+    while top > 0 do
+        local first, last = stack[top - 1], stack[top]
+        top = top - 2
+
+        local worstIndex = nil
+        local worstRatio = 1
+        for i = first + 1, last - 1 do
+            local ratio = squaredDistanceToSegment(xs, ys, zs, i, first, last) / tolerancesSq[i]
+            if ratio > worstRatio then
+                worstRatio = ratio
+                worstIndex = i
+            end
+        end
+
+        if worstIndex ~= nil then
+            keep[worstIndex] = true
+            stack[top + 1], stack[top + 2] = first, worstIndex
+            stack[top + 3], stack[top + 4] = worstIndex, last
+            top = top + 4
+        end
+    end
+
+    local kept = {}
+    for i = 1, numPoints do
+        if keep[i] then
+            kept[#kept + 1] = tPoints[i]
+        end
+    end
+    return kept
+end
+
+return Polyline
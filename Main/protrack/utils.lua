@@ -19,38 +19,95 @@ local Quaternion                = require("Quaternion")
 local Utils                     = {}
 Utils.CAM_OFFSET_FORWARD_ADJUST = 0.75
 
----Returns a crude upper bound on train size
+--- How closely train lengths are resolved, in metres.
+Utils.TRAIN_LENGTH_TOLERANCE    = 0.01
+--- Longest train length searched for, in metres.
+Utils.MAX_TRAIN_LENGTH          = 2048
+
+--- Train lengths already resolved this session, keyed by train type then number of cars.
+local trainLengthCache          = {}
+
+---Returns whether targetNumCars fit within length
+---@param worldApi WorldAPIs
+---@param trainType string
+---@param targetNumCars integer
+---@param length number
+---@return boolean
+local function carsFitInLength(worldApi, trainType, targetNumCars, length)
+    return worldApi.trackedrides:LimitNumberOfCarsByTrainLength(trainType, targetNumCars, length) == targetNumCars
+end
+
+---Returns a length the train fits in, and a shorter one it doesn't, by doubling.
 ---@param worldApi WorldAPIs
 ---@param trainType string
 ---@param targetNumCars integer
----@return number
-local function getUpperBoundOfTrainSize(worldApi, trainType, targetNumCars)
-    local currentNumCars = 0
-    local length = 0
-    while (currentNumCars ~= targetNumCars) do
-        currentNumCars = worldApi.trackedrides:LimitNumberOfCarsByTrainLength(trainType, targetNumCars, length)
-        length = length + 5
+---@return number? fits The shortest doubled length the cars fit in, nil if they don't fit in Utils.MAX_TRAIN_LENGTH.
+---@return number? short The length before it, which the cars don't fit in.
+local function getBoundsOfTrainSize(worldApi, trainType, targetNumCars)
+    local short = 0
+    local fits = 1
+    while not carsFitInLength(worldApi, trainType, targetNumCars, fits) do
+        if fits >= Utils.MAX_TRAIN_LENGTH then
+            logger:Info("Train length search hit the maximum length for " .. global.tostring(trainType))
+            return nil, nil
+        end
+        short = fits
+        fits = fits * 2
     end
-    return length
+    return fits, short
 end
 
+---Returns the train length to within Utils.TRAIN_LENGTH_TOLERANCE.
+---Like the old linear search, this is the longest length found that the cars don't fit in.
+---@param worldApi WorldAPIs
+---@param trainType string
+---@param targetNumCars integer
+---@return number? length nil if the cars don't fit in Utils.MAX_TRAIN_LENGTH.
+local function getTrainSize(worldApi, trainType, targetNumCars)
+    local fits, short = getBoundsOfTrainSize(worldApi, trainType, targetNumCars)
+    if fits == nil then
+        return nil
+    end
+    while fits - short > Utils.TRAIN_LENGTH_TOLERANCE do
+        local middle = (fits + short) / 2
+        if carsFitInLength(worldApi, trainType, targetNumCars, middle) then
+            fits = middle
+        else
+            short = middle
+        end
+    end
+    return short
+end
 
----Returns a reasonably accurate lower bound on train size
+---Returns the length of a train, cached per train type and number of cars.
+---Returns nil, without caching, when the cars don't fit in Utils.MAX_TRAIN_LENGTH.
 ---@param worldApi WorldAPIs
 ---@param trainType string
 ---@param targetNumCars integer
----@param startingLength number
----@return number
-local function getLowerBoundOfTrainSize(worldApi, trainType, targetNumCars, startingLength)
-    local currentNumCars = targetNumCars
-    local length = startingLength
-    while (targetNumCars == currentNumCars) do
-        length = length - 0.1
-        currentNumCars = worldApi.trackedrides:LimitNumberOfCarsByTrainLength(trainType, currentNumCars, length)
+---@return number?
+function Utils.GetTrainLength(worldApi, trainType, targetNumCars)
+    local typeCache = trainLengthCache[trainType]
+    if typeCache == nil then
+        typeCache = {}
+        trainLengthCache[trainType] = typeCache
+    end
+
+    local length = typeCache[targetNumCars]
+    if length == nil then
+        length = getTrainSize(worldApi, trainType, targetNumCars)
+        if length == nil then
+            return nil
+        end
+        typeCache[targetNumCars] = length
     end
     return length
 end
 
+--- Forgets all cached train lengths.
+function Utils.ClearTrainLengthCache()
+    trainLengthCache = {}
+end
+
 --- Returns the current track origin data of a ride.
 ---@param rideID table The entity ID of the ride.
 ---@return TrackOrigin?
@@ -72,8 +129,10 @@ function Utils.GetFirstCarData(rideID)
     local _, max = api.track.GetMinMaxCarsPerTrain(rideHolder)
     numTrainCars = global.math.min(numTrainCars, max)
 
-    local upperBound = getUpperBoundOfTrainSize(worldAPI, sTrainType, numTrainCars)
-    local trainLength = getLowerBoundOfTrainSize(worldAPI, sTrainType, numTrainCars, upperBound)
+    local trainLength = Utils.GetTrainLength(worldAPI, sTrainType, numTrainCars)
+    if trainLength == nil then
+        return nil
+    end
 
     local trainID = tTrains[1]
     if trainID ~= nil and trainID ~= 0 then
@@ -181,6 +240,9 @@ function Utils.IsTrackOriginValid(trackOrigin)
     if trackOrigin.gforce == nil then
         return false
     end
+    if trackOrigin.trainLength == nil then
+        return false
+    end
     if trackOrigin.transform:GetLocationTransform() == nil then
         return false
     end
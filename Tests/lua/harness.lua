@@ -0,0 +1,58 @@
+-- Minimal stand-ins for the game environment, so mod modules can be loaded with plain Lua.
+-- Run tests from the repository root, e.g. `lua Tests/lua/test_trainlength.lua`.
+
+local Harness = {}
+
+package.path = "Main/?.lua;Tests/lua/?.lua;" .. package.path
+
+local function stubLogger()
+    local logger = {}
+    function logger:Info(...) end
+    function logger:Warn(...) end
+    function logger:Error(...) end
+    function logger:Debug(...) end
+    return logger
+end
+
+package.preload["forgeutils.logger"] = function()
+    return {
+        Get = function()
+            return stubLogger()
+        end
+    }
+end
+
+-- Only loaded, never called, by the tests that use the harness.
+for _, name in ipairs({ "Vector3", "TransformQ", "Quaternion" }) do
+    if package.preload[name] == nil then
+        package.preload[name] = function()
+            return {}
+        end
+    end
+end
+
+local failures = 0
+local passes = 0
+
+--- Checks a condition, printing the result.
+---@param condition boolean
+---@param message string
+function Harness.Check(condition, message)
+    if condition then
+        passes = passes + 1
+        print("PASS " .. message)
+    else
+        failures = failures + 1
+        print("FAIL " .. message)
+    end
+end
+
+--- Prints a summary and exits non zero if anything failed.
+function Harness.Finish()
+    print(string.format("%d passed, %d failed", passes, failures))
+    if failures > 0 then
+        os.exit(1)
+    end
+end
+
+return Harness
@@ -0,0 +1,149 @@
+-- Tests Polyline.Decimate: segment counts, and that no dropped point strays
+-- further than the tolerance from the line drawn instead.
+--
+-- usage: lua Tests/lua/test_polyline.lua
+
+local Harness = dofile("Tests/lua/harness.lua")
+local Polyline = require("protrack.gizmo.polyline")
+
+--- Stub Vector3, only what Decimate reads.
+local function vec(x, y, z)
+    return {
+        x = x,
+        y = y,
+        z = z,
+        GetX = function(self) return self.x end,
+        GetY = function(self) return self.y end,
+        GetZ = function(self) return self.z end,
+    }
+end
+
+local function distanceToSegment(p, a, b)
+    local abx, aby, abz = b.x - a.x, b.y - a.y, b.z - a.z
+    local apx, apy, apz = p.x - a.x, p.y - a.y, p.z - a.z
+    local lengthSq = abx * abx + aby * aby + abz * abz
+    local t = 0
+    if lengthSq > 0 then
+        t = math.max(0, math.min(1, (apx * abx + apy * aby + apz * abz) / lengthSq))
+    end
+    local dx, dy, dz = apx - abx * t, apy - aby * t, apz - abz * t
+    return math.sqrt(dx * dx + dy * dy + dz * dz)
+end
+
+--- Checks the kept points are an ordered subset including both ends, and
+--- returns the largest ratio of deviation to the allowed tolerance.
+---@param points table[]
+---@param kept table[]
+---@param toleranceAt fun(point: table): number
+---@return boolean ordered, number worstRatio
+local function measure(points, kept, toleranceAt)
+    local index = {}
+    for i, point in ipairs(points) do
+        index[point] = i
+    end
+
+    local ordered = kept[1] == points[1] and kept[#kept] == points[#points]
+    local worstRatio = 0
+    for k = 1, #kept - 1 do
+        local first, last = index[kept[k]], index[kept[k + 1]]
+        if first == nil or last == nil or last <= first then
+            return false, math.huge
+        end
+        for i = first + 1, last - 1 do
+            local ratio = distanceToSegment(points[i], kept[k], kept[k + 1]) / toleranceAt(points[i])
+            worstRatio = math.max(worstRatio, ratio)
+        end
+    end
+    return ordered, worstRatio
+end
+
+local function constant(tolerance)
+    return function()
+        return tolerance
+    end
+end
+
+--- A ride like path sampled every 1/30 s at 20 m/s: straight, a banked turn, a hill and a helix.
+local function ridePath()
+    local points = {}
+    local step = 20 / 30
+    local x, y, z, heading = 0, 0, 0, 0
+    for i = 0, 1500 do
+        local s = i * step
+        if s > 100 and s < 250 then
+            heading = heading + step / 40
+        end
+        if s >= 250 and s < 400 then
+            y = 15 * (1 - math.cos((s - 250) / 150 * 2 * math.pi))
+        end
+        if s >= 400 and s < 700 then
+            heading = heading - step / 25
+            y = y + step * 0.05
+        end
+        x = x + math.sin(heading) * step
+        z = z + math.cos(heading) * step
+        points[#points + 1] = vec(x, y, z)
+    end
+    return points
+end
+
+-- Degenerate inputs
+Harness.Check(#Polyline.Decimate({}) == 0, "empty input gives no points")
+local single = { vec(1, 2, 3) }
+Harness.Check(#Polyline.Decimate(single) == 1, "single point is kept")
+local pair = { vec(0, 0, 0), vec(1, 0, 0) }
+local pairKept = Polyline.Decimate(pair)
+Harness.Check(#pairKept == 2 and pairKept ~= pair, "two points are copied")
+
+-- A straight line collapses to one segment.
+local line = {}
+for i = 0, 999 do
+    line[#line + 1] = vec(i * 0.5, i * 0.1, -i * 0.2)
+end
+Harness.Check(#Polyline.Decimate(line, 0.01) == 2, "straight line is one segment")
+
+-- Repeated points must not divide by zero.
+local repeated = { vec(0, 0, 0), vec(0, 0, 0), vec(0, 0, 0), vec(0, 0, 0) }
+Harness.Check(#Polyline.Decimate(repeated, 0.01) == 2, "repeated points are one segment")
+
+-- A closed loop returns to its start, so the chord between the ends has no length.
+local loop = {}
+for i = 0, 360 do
+    local angle = math.rad(i)
+    loop[#loop + 1] = vec(10 * math.cos(angle), 0, 10 * math.sin(angle))
+end
+local loopKept = Polyline.Decimate(loop, 0.05)
+local loopOrdered, loopRatio = measure(loop, loopKept, constant(0.05))
+Harness.Check(loopOrdered and loopRatio <= 1, string.format("closed loop within tolerance (%.3f)", loopRatio))
+
+-- Segment counts and deviation on a ride for a range of tolerances.
+local ride = ridePath()
+local lastCount = math.huge
+for _, tolerance in ipairs({ 0.005, 0.01, 0.05, 0.2, 1 }) do
+    local kept = Polyline.Decimate(ride, tolerance)
+    local ordered, ratio = measure(ride, kept, constant(tolerance))
+    Harness.Check(ordered, string.format("%gm keeps both ends in order", tolerance))
+    Harness.Check(ratio <= 1, string.format("%gm max deviation %.4fm", tolerance, ratio * tolerance))
+    Harness.Check(#kept <= lastCount, string.format("%gm gives %d of %d points", tolerance, #kept, #ride))
+    lastCount = #kept
+end
+Harness.Check(#Polyline.Decimate(ride) < #ride / 5, "default tolerance drops most points")
+
+-- Level of detail: tighter near the origin, never looser than the tolerance.
+local origin = ride[math.floor(#ride / 2)]
+local lodKept = Polyline.Decimate(ride, Polyline.TOLERANCE, origin)
+local plainKept = Polyline.Decimate(ride, Polyline.TOLERANCE)
+local lodOrdered, lodRatio = measure(ride, lodKept, function(point)
+    local dx, dy, dz = point.x - origin.x, point.y - origin.y, point.z - origin.z
+    local fraction = math.min(math.sqrt(dx * dx + dy * dy + dz * dz) / Polyline.LOD_DISTANCE, 1)
+    return Polyline.LOD_NEAR_TOLERANCE + (Polyline.TOLERANCE - Polyline.LOD_NEAR_TOLERANCE) * fraction
+end)
+Harness.Check(lodOrdered and lodRatio <= 1, string.format("level of detail within its tolerance (%.3f)", lodRatio))
+Harness.Check(
+    #lodKept > #plainKept,
+    string.format("level of detail keeps more points (%d vs %d)", #lodKept, #plainKept)
+)
+local _, lodFarRatio = measure(ride, lodKept, constant(Polyline.TOLERANCE))
+Harness.Check(lodFarRatio <= 1, "level of detail within the plain tolerance")
+
+Harness.Finish()
@@ -0,0 +1,118 @@
+-- Tests Utils.GetTrainLength against the linear search it replaced, counting
+-- LimitNumberOfCarsByTrainLength calls.
+--
+-- usage: lua Tests/lua/test_trainlength.lua
+
+local Harness = dofile("Tests/lua/harness.lua")
+local Utils = require("protrack.utils")
+
+--- Train types as (first car length, following car length), in metres.
+local trainTypes = {
+    Compact = { 3.1, 2.4 },
+    Wooden = { 4.6, 2.9 },
+    Launched = { 5.35, 3.75 },
+}
+
+--- Stub worldApi, counting probes.
+local probes = 0
+local worldApi = {
+    trackedrides = {}
+}
+
+function worldApi.trackedrides:LimitNumberOfCarsByTrainLength(trainType, numCars, length)
+    probes = probes + 1
+    local sizes = trainTypes[trainType]
+    if length < sizes[1] then
+        return 0
+    end
+    return math.min(numCars, 1 + math.floor((length - sizes[1]) / sizes[2]))
+end
+
+--- The true length of numCars cars.
+local function trueLength(trainType, numCars)
+    local sizes = trainTypes[trainType]
+    return sizes[1] + (numCars - 1) * sizes[2]
+end
+
+--- The search GetFirstCarData used before, kept here for comparison.
+local function linearSearch(trainType, targetNumCars)
+    local currentNumCars = 0
+    local length = 0
+    while (currentNumCars ~= targetNumCars) do
+        currentNumCars = worldApi.trackedrides:LimitNumberOfCarsByTrainLength(trainType, targetNumCars, length)
+        length = length + 5
+    end
+
+    currentNumCars = targetNumCars
+    while (targetNumCars == currentNumCars) do
+        length = length - 0.1
+        currentNumCars = worldApi.trackedrides:LimitNumberOfCarsByTrainLength(trainType, currentNumCars, length)
+    end
+    return length
+end
+
+local totalLinear = 0
+local totalSearch = 0
+print(string.format("%-10s %5s %10s %8s %10s %8s", "train", "cars", "linear", "probes", "search", "probes"))
+
+for trainType, _ in pairs(trainTypes) do
+    for _, numCars in ipairs({ 1, 2, 4, 7, 12, 24, 40 }) do
+        probes = 0
+        local linear = linearSearch(trainType, numCars)
+        local linearProbes = probes
+
+        probes = 0
+        local length = Utils.GetTrainLength(worldApi, trainType, numCars)
+        local searchProbes = probes
+
+        totalLinear = totalLinear + linearProbes
+        totalSearch = totalSearch + searchProbes
+        print(string.format("%-10s %5d %10.3f %8d %10.3f %8d", trainType, numCars, linear, linearProbes, length,
+            searchProbes))
+
+        local expected = trueLength(trainType, numCars)
+        Harness.Check(
+            length < expected and expected - length <= Utils.TRAIN_LENGTH_TOLERANCE,
+            string.format("%s x%d resolves just under %.3fm", trainType, numCars, expected)
+        )
+        Harness.Check(
+            math.abs(length - linear) <= 0.1 + Utils.TRAIN_LENGTH_TOLERANCE,
+            string.format("%s x%d matches the linear search", trainType, numCars)
+        )
+
+        probes = 0
+        local cached = Utils.GetTrainLength(worldApi, trainType, numCars)
+        Harness.Check(probes == 0 and cached == length, string.format("%s x%d is cached", trainType, numCars))
+    end
+end
+
+print(string.format("Probes: linear %d, search %d (%.1fx fewer)", totalLinear, totalSearch, totalLinear / totalSearch))
+Harness.Check(totalSearch < totalLinear, "search uses fewer probes")
+
+-- Cache is per train type and number of cars.
+Utils.ClearTrainLengthCache()
+probes = 0
+Utils.GetTrainLength(worldApi, "Compact", 4)
+Harness.Check(probes > 0, "cleared cache probes again")
+probes = 0
+Utils.GetTrainLength(worldApi, "Compact", 5)
+Harness.Check(probes > 0, "other car counts are resolved separately")
+
+-- A tighter tolerance costs a few more probes.
+Utils.ClearTrainLengthCache()
+Utils.TRAIN_LENGTH_TOLERANCE = 0.001
+local length = Utils.GetTrainLength(worldApi, "Wooden", 12)
+local expected = trueLength("Wooden", 12)
+Harness.Check(expected - length <= 0.001 and length < expected, "tolerance is configurable")
+
+-- A car count that can never fit returns nil, and isn't cached.
+Utils.ClearTrainLengthCache()
+probes = 0
+local unreachable = Utils.GetTrainLength(worldApi, "Launched", 1000)
+Harness.Check(probes < 100, "unreachable car counts stop at the maximum length")
+Harness.Check(unreachable == nil, "unreachable car counts have no length")
+probes = 0
+Utils.GetTrainLength(worldApi, "Launched", 1000)
+Harness.Check(probes > 0, "unreachable car counts aren't cached")
+
+Harness.Finish()
@@ -0,0 +1,7 @@
+# Puts protracktools on the path, so the tests run from the repository root
+# with `python -m pytest Tests/python`.
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Tools"))
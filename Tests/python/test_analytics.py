@@ -0,0 +1,70 @@
+"""
+Run detection on stacks of rides, checked column by column against single rides.
+"""
+
+import numpy as np
+
+from protracktools import analytics
+
+TIME_DELTA = 0.1
+
+
+def vert_stack():
+    """ Three (T,) vertical G traces side by side, with airtime touching both ends of some """
+    return np.array([
+        [-0.5, 1.0, 1.0],
+        [-0.2, -0.1, 1.0],
+        [1.0, -0.3, 1.0],
+        [1.0, 1.0, -0.9],
+        [-1.5, 1.0, 1.0],
+        [-0.1, 1.0, -0.2],
+        [-0.4, -0.6, -0.2],
+    ])
+
+
+def test_runs_per_column():
+    starts, ends, columns = analytics.runs(vert_stack() < 0.0)
+
+    np.testing.assert_array_equal(columns, [0, 0, 1, 1, 2, 2])
+    np.testing.assert_array_equal(starts, [0, 4, 1, 6, 3, 5])
+    np.testing.assert_array_equal(ends, [2, 7, 3, 7, 4, 7])
+
+
+def test_airtime_segments_stack_matches_columns():
+    vert = vert_stack()
+    stacked = analytics.airtime_segments(vert, TIME_DELTA, min_duration=0.15)
+
+    for column in range(vert.shape[1]):
+        single = analytics.airtime_segments(vert[:, column], TIME_DELTA, min_duration=0.15)
+        assert (single["column"] == 0).all()
+        ours = stacked[stacked["column"] == column]
+        for field in ("start", "end", "duration", "min_g", "g_seconds"):
+            np.testing.assert_allclose(ours[field], single[field])
+
+    # The short dip dropped from the end of column 1 is left out of the segment before it.
+    np.testing.assert_allclose(stacked["min_g"], [-0.5, -1.5, -0.3, -0.2])
+    np.testing.assert_allclose(stacked["g_seconds"], [0.07, 0.2, 0.04, 0.04])
+
+
+def test_exceedance_durations_stack():
+    vert = vert_stack()
+    stacked = analytics.exceedance_durations(vert.reshape(len(vert), 3, 1), TIME_DELTA, lower=-0.25)
+
+    np.testing.assert_array_equal(stacked["column"], [0, 0, 0, 1, 1, 2])
+    np.testing.assert_allclose(stacked["duration"], [0.1, 0.1, 0.1, 0.1, 0.1, 0.1])
+
+
+def test_centred_mean_keeps_jerk_peaks_in_place():
+    # A symmetric G pulse centred on sample 50: jerk peaks either side of it, the same distance away.
+    t = np.arange(101)
+    g = np.exp(-0.5 * ((t - 50) / 6.0) ** 2)
+
+    g_jerk = analytics.jerk(analytics.centred_mean(g, 8), TIME_DELTA)
+    assert np.argmax(g_jerk) + np.argmin(g_jerk) == 100
+    # A trailing window lags them by about half its length.
+    g_jerk = analytics.jerk(analytics.windowed_mean(g, 8), TIME_DELTA)
+    assert np.argmax(g_jerk) + np.argmin(g_jerk) >= 106
+
+    # Lines pass through unchanged away from the ends, and (T, ...) stacks smooth per column.
+    ramp = np.stack((t, -2.0 * t), axis=-1).astype(np.float64)
+    np.testing.assert_allclose(analytics.centred_mean(ramp, 9)[4:-4], ramp[4:-4])
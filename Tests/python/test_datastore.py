@@ -0,0 +1,131 @@
+"""
+Datastore sampling against a line for line port of Main/protrack/datastore.lua.
+"""
+
+import math
+
+import numpy as np
+
+from protracktools.datastore import Datastore
+from protracktools.measurements import TrainMeasurements, SIMULATION_DELTA
+
+
+def make_ride(num_samples=6, num_followers=2, timestamps=None):
+    rng = np.random.default_rng(3)
+    orientation = rng.normal(size=(num_samples, num_followers, 4))
+    orientation /= np.linalg.norm(orientation, axis=-1, keepdims=True)
+    return TrainMeasurements(
+        rng.uniform(5.0, 20.0, num_samples),
+        rng.normal(size=(num_samples, num_followers, 3)),
+        rng.normal(size=(num_samples, num_followers, 3)),
+        orientation,
+        timestamps=timestamps,
+    )
+
+
+def lua_sample(ride, float_index, offset_id):
+    """ Datastore.SampleDatapointAtFloatIndex, with Lua's 1 based datapoints """
+    num_pts = len(ride)
+    floor = math.floor(float_index)
+    fractional_lerp = float_index - floor
+
+    from_idx = min(floor + 1, num_pts)
+    to_idx = min(from_idx + 1, num_pts)
+
+    def lerp(values):
+        a = values[from_idx - 1]
+        b = values[to_idx - 1]
+        return a + (b - a) * fractional_lerp
+
+    return lerp(ride.g[:, offset_id]), lerp(ride.position[:, offset_id]), lerp(ride.velocity)
+
+
+def quaternion_multiply(a, b):
+    ax, ay, az, aw = a
+    bx, by, bz, bw = b
+    return np.array([
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+        aw * bw - ax * bx - ay * by - az * bz,
+    ])
+
+
+def reference_slerp(a, b, t):
+    """ Quaternion.SLerp as a * (a^-1 b)^t, turning b to a's hemisphere for the shortest arc """
+    if np.dot(a, b) < 0.0:
+        b = -b
+    relative = quaternion_multiply(a * [-1.0, -1.0, -1.0, 1.0], b)
+    half_angle = math.acos(min(relative[3], 1.0))
+    if half_angle < 1e-9:
+        return a
+    axis = relative[:3] / math.sin(half_angle)
+    step = np.append(axis * math.sin(half_angle * t), math.cos(half_angle * t))
+    return quaternion_multiply(a, step)
+
+
+def axis_angle(axis, angle):
+    axis = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    return np.append(axis * math.sin(0.5 * angle), math.cos(0.5 * angle))
+
+
+def lua_float_index_for_time(time):
+    """ Datastore.GetFloatIndexForTime """
+    return time / SIMULATION_DELTA
+
+
+def test_float_index_sampling_matches_lua():
+    ride = make_ride()
+    datastore = Datastore.from_measurements(ride)
+    float_indices = [0.0, 0.25, 1.0, 2.5, 3.999, 4.0, 4.5, 5.0, 5.75, 9.0]
+
+    samples = datastore.sample_at_float_indices(float_indices)
+    for i, float_index in enumerate(float_indices):
+        for offset_id in range(ride.num_followers):
+            g, position, speed = lua_sample(ride, float_index, offset_id)
+            np.testing.assert_allclose(samples["g"][i, offset_id], g)
+            np.testing.assert_allclose(samples["position"][i, offset_id], position)
+            np.testing.assert_allclose(samples["speed"][i, offset_id], speed)
+
+            from_idx = min(math.floor(float_index), len(ride) - 1)
+            to_idx = min(from_idx + 1, len(ride) - 1)
+            orientation = reference_slerp(ride.orientation[from_idx, offset_id], ride.orientation[to_idx, offset_id],
+                                          float_index - math.floor(float_index))
+            np.testing.assert_allclose(samples["orientation"][i, offset_id], orientation, atol=1e-9)
+
+
+def test_time_lookups_match_lua():
+    ride = make_ride()
+    datastore = Datastore.from_measurements(ride)
+    times = np.array([0.0, 0.01, SIMULATION_DELTA, 0.1, 0.19, 0.5])
+
+    np.testing.assert_allclose(datastore.get_float_index_for_time(times), lua_float_index_for_time(times))
+    np.testing.assert_array_equal(datastore.get_floor_index_for_time(times),
+                                  [math.floor(lua_float_index_for_time(t)) for t in times])
+    np.testing.assert_allclose(datastore.get_time_for_float_index(lua_float_index_for_time(times)), times)
+    assert datastore.get_time_length() == len(ride) * SIMULATION_DELTA
+
+
+def test_timestamps_on_the_fixed_grid_sample_the_same():
+    fixed = make_ride()
+    stamped = make_ride(timestamps=np.arange(len(fixed)) * SIMULATION_DELTA)
+    times = np.linspace(0.0, 0.3, 37)
+
+    expected = Datastore.from_measurements(fixed).sample_at_times(times)
+    samples = Datastore.from_measurements(stamped).sample_at_times(times)
+    for field in ("g", "position", "orientation", "speed"):
+        np.testing.assert_allclose(samples[field], expected[field], atol=1e-12)
+
+
+def test_orientation_takes_the_short_arc():
+    # The second quaternion is the negative of a 60 degree turn, the same rotation the long way round.
+    orientation = np.array([axis_angle([0.0, 1.0, 0.0], 0.0), -axis_angle([0.0, 1.0, 0.0], math.radians(60.0))])
+    ride = make_ride(num_samples=2, num_followers=1)
+    ride.orientation[:, 0] = orientation
+    assert np.dot(orientation[0], orientation[1]) < 0.0
+
+    samples = Datastore.from_measurements(ride).sample_at_float_indices([0.25, 0.5, 0.75])
+    for i, t in enumerate((0.25, 0.5, 0.75)):
+        expected = axis_angle([0.0, 1.0, 0.0], math.radians(60.0 * t))
+        np.testing.assert_allclose(samples["orientation"][i, 0], expected, atol=1e-9)
+        np.testing.assert_allclose(reference_slerp(orientation[0], orientation[1], t), expected, atol=1e-9)
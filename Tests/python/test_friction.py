@@ -0,0 +1,86 @@
+"""
+Broadcast speed decay against a scalar port of StepVelocity and the WalkTrack loop.
+"""
+
+import numpy as np
+
+from protracktools.friction import (
+    STATEMENT_NAME,
+    STATEMENTS_PATH,
+    Element,
+    load_friction,
+    load_prepared_statements,
+    open_trains,
+    speed_decay,
+)
+from protracktools.walk import FrictionValues
+
+TRAINS_CSV = """TrainID,StaticFriction,AirResistance,DynamicFriction
+Compact,0.01,2.0,0.012
+Wooden,0.02,6.0,0.02
+"""
+
+
+def lua_walk(velocity, forward_y, g_length, static, air, dynamic, multiplier, time_step):
+    """ Utils.WalkTrack's loop over StepVelocity, on a constant element. Returns step distances, speeds, break-even """
+    distance = 0.0
+    distances = [distance]
+    speeds = [velocity]
+    while velocity > 0.0:
+        slope_accel = 9.81 * -forward_y
+        g_drag_multiplier = min(g_length, 1.0)
+        air_resist = 0.5 * 1.225 * (velocity * velocity) * air
+        friction_accel = (dynamic * g_drag_multiplier * 9.81 + air_resist) * multiplier
+        next_velocity = velocity + (slope_accel - friction_accel) * time_step
+        if next_velocity < 0.0:
+            # Where the lerp over the step that would go below zero reaches zero.
+            return distances, speeds, distance + velocity * time_step * velocity / (velocity - next_velocity)
+
+        distance += velocity * time_step
+        velocity = next_velocity
+        distances.append(distance)
+        speeds.append(velocity)
+    return distances, speeds, distance
+
+
+def test_speed_decay_matches_scalar_loop():
+    friction = FrictionValues(np.array([0.01, 0.02]), np.array([5e-4, 1.5e-3]), np.array([0.012, 0.02]))
+    multipliers = [0.5, 1.0, 2.0]
+    elements = [Element("flat", 0.0, 1.0), Element("airtime", 0.0, 0.3), Element("climb", 10.0, 1.0)]
+    entry_speeds = [8.0, 20.0]
+    time_step = 1.0 / 30.0
+
+    result = speed_decay(friction, multipliers, elements, entry_speeds, max_length=60.0, resolution=0.5,
+                         time_step=time_step)
+
+    for t in range(2):
+        for m, multiplier in enumerate(multipliers):
+            for e, element in enumerate(elements):
+                for v, speed in enumerate(entry_speeds):
+                    distances, speeds, break_even = lua_walk(
+                        speed, element.forward_y, element.g, friction.static_friction[t], friction.air_resistance[t],
+                        friction.dynamic_friction[t], multiplier, time_step
+                    )
+                    # The stalling step ends at zero speed at the break-even point.
+                    distances = distances + [break_even]
+                    speeds = speeds + [0.0]
+                    reached = result.distances <= break_even
+                    expected = np.where(reached, np.interp(result.distances, distances, speeds), np.nan)
+
+                    where = f"train {t}, multiplier {multiplier}, {element.name}, {speed}m/s"
+                    np.testing.assert_allclose(result.speeds[t, m, e, v], expected, atol=1e-9, err_msg=where)
+                    if break_even <= 60.0:
+                        np.testing.assert_allclose(result.break_even[t, m, e, v], break_even, err_msg=where)
+
+
+def test_train_masses_scale_air_resistance(tmp_path):
+    path = tmp_path / "Trains.csv"
+    path.write_text(TRAINS_CSV, encoding="utf-8")
+    statement = load_prepared_statements(STATEMENTS_PATH)[STATEMENT_NAME]
+
+    train_ids, friction, masses = load_friction(open_trains(path), statement, 4000.0, {"Wooden": 8000.0})
+
+    assert train_ids == ["Compact", "Wooden"]
+    np.testing.assert_array_equal(masses, [4000.0, 8000.0])
+    np.testing.assert_allclose(friction.air_resistance, [2.0 / 4000.0, 6.0 / 8000.0])
+    np.testing.assert_allclose(friction.dynamic_friction, [0.012, 0.02])
@@ -0,0 +1,90 @@
+"""
+Round trips through fvdsolve: build a path with step_point, solve for it,
+and check the fitted profile lands back on it.
+"""
+
+import numpy as np
+import pytest
+
+from protracktools import fvd, fvdsolve
+from protracktools.fvd import FvdPoint, step_point
+from protracktools.measurements import TrainMeasurements
+
+TIME_STEP = fvdsolve.DEFAULT_TIME_STEP
+
+
+def crest_g(t):
+    """ Extra vertical G: pull up, climb, push over a slow crest, dive, pull out """
+    if t < 1.0:
+        return 1.5 * np.sin(np.pi * t)
+    if 2.0 <= t < 4.5:
+        return -1.2 * np.sin(np.pi * (t - 2.0) / 2.5)
+    if 5.5 <= t < 6.5:
+        return 1.5 * np.sin(np.pi * (t - 5.5))
+    return 0.0
+
+
+def build_path(speed, roll_rate, heartline_offset):
+    """
+    A path from step_point that rolls one way then the other over a slow crest.
+    User G is taken relative to gravity, so only crest_g bends the path.
+
+    Args:
+        roll_rate: Peak roll rate over the crest, in rad / s.
+
+    Returns:
+        (centres, ups, profile)
+    """
+    point = FvdPoint.start(np.zeros(3), fvd.FORWARD, fvd.UP, speed, heartline_offset)
+    centres = [point.centre(heartline_offset)]
+    ups = [point.up]
+    profile = []
+    for i in range(int(8.5 / TIME_STEP)):
+        t = i * TIME_STEP
+        roll = 0.0
+        if 2.0 <= t < 4.5:
+            roll = roll_rate * np.sin(2.0 * np.pi * (t - 2.0) / 2.5) / float(point.velo)
+        lat_g = point.right[1]
+        vert_g = point.up[1] + crest_g(t)
+        profile.append((lat_g, vert_g, roll))
+        point = step_point(point, lat_g, vert_g, np.float64(roll), heartline_offset, TIME_STEP)
+        centres.append(point.centre(heartline_offset))
+        ups.append(point.up)
+    return np.array(centres), np.array(ups), np.array(profile)
+
+
+@pytest.mark.parametrize("heartline_offset", [0.0, 1.1])
+@pytest.mark.parametrize("roll_rate", [0.5, 1.0])
+def test_round_trip(roll_rate, heartline_offset):
+    speed = 15.0
+    centres, ups, profile = build_path(speed, roll_rate, heartline_offset)
+
+    fit = fvdsolve.solve(centres, speed, ups, heartline_offset)
+
+    assert abs(len(fit.profile) - len(profile)) <= 1
+    assert fit.max_error < fvdsolve.DEFAULT_TOLERANCE
+
+    # Step for step, the fitted run passes through the same points.
+    num = min(len(fit.centres), len(centres))
+    drift = np.linalg.norm(fit.centres[:num] - centres[:num], axis=1)
+    assert drift.max() < 0.1
+
+    # The first and last steps only see one side of the path, so compare inside it.
+    inner = slice(2, min(len(fit.profile), len(profile)) - 2)
+    g_error = np.abs(fit.profile[inner, :2] - profile[inner, :2])
+    assert np.percentile(g_error, 99) < 0.25
+    assert g_error.max() < 0.5
+
+
+def test_load_target_outside_the_ride(tmp_path):
+    num_samples = 30
+    orientation = np.zeros((num_samples, 1, 4))
+    orientation[..., 3] = 1.0
+    path = tmp_path / "ride.npz"
+    TrainMeasurements(np.full(num_samples, 10.0), np.zeros((num_samples, 1, 3)), np.zeros((num_samples, 1, 3)),
+                      orientation).save(path)
+
+    points, _, speed = fvdsolve.load_target(path, 0.2, 0.5)
+    assert len(points) > 0 and speed == 10.0
+    with pytest.raises(ValueError, match="No samples between 50s and 60s, the ride is 1.00s long"):
+        fvdsolve.load_target(path, 50.0, 60.0)
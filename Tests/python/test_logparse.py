@@ -0,0 +1,100 @@
+"""
+Parses a small PrintTable dump of Datastore.datapoints, as written to the game log.
+"""
+
+import numpy as np
+
+from protracktools import logparse
+
+DUMP = """\
+{
+  2 =
+    {
+      measurements =
+        {
+          1 =
+            {
+              g =
+                <Vector3> (0.1, 1.2, -0.05)
+              transform =
+                <TransformQ> Or=(0, 0, 0, 1) Pos=(1.5, 2, 3)
+            }
+          2 =
+            {
+              transform =
+                <TransformQ> Pos=(1.5, 2, 7) Or=(0, 0.5, 0, 0.866)
+              g =
+                <Vector3> (0, 0.9, 0.5)
+            }
+        }
+      originVelocity =
+        12.25
+    }
+Exit! Didn't walk enough!
+  1 =
+    {
+      originVelocity =
+        12
+      measurements =
+        {
+          1 =
+            {
+              g =
+                {
+                  x =
+                    0
+                  y =
+                    1
+                  z =
+                    0.5
+                }
+              transform =
+                <TransformQ> Or=(0, 0, 0, 1) Pos=(1, 2, 3)
+                metatable.__index = {
+                  GetPos =
+                    function: 0x1234
+                }
+            }
+          2 =
+            {
+              g =
+                [userdata] (already seen)
+              transform =
+                <TransformQ> Or=(0, 0.5, 0, 0.866) Pos=(1, 2, 7)
+            }
+        }
+    }
+}
+"""
+
+
+def log_lines():
+    lines = ["12:00:00 [ProTrackUtil] INFO: Exit! Starting point is invalid. Origin is nil.\n"]
+    lines += [f"12:00:01 [ProTrackUtil] INFO: {line}\n" for line in DUMP.splitlines()]
+    lines += ["12:00:01 [ProTrackManager] INFO: {\n", "12:00:02 [ProTrackUtil] INFO: Exit! Transform was null\n"]
+    return lines
+
+
+def test_iter_tables_skips_other_messages():
+    tables = list(logparse.iter_tables(log_lines()))
+
+    assert len(tables) == 1
+    assert sorted(tables[0]) == [1, 2]
+    assert tables[0][1]["originVelocity"] == 12
+    assert tables[0][1]["measurements"][2]["g"] is logparse.ALREADY_SEEN
+
+
+def test_iter_measurements():
+    rides = list(logparse.iter_measurements(log_lines(), offsets=[0.0, 2.0]))
+
+    assert len(rides) == 1
+    ride = rides[0]
+    np.testing.assert_array_equal(ride.velocity, [12.0, 12.25])
+    np.testing.assert_array_equal(ride.offsets, [0.0, 2.0])
+    np.testing.assert_allclose(ride.g, [
+        # The already seen G comes from the same follower in the sample printed before it.
+        [[0.0, 1.0, 0.5], [0.0, 0.9, 0.5]],
+        [[0.1, 1.2, -0.05], [0.0, 0.9, 0.5]],
+    ])
+    np.testing.assert_allclose(ride.position, [[[1, 2, 3], [1, 2, 7]], [[1.5, 2, 3], [1.5, 2, 7]]])
+    np.testing.assert_allclose(ride.orientation[:, 1], [[0, 0.5, 0, 0.866]] * 2)
@@ -0,0 +1,171 @@
+"""
+Allocation ranking over small Lua snippets, checking the parser and call graph behind it.
+"""
+
+import textwrap
+
+from protracktools.luaalloc import CallGraph, parse_file, rank, tokenize
+
+
+def call_graph(tmp_path, **files):
+    """ Parses each keyword as a module of that name under tmp_path """
+    parsed = []
+    for name, source in files.items():
+        path = tmp_path / f"{name}.lua"
+        path.write_text(textwrap.dedent(source).lstrip("\n"), encoding="utf-8")
+        parsed.append(parse_file(path, tmp_path))
+    return CallGraph(parsed)
+
+
+def ranked_sites(graph, *entries, loop_weight=10.0):
+    """ (function, kind, line, detail, score) per reachable site, highest score first """
+    keys = [key for name in entries for key in graph.find(name)]
+    ranked, _, _ = rank(graph, keys, loop_weight)
+    return [(r.function.name, r.site.kind, r.site.line, r.site.detail, r.score) for r in ranked]
+
+
+def test_long_strings_and_comments_hide_their_contents(tmp_path):
+    source = """
+        --[==[ local t = { } ]] still a comment ]==]
+        local s = [[ { } .. function() end ]]
+        -- local u = {}
+        local q = "{ \\" .. }"
+        local M = {}
+
+        function M.Make()
+            return { s, q }
+        end
+
+        return M
+    """
+    graph = call_graph(tmp_path, m=source)
+
+    assert ranked_sites(graph, "Make") == [("M.Make", "table", 8, "", 1.0)]
+    strings = [token.value for token in tokenize(textwrap.dedent(source)) if token.kind == "string"]
+    assert strings == [" { } .. function() end ", '{ " .. }']
+
+
+def test_method_calls_resolve_through_self_and_by_name(tmp_path):
+    graph = call_graph(tmp_path, m="""
+        local Obj = {}
+
+        function Obj:Make()
+            return {}
+        end
+
+        function Obj:Run(other)
+            for i = 1, 3 do
+                self:Make()
+            end
+            other:Make()
+        end
+
+        return Obj
+    """)
+
+    # The loop call is the heavier path, so Make runs 10 times per Run.
+    assert ranked_sites(graph, "Run") == [("Obj:Make", "table", 4, "", 10.0)]
+
+
+def test_nested_closures_are_counted_per_call(tmp_path):
+    graph = call_graph(tmp_path, m="""
+        local M = {}
+
+        function M.Outer(items)
+            for _, item in ipairs(items) do
+                local cb = function()
+                    return function()
+                        return { item }
+                    end
+                end
+                cb()
+            end
+        end
+
+        function M.Frame(lists)
+            for _, items in ipairs(lists) do
+                M.Outer(items)
+            end
+        end
+
+        return M
+    """)
+
+    # Every closure expression allocates each time its enclosing function runs.
+    assert ranked_sites(graph, "Outer") == [
+        ("M.Outer", "closure", 5, "<anonymous>", 10.0),
+        ("cb", "closure", 6, "<anonymous>", 10.0),
+        ("<anonymous>", "table", 7, "", 10.0),
+    ]
+    assert [site[-1] for site in ranked_sites(graph, "Frame")] == [100.0, 100.0, 100.0]
+
+
+def test_sites_are_weighted_by_loop_depth(tmp_path):
+    graph = call_graph(tmp_path, m="""
+        local M = {}
+
+        function M.Grid(rows, cols)
+            local grid = {}
+            for i = 1, rows do
+                grid[i] = {}
+                for j = 1, cols do
+                    grid[i][j] = { i, j }
+                end
+            end
+            local n = 0
+            while n < #grid do
+                n = n + 1
+            end
+            repeat
+                n = n - 1
+            until #{ n } > 0
+            return grid
+        end
+
+        return M
+    """)
+
+    assert ranked_sites(graph, "Grid", loop_weight=3.0) == [
+        ("M.Grid", "table", 8, "", 9.0),
+        ("M.Grid", "table", 6, "", 3.0),
+        ("M.Grid", "table", 17, "", 3.0),
+        ("M.Grid", "table", 4, "", 1.0),
+    ]
+
+
+def test_advance_reaches_the_gizmo_closure(tmp_path):
+    graph = call_graph(tmp_path, Vector3="""
+        local Vector3 = {}
+
+        function Vector3.new(x, y, z)
+            return { x, y, z }
+        end
+
+        return Vector3
+    """, manager="""
+        local Vector3 = require("Vector3")
+        local protrackManager = {}
+
+        function protrackManager.Advance(self)
+            local label = "frame " .. self.frame
+            local function setGizmoToPoint(index, gizmo)
+                local pt = Vector3.new(index, 0, 0)
+                gizmo:SetTransform(pt + self.offset)
+            end
+
+            for i, gizmo in ipairs(self.gizmos) do
+                setGizmoToPoint(i, gizmo)
+            end
+        end
+
+        return protrackManager
+    """)
+
+    # setGizmoToPoint runs once per gizmo, so its temporaries outrank Advance's own allocations.
+    assert ranked_sites(graph, "Advance") == [
+        ("Vector3.new", "table", 4, "", 10.0),
+        ("setGizmoToPoint", "vector", 7, "Vector3.new", 10.0),
+        ("setGizmoToPoint", "vector", 8, "operator +", 10.0),
+        ("protrackManager.Advance", "concat", 5, "", 1.0),
+        ("protrackManager.Advance", "closure", 6, "setGizmoToPoint", 1.0),
+    ]
@@ -0,0 +1,93 @@
+"""
+RideIndex lookups against a brute force search over every segment.
+"""
+
+import numpy as np
+import pytest
+
+from protracktools.measurements import TrainMeasurements, SIMULATION_DELTA
+from protracktools.spatial import RideIndex
+
+
+def random_ride(num_samples=2000, timestamps=None, seed=5):
+    """ A random walk, so segments cross and double back through shared cells """
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(size=(num_samples, 1, 3)) * 0.6
+    orientation = np.zeros((num_samples, 1, 4))
+    orientation[..., 3] = 1.0
+    return TrainMeasurements(
+        rng.uniform(5.0, 20.0, num_samples),
+        np.zeros((num_samples, 1, 3)),
+        np.cumsum(steps, axis=0),
+        orientation,
+        timestamps=timestamps,
+    )
+
+
+def brute_force(positions, points):
+    """ (float index, distance) of the closest point on the polyline to each point """
+    starts = positions[:-1]
+    deltas = positions[1:] - positions[:-1]
+    lengths_sq = np.einsum("ij,ij->i", deltas, deltas)
+    t = np.einsum("qij,ij->qi", points[:, None, :] - starts, deltas) / np.where(lengths_sq > 0.0, lengths_sq, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    offsets = starts + deltas * t[..., None] - points[:, None, :]
+    dist = np.sqrt(np.einsum("qij,qij->qi", offsets, offsets))
+    segment = dist.argmin(axis=1)
+    rows = np.arange(len(points))
+    return segment + t[rows, segment], dist[rows, segment]
+
+
+def queries(ride, seed=6):
+    rng = np.random.default_rng(seed)
+    positions = ride.position[:, 0]
+    lo, hi = positions.min(axis=0), positions.max(axis=0)
+    near = positions[rng.integers(0, len(ride), 300)] + rng.normal(size=(300, 3)) * 1.5
+    inside = rng.uniform(lo, hi, size=(200, 3))
+    # Outside the grid, some far enough to need the fallback over every cell.
+    outside = np.concatenate((lo - rng.uniform(1.0, 20.0, size=(50, 3)), hi + rng.uniform(50.0, 500.0, size=(50, 3))))
+    return np.concatenate((near, inside, outside))
+
+
+@pytest.mark.parametrize("cell_size", [None, 0.5, 8.0])
+def test_nearest_matches_brute_force(cell_size):
+    ride = random_ride()
+    index = RideIndex.from_measurements(ride, cell_size=cell_size)
+    points = queries(ride)
+
+    found = index.nearest(points)
+    float_index, distance = brute_force(ride.position[:, 0], points)
+
+    np.testing.assert_allclose(found["distance"], distance, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(found["float_index"], float_index, atol=1e-6)
+    np.testing.assert_allclose(found["time"], float_index * SIMULATION_DELTA, atol=1e-6)
+
+
+def test_nearest_times_follow_timestamps():
+    rng = np.random.default_rng(7)
+    timestamps = np.cumsum(rng.uniform(0.005, 0.05, 2000))
+    ride = random_ride(timestamps=timestamps)
+    points = queries(ride)
+
+    found = RideIndex.from_measurements(ride).nearest(points)
+    float_index, _ = brute_force(ride.position[:, 0], points)
+
+    np.testing.assert_allclose(found["time"], np.interp(float_index, np.arange(len(ride)), timestamps), atol=1e-6)
+
+
+def test_align_against_brute_force():
+    ride = random_ride()
+    index = RideIndex.from_measurements(ride)
+
+    # A ride aligned with itself maps every sample onto its own time.
+    found = index.nearest(ride.position[:, 0])
+    np.testing.assert_allclose(found["distance"], 0.0, atol=1e-9)
+    np.testing.assert_allclose(found["time"], ride.times, atol=1e-9)
+
+    # Another run of the same track, offset from it, sample by sample.
+    rng = np.random.default_rng(8)
+    other = ride.position[::3, 0] + rng.normal(size=(len(ride.position[::3]), 3)) * 0.3
+    found = index.nearest(other)
+    float_index, distance = brute_force(ride.position[:, 0], other)
+    np.testing.assert_allclose(found["distance"], distance, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(found["float_index"], float_index, atol=1e-6)
@@ -0,0 +1,123 @@
+"""
+DevStats aggregation and the summary the UI dev server prints on shutdown.
+"""
+
+import importlib.util
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("watchdog")
+
+SERVER_PATH = Path(__file__).resolve().parents[2] / "Main" / "ProTrackUI" / "ui_dev_server.py"
+spec = importlib.util.spec_from_file_location("ui_dev_server", SERVER_PATH)
+ui_dev_server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ui_dev_server)
+
+
+class Clock():
+    """ Stands in for time.perf_counter, moved on by hand """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "perf_counter", clock)
+    return clock
+
+
+def test_requests_are_aggregated_per_path(clock):
+    stats = ui_dev_server.DevStats()
+    stats.record_request("/index.html", 200, 1000, 0.004)
+    stats.record_request("/index.html", 200, 1000, 0.030)
+    stats.record_request("/missing.js", 404, 0, 0.001)
+    clock.now += 5.0
+
+    snapshot = stats.snapshot()
+    index = snapshot["requests"]["/index.html"]
+    assert snapshot["uptime_s"] == 5.0
+    assert (index["count"], index["errors"], index["bytes"]) == (2, 0, 2000)
+    assert index["mean_ms"] == pytest.approx(17.0)
+    assert index["max_ms"] == pytest.approx(30.0)
+    assert index["histogram"]["<=5ms"] == 1
+    assert index["histogram"]["<=50ms"] == 1
+    assert sum(index["histogram"].values()) == 2
+    assert snapshot["requests"]["/missing.js"]["errors"] == 1
+
+
+def test_polling_and_stats_requests_are_not_counted(clock):
+    stats = ui_dev_server.DevStats()
+    for path in ui_dev_server.UNTIMED_PATHS:
+        stats.record_request(path, 200, 20, 0.001)
+
+    assert stats.snapshot()["requests"] == {}
+
+
+def test_reload_timings(clock):
+    stats = ui_dev_server.DevStats()
+    # Two saves copied before the next poll, then the reloaded page paints.
+    event_time = clock.now
+    clock.now += 0.1
+    stats.record_copy(event_time)
+    clock.now += 0.2
+    stats.record_copy(clock.now - 0.05)
+    clock.now += 0.3
+    stats.record_reload()
+    clock.now += 0.4
+    stats.record_paint(250.0)
+    # Later paints weren't reloaded by the server.
+    clock.now += 1.0
+    stats.record_paint(None)
+
+    reload = stats.snapshot()["reload"]
+    assert reload["event_to_copy"]["count"] == 2
+    assert reload["event_to_copy"]["max_ms"] == pytest.approx(100.0)
+    assert reload["copy_to_reload"]["count"] == 1
+    assert reload["copy_to_reload"]["mean_ms"] == pytest.approx(500.0)
+    assert reload["reload_to_paint"]["count"] == 1
+    assert reload["reload_to_paint"]["mean_ms"] == pytest.approx(400.0)
+    assert reload["load_to_paint"]["count"] == 1
+    assert reload["load_to_paint"]["mean_ms"] == pytest.approx(250.0)
+
+
+def test_shutdown_summary(clock, capsys):
+    stats = ui_dev_server.DevStats()
+    stats.record_request("/index.html", 200, 2048, 0.010)
+    stats.record_request("/js/app.js", 200, 512, 0.002)
+    stats.record_request("/reload-check", 200, 16, 0.001)
+    stats.record_copy(clock.now)
+    clock.now += 0.1
+    stats.record_reload()
+    clock.now += 60.0
+
+    stats.print_summary()
+    lines = capsys.readouterr().out.strip().splitlines()
+
+    assert lines[0] == "Served 2 requests in 60s"
+    # Slowest paths first.
+    assert lines[2].split() == ["/index.html", "1", "2.0", "10.0", "10.0"]
+    assert lines[3].split() == ["/js/app.js", "1", "0.5", "2.0", "2.0"]
+    assert lines[4].split()[:2] == ["event_to_copy", "n=1"]
+    assert lines[5].split()[:2] == ["copy_to_reload", "n=1"]
+    assert len(lines) == 6
+
+
+def test_deletes_are_timed_from_the_event(clock, monkeypatch):
+    handler = ui_dev_server.SyncHandler(server=None)
+    synced = []
+    monkeypatch.setattr(handler, "_sync_file", lambda *args: synced.append(args))
+
+    class Event():
+        src_path = "UIGameface/old.js"
+        is_directory = False
+
+    handler.on_deleted(Event())
+
+    assert synced == [("UIGameface/old.js", "Deleted", clock.now)]
@@ -0,0 +1,98 @@
+"""
+Walks over a synthetic descending curve, checking what the walks report they cost.
+"""
+
+import numpy as np
+import pytest
+
+from protracktools import fvd
+from protracktools.measurements import walk_offsets
+from protracktools.walk import (
+    FrictionValues,
+    TrackPath,
+    g_error,
+    reference_g,
+    track_g,
+    walk_track,
+    walk_track_adaptive,
+)
+
+
+def descending_curve():
+    """ A banked, descending quarter turn, so a frictionless train always walks off the end """
+    angle = np.linspace(0.0, 0.5 * np.pi, 301)
+    radius = 60.0
+    positions = np.stack((radius * np.sin(angle), -0.2 * radius * angle, radius * (1.0 - np.cos(angle))), axis=-1)
+    forward = fvd.normalised(np.gradient(positions, axis=0, edge_order=2))
+    inward = fvd.normalised(np.stack((-np.sin(angle), np.zeros_like(angle), np.cos(angle)), axis=-1))
+    up = fvd.normalised(fvd.UP + 0.3 * inward)
+    up = fvd.normalised(up - forward * fvd.dot(up, forward)[:, None])
+    right = fvd.cross(up, forward)
+    return TrackPath(positions, fvd.quaternion_from_frame(forward, right, up))
+
+
+def lead_in_curve():
+    """ A descending straight running into a flat turn with no transition, so G jumps where they meet """
+    s = np.linspace(0.0, 30.0 + 30.0 * np.pi, 401)
+    angle = np.clip((s - 30.0) / 60.0, 0.0, None)
+    straight = s < 30.0
+    x = np.where(straight, s, 30.0 + 60.0 * np.sin(angle))
+    z = np.where(straight, 0.0, 60.0 * (1.0 - np.cos(angle)))
+    positions = np.stack((x, -0.1 * s, z), axis=-1)
+    forward = fvd.normalised(np.gradient(positions, axis=0, edge_order=2))
+    up = fvd.normalised(fvd.UP - forward * fvd.dot(fvd.UP, forward)[:, None])
+    return TrackPath(positions, fvd.quaternion_from_frame(forward, fvd.cross(up, forward), up))
+
+
+def walk_args(path=None, speed=15.0):
+    return (descending_curve() if path is None else path, walk_offsets(8.0), speed, np.array([0.0, 1.0, 0.0]),
+            FrictionValues())
+
+
+def test_fixed_walk_evaluates_once_per_sample():
+    result = walk_track(*walk_args())
+
+    assert len(result.measurements) > 100
+    assert result.evaluations == len(result.measurements)
+
+
+def test_adaptive_walk_counts_every_attempt():
+    results = [walk_track_adaptive(*walk_args(lead_in_curve()), tolerance=tolerance)
+               for tolerance in (0.005, 0.02, 0.1, 0.5)]
+
+    for result in results:
+        # Two to start, then two track_g calls per step, kept or retried.
+        assert result.evaluations == 2 + 2 * (len(result.measurements) + result.rejected)
+        assert result.measurements.timestamps.shape == (len(result.measurements),)
+    assert results[0].rejected > 0
+    evaluations = [result.evaluations for result in results]
+    assert evaluations == sorted(evaluations, reverse=True)
+
+
+def test_smooth_track_needs_no_retries():
+    # Past its ends the path keeps its end curvature, so followers behind the start see no jump in G.
+    result = walk_track_adaptive(*walk_args(), tolerance=0.005)
+    reference = reference_g(descending_curve(), walk_track(*walk_args(), time_step=1.0 / 240.0).measurements)
+
+    assert result.rejected == 0
+    max_error, _ = g_error(result.measurements, reference)
+    assert max_error < 0.01
+
+
+@pytest.mark.parametrize("walk", [walk_track, walk_track_adaptive])
+def test_walk_without_samples_raises(walk):
+    with pytest.raises(ValueError, match="no samples"):
+        walk(*walk_args(speed=0.0))
+
+
+def test_track_g_at_path_ends():
+    path = descending_curve()
+    ends = np.array([0.0, path.length])
+    inside = np.array([0.5, path.length - 0.5])
+    speeds = np.full(2, 15.0)
+
+    def origin_g(distance):
+        return track_g(path, distance, speeds, np.zeros(2), np.array([0.0]))[0][:, 0]
+
+    # Probes mustn't reach past the ends, where the track carries on straight.
+    np.testing.assert_allclose(origin_g(ends), origin_g(inside), atol=0.01)
@@ -0,0 +1,3 @@
+"""
+Offline analysis tools for ProTrack simulations.
+"""
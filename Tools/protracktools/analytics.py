@@ -0,0 +1,365 @@
+"""
+Whole-ride comfort analytics over TrainMeasurements.
+
+The in-game overlay only shows the G force and speed at the scrub point.
+These functions work on entire rides at once. Every metric is a single pass
+(diff, cumulative sum or selection) along the time axis, so they stay O(n).
+Functions taking plain arrays accept any trailing dimensions, so a stack of
+sweep results shaped (T, N) is evaluated in one call.
+
+G axes follow TrackMeasurement.g: x is lateral, y is vertical (1 at rest),
+z is longitudinal.
+
+usage: python -m protracktools.analytics ride.npz
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from protracktools.datastore import Datastore
+from protracktools.measurements import (
+    TrainMeasurements,
+    FOLLOWER_ORIGIN,
+    FOLLOWER_FRONT,
+    FOLLOWER_REAR,
+)
+
+AXIS_LAT = 0
+AXIS_VERT = 1
+AXIS_LONG = 2
+
+FOLLOWER_NAMES = {
+    FOLLOWER_ORIGIN: "middle",
+    FOLLOWER_FRONT: "front",
+    FOLLOWER_REAR: "rear",
+}
+AXIS_NAMES = {
+    AXIS_LAT: "lat",
+    AXIS_VERT: "vert",
+    AXIS_LONG: "long",
+}
+
+DEFAULT_PERCENTILES = (1, 5, 50, 95, 99)
+
+
+def jerk(values, time_delta):
+    """
+    Rate of change of G along the time axis, in G/s.
+
+    Uses central differences inside the ride and one sided differences at
+    both ends, so the output has the same shape as the input.
+
+    Args:
+        values: (T, ...) G values.
+        time_delta: Sample spacing in seconds.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[0] < 2:
+        return np.zeros_like(values)
+    return np.gradient(values, time_delta, axis=0)
+
+
+def windowed_sum(values, window):
+    """
+    Sum over the trailing window of each sample, via a cumulative sum.
+    Samples before the first full window sum over what is available.
+
+    Args:
+        values: (T, ...) values.
+        window: Window length in samples.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    window = max(int(window), 1)
+    csum = np.cumsum(values, axis=0)
+    out = csum.copy()
+    if window < values.shape[0]:
+        out[window:] -= csum[:-window]
+    return out
+
+
+def windowed_mean(values, window):
+    """
+    Mean over the trailing window of each sample, e.g. sustained G.
+
+    Args:
+        values: (T, ...) values.
+        window: Window length in samples.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    window = max(int(window), 1)
+    counts = np.minimum(np.arange(1, values.shape[0] + 1), window)
+    counts = counts.reshape((-1,) + (1,) * (values.ndim - 1))
+    return windowed_sum(values, window) / counts
+
+
+def centred_mean(values, window):
+    """
+    Mean over a window centred on each sample, so smoothing doesn't move peaks.
+    Even windows are widened by one sample to centre them. Samples near either
+    end average over what is available.
+
+    Args:
+        values: (T, ...) values.
+        window: Window length in samples.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    num_samples = values.shape[0]
+    half = max(int(window), 1) // 2
+    csum = np.concatenate((np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)))
+    index = np.arange(num_samples)
+    lo = np.maximum(index - half, 0)
+    hi = np.minimum(index + half + 1, num_samples)
+    counts = (hi - lo).reshape((-1,) + (1,) * (values.ndim - 1))
+    return (csum[hi] - csum[lo]) / counts
+
+
+def exceedance_mask(values, lower=None, upper=None):
+    """
+    Marks samples outside [lower, upper]. Either bound can be None.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mask = np.zeros(values.shape, dtype=bool)
+    if lower is not None:
+        mask |= values < lower
+    if upper is not None:
+        mask |= values > upper
+    return mask
+
+
+def windowed_exceedance(values, time_delta, window_time, lower=None, upper=None):
+    """
+    Seconds spent outside [lower, upper] within the trailing window of each sample.
+
+    Args:
+        values: (T, ...) G values.
+        time_delta: Sample spacing in seconds.
+        window_time: Window length in seconds.
+        lower: Lower G limit, or None.
+        upper: Upper G limit, or None.
+    """
+    window = int(round(window_time / time_delta))
+    mask = exceedance_mask(values, lower, upper)
+    return windowed_sum(mask, window) * time_delta
+
+
+def runs(mask):
+    """
+    Finds the contiguous runs of True along the time axis of a mask.
+
+    Args:
+        mask: (T, ...) mask.
+
+    Returns:
+        (starts, ends, columns) index arrays, ends exclusive. columns is the
+        flat index into the trailing dimensions, 0 for a 1D mask. Runs are
+        ordered by column, then time.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    num_columns = int(np.prod(mask.shape[1:], dtype=np.int64))
+    padded = np.zeros((num_columns, mask.shape[0] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask.reshape(mask.shape[0], num_columns).T
+    edges = np.diff(padded, axis=1)
+    columns, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return starts, ends, columns
+
+
+def _segments(starts, ends, columns, time_delta, extra_fields=()):
+    """ Structured array of runs from runs(), with room for extra per segment fields """
+    segments = np.zeros(len(starts), dtype=[
+        ("start", np.float64),
+        ("end", np.float64),
+        ("duration", np.float64),
+        ("column", np.int64),
+    ] + list(extra_fields))
+    segments["start"] = starts * time_delta
+    segments["end"] = ends * time_delta
+    segments["duration"] = (ends - starts) * time_delta
+    segments["column"] = columns
+    return segments
+
+
+def exceedance_durations(values, time_delta, lower=None, upper=None):
+    """
+    Finds every contiguous stretch outside [lower, upper].
+
+    Args:
+        values: (T, ...) G values.
+
+    Returns:
+        Structured array with start/end times, duration and column per stretch,
+        as from runs.
+    """
+    return _segments(*runs(exceedance_mask(values, lower, upper)), time_delta)
+
+
+def airtime_segments(vert_g, time_delta, threshold=0.0, min_duration=0.0):
+    """
+    Finds airtime, the stretches where vertical G drops below threshold.
+
+    Args:
+        vert_g: (T, ...) vertical G.
+        time_delta: Sample spacing in seconds.
+        threshold: Vertical G below which a rider is in airtime.
+        min_duration: Drop segments shorter than this, in seconds.
+
+    Returns:
+        Structured array with start/end times, duration, column (as from runs),
+        minimum G and G-seconds (area below threshold) per segment.
+    """
+    vert_g = np.asarray(vert_g, dtype=np.float64)
+    starts, ends, columns = runs(vert_g < threshold)
+
+    keep = (ends - starts) * time_delta >= min_duration
+    segments = _segments(starts[keep], ends[keep], columns[keep], time_delta, [
+        ("min_g", np.float64),
+        ("g_seconds", np.float64),
+    ])
+    if len(segments) == 0:
+        return segments
+
+    # Per segment reductions without a Python loop, over the columns laid end to end.
+    num_samples = vert_g.shape[0]
+    flat = np.append(vert_g.reshape(num_samples, -1).T.ravel(), np.inf)
+    first = columns[keep] * num_samples + starts[keep]
+    last = columns[keep] * num_samples + ends[keep]
+    segments["min_g"] = np.minimum.reduceat(flat, np.stack((first, last), axis=-1).ravel())[::2]
+    below = np.concatenate(([0.0], np.cumsum(threshold - np.minimum(flat[:-1], threshold))))
+    segments["g_seconds"] = (below[last] - below[first]) * time_delta
+    return segments
+
+
+def peak_table(values, percentiles=DEFAULT_PERCENTILES):
+    """
+    Min, max and percentiles along the time axis.
+
+    Args:
+        values: (T, ...) values.
+        percentiles: Percentiles to report.
+
+    Returns:
+        Dict of name to (...) arrays.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    table = {
+        "min": np.nanmin(values, axis=0),
+        "max": np.nanmax(values, axis=0),
+    }
+    pcts = np.nanpercentile(values, percentiles, axis=0)
+    for p, row in zip(percentiles, pcts):
+        table[f"p{p:g}"] = row
+    return table
+
+
+def analyse(ride, percentiles=DEFAULT_PERCENTILES, jerk_window_time=0.2, airtime_threshold=0.0,
+            airtime_min_duration=0.1, vert_limits=(-1.0, 5.0), lat_limit=1.5, exceedance_window_time=1.0):
+    """
+    Computes the standard comfort report for a ride.
+
+    Args:
+        ride: TrainMeasurements.
+        percentiles: Percentiles for the peak tables.
+        jerk_window_time: Jerk is taken from G smoothed over this many seconds,
+            centred on each sample, to keep finite difference noise from dominating.
+        airtime_threshold: Vertical G below which a rider is in airtime.
+        airtime_min_duration: Shortest airtime segment to report, in seconds.
+        vert_limits: (lower, upper) vertical G limits for exceedance.
+        lat_limit: Absolute lateral G limit for exceedance.
+        exceedance_window_time: Window for the worst windowed exceedance, in seconds.
+
+    Returns:
+        Dict of results, keyed per follower where relevant.
+    """
+    if ride.timestamps is not None:
+        # Every metric here assumes evenly spaced samples.
+        ride = Datastore.from_measurements(ride).resample(ride.time_delta).to_measurements(ride.offsets)
+
+    dt = ride.time_delta
+    g = ride.g
+    smoothing = max(int(round(jerk_window_time / dt)), 1)
+    g_jerk = jerk(centred_mean(g, smoothing), dt)
+
+    vert = g[:, :, AXIS_VERT]
+    lat = g[:, :, AXIS_LAT]
+    vert_exceed = windowed_exceedance(vert, dt, exceedance_window_time, *vert_limits)
+    lat_exceed = windowed_exceedance(np.abs(lat), dt, exceedance_window_time, upper=lat_limit)
+
+    report = {
+        "duration": ride.duration,
+        "speed": peak_table(ride.velocity, percentiles),
+        "followers": {},
+    }
+    for f in range(ride.num_followers):
+        name = FOLLOWER_NAMES.get(f, str(f))
+        report["followers"][name] = {
+            "g": peak_table(g[:, f, :], percentiles),
+            "jerk": peak_table(np.abs(g_jerk[:, f, :]), percentiles),
+            "airtime": airtime_segments(vert[:, f], dt, airtime_threshold, airtime_min_duration),
+            "vert_exceedance": exceedance_durations(vert[:, f], dt, *vert_limits),
+            "lat_exceedance": exceedance_durations(np.abs(lat[:, f]), dt, upper=lat_limit),
+            "worst_vert_window": float(vert_exceed[:, f].max(initial=0.0)),
+            "worst_lat_window": float(lat_exceed[:, f].max(initial=0.0)),
+        }
+    return report
+
+
+def print_report(report, percentiles=DEFAULT_PERCENTILES):
+    columns = ["min"] + [f"p{p:g}" for p in percentiles] + ["max"]
+    header = f"{'':<18}" + "".join(f"{c:>9}" for c in columns)
+
+    def print_row(label, table, index=()):
+        print(f"{label:<18}" + "".join(f"{table[c][index]:>9.2f}" for c in columns))
+
+    print(f"Ride length: {report['duration']:.2f}s")
+    print(header)
+    print_row("speed (m/s)", report["speed"])
+
+    for name, follower in report["followers"].items():
+        print(f"\n[{name}]")
+        print(header)
+        for axis, axis_name in AXIS_NAMES.items():
+            print_row(f"{axis_name} G", follower["g"], (axis,))
+        for axis, axis_name in AXIS_NAMES.items():
+            print_row(f"{axis_name} jerk (G/s)", follower["jerk"], (axis,))
+
+        airtime = follower["airtime"]
+        print(f"  Airtime: {len(airtime)} segments, {airtime['duration'].sum():.2f}s total")
+        for seg in airtime:
+            print(f"    {seg['start']:7.2f}s  {seg['duration']:5.2f}s  min {seg['min_g']:5.2f}G")
+        print(f"  Vertical exceedance: {follower['vert_exceedance']['duration'].sum():.2f}s total, "
+              f"worst window {follower['worst_vert_window']:.2f}s")
+        print(f"  Lateral exceedance: {follower['lat_exceedance']['duration'].sum():.2f}s total, "
+              f"worst window {follower['worst_lat_window']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print a comfort report for a ride exported by protracktools.logparse"
+    )
+    parser.add_argument("ride", help="Path to the ride .npz")
+    parser.add_argument("--airtime-threshold", type=float, default=0.0, help="Vertical G below which is airtime")
+    parser.add_argument("--vert-min", type=float, default=-1.0, help="Lower vertical G limit")
+    parser.add_argument("--vert-max", type=float, default=5.0, help="Upper vertical G limit")
+    parser.add_argument("--lat-max", type=float, default=1.5, help="Absolute lateral G limit")
+    args = parser.parse_args()
+
+    ride_path = Path(args.ride)
+    if not ride_path.exists():
+        print(f"Error: Ride not found: {ride_path}", file=sys.stderr)
+        sys.exit(1)
+
+    ride = TrainMeasurements.load(ride_path)
+    report = analyse(
+        ride,
+        airtime_threshold=args.airtime_threshold,
+        vert_limits=(args.vert_min, args.vert_max),
+        lat_limit=args.lat_max,
+    )
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Array-backed counterpart of Main/protrack/datastore.lua.
+
+Datastore.SampleDatapointAtFloatIndex interpolates one follower at one time
+per call. This version stores the datapoints as one structured array and
+samples any number of times and followers in a single vectorized pass, for
+resampling whole rides at video rate or onto another ride's timeline.
+
+Follower indices are 0 based here (Lua offsetId - 1). Datapoint indexing
+follows the Lua exactly: a float index i samples between datapoints
+floor(i) + 1 and floor(i) + 2 (1 based), clamped to the last datapoint.
+
+Rides walked with a variable timestep carry explicit timestamps. Times are
+then mapped to float indices by binary search instead of time / delta.
+
+usage: python -m protracktools.datastore ride.npz --fps 60 -o ride_60fps.npz
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from protracktools.measurements import TrainMeasurements, SIMULATION_DELTA
+
+
+def datapoint_dtype(num_followers):
+    """ One TrainMeasurement: origin velocity plus g/transform per follower """
+    return np.dtype([
+        ("velocity", np.float64),
+        ("position", np.float64, (num_followers, 3)),
+        ("orientation", np.float64, (num_followers, 4)),
+        ("g", np.float64, (num_followers, 3)),
+    ])
+
+
+# One interpolated TrackMeasurement, matching the table SampleDatapointAtFloatIndex returns.
+SAMPLE_DTYPE = np.dtype([
+    ("position", np.float64, (3,)),
+    ("orientation", np.float64, (4,)),
+    ("g", np.float64, (3,)),
+    ("speed", np.float64),
+])
+
+
+def lerp(a, b, t):
+    """ mathUtils.Lerp, broadcasting t over the trailing axis """
+    return a + (b - a) * t[..., None]
+
+
+def slerp(a, b, t):
+    """
+    Quaternion.SLerp over arrays of (x, y, z, w) quaternions.
+    Takes the shortest arc and falls back to a normalised lerp when the
+    quaternions are nearly parallel.
+    """
+    dot = np.sum(a * b, axis=-1)
+    b = np.where((dot < 0.0)[..., None], -b, b)
+    dot = np.abs(dot)
+
+    near = dot > 0.9995
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    safe_sin = np.where(near, 1.0, sin_theta)
+
+    wa = np.where(near, 1.0 - t, np.sin((1.0 - t) * theta) / safe_sin)
+    wb = np.where(near, t, np.sin(t * theta) / safe_sin)
+    out = a * wa[..., None] + b * wb[..., None]
+    norm = np.linalg.norm(out, axis=-1, keepdims=True)
+    return np.divide(out, norm, out=out, where=norm > 0.0)
+
+
+class Datastore():
+    """
+    Offline Datastore.
+
+    Args:
+        datapoints: Structured array of datapoint_dtype, one row per TrainMeasurement.
+        time_delta: Datastore.tSimulationDelta the datapoints were walked with.
+        timestamps: (T,) increasing sample times, or None for a fixed time_delta.
+    """
+
+    def __init__(self, datapoints, time_delta=SIMULATION_DELTA, timestamps=None):
+        self.datapoints = datapoints
+        self.time_delta = float(time_delta)
+        self.timestamps = None if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+
+    @classmethod
+    def from_measurements(cls, measurements):
+        """ Builds a datastore from TrainMeasurements """
+        datapoints = np.empty(len(measurements), dtype=datapoint_dtype(measurements.num_followers))
+        datapoints["velocity"] = measurements.velocity
+        datapoints["position"] = measurements.position
+        datapoints["orientation"] = measurements.orientation
+        datapoints["g"] = measurements.g
+        return cls(datapoints, measurements.time_delta, measurements.timestamps)
+
+    def to_measurements(self, offsets=None):
+        return TrainMeasurements(
+            self.datapoints["velocity"],
+            self.datapoints["g"],
+            self.datapoints["position"],
+            self.datapoints["orientation"],
+            offsets,
+            self.time_delta,
+            self.timestamps,
+        )
+
+    @property
+    def num_followers(self):
+        return self.datapoints.dtype["g"].shape[0]
+
+    def has_data(self):
+        """ Datastore.HasData """
+        return self.datapoints is not None and len(self.datapoints) >= 2
+
+    def get_time_for_float_index(self, float_index):
+        """ Datastore.GetTimeForFloatIndex """
+        if self.timestamps is not None:
+            return np.interp(float_index, np.arange(len(self.timestamps)), self.timestamps)
+        return np.asarray(float_index) * self.time_delta
+
+    def get_float_index_for_time(self, time):
+        """
+        Datastore.GetFloatIndexForTime. With timestamps, binary searches for
+        the enclosing samples and interpolates between their indices.
+        Times past the last sample give indices past the end, which sampling clamps.
+        """
+        if self.timestamps is None:
+            return np.asarray(time) / self.time_delta
+
+        time = np.asarray(time, dtype=np.float64)
+        timestamps = self.timestamps
+        idx = np.clip(np.searchsorted(timestamps, time, side="right") - 1, 0, len(timestamps) - 2)
+        span = timestamps[idx + 1] - timestamps[idx]
+        return idx + (time - timestamps[idx]) / np.where(span > 0.0, span, 1.0)
+
+    def get_floor_index_for_time(self, time):
+        """ Datastore.GetFloorIndexForTime """
+        return np.floor(self.get_float_index_for_time(time)).astype(np.int64)
+
+    def get_time_length(self):
+        """ Datastore.GetTimeLength """
+        if self.timestamps is not None:
+            return float(self.timestamps[-1])
+        return len(self.datapoints) * self.time_delta
+
+    def get_num_datapoints(self):
+        """ Datastore.GetNumDatapoints """
+        return len(self.datapoints)
+
+    def _indices(self, float_indices):
+        """
+        Works out the from/to datapoints and lerp fraction for every float index.
+        Mirrors SampleDatapointAtFloatIndex, with 0 based results.
+        """
+        float_indices = np.asarray(float_indices, dtype=np.float64)
+        num_pts = len(self.datapoints)
+
+        # Negative indexes error in Lua; clamp them to the first datapoint instead.
+        float_indices = np.maximum(float_indices, 0.0)
+        floor = np.floor(float_indices)
+        fraction = float_indices - floor
+
+        # Lua: fromIdx = min(floor + 1, numPts), toIdx = min(fromIdx + 1, numPts).
+        from_idx = np.minimum(floor.astype(np.int64), num_pts - 1)
+        to_idx = np.minimum(from_idx + 1, num_pts - 1)
+        return from_idx, to_idx, fraction
+
+    def sample_at_float_indices(self, float_indices, offset_ids=None):
+        """
+        Batched Datastore.SampleDatapointAtFloatIndex.
+
+        Args:
+            float_indices: (N,) float indices.
+            offset_ids: (K,) follower indices, 0 based. Defaults to all followers.
+
+        Returns:
+            (N, K) array of SAMPLE_DTYPE.
+        """
+        if not self.has_data():
+            raise ValueError("Sampling requires the datastore to have data! See Datastore.has_data().")
+
+        if offset_ids is None:
+            offset_ids = np.arange(self.num_followers)
+        offset_ids = np.atleast_1d(np.asarray(offset_ids, dtype=np.int64))
+
+        from_idx, to_idx, fraction = self._indices(np.atleast_1d(float_indices))
+        frm = (from_idx[:, None], offset_ids[None, :])
+        to = (to_idx[:, None], offset_ids[None, :])
+        t = np.broadcast_to(fraction[:, None], (len(fraction), len(offset_ids)))
+
+        position = self.datapoints["position"]
+        orientation = self.datapoints["orientation"]
+        g = self.datapoints["g"]
+        velocity = self.datapoints["velocity"]
+
+        out = np.empty(t.shape, dtype=SAMPLE_DTYPE)
+        out["position"] = lerp(position[frm], position[to], t)
+        out["orientation"] = slerp(orientation[frm], orientation[to], t)
+        out["g"] = lerp(g[frm], g[to], t)
+        out["speed"] = (velocity[from_idx] + (velocity[to_idx] - velocity[from_idx]) * fraction)[:, None]
+        return out
+
+    def sample_at_times(self, times, offset_ids=None):
+        """
+        Batched Datastore.SampleDatapointAtTime.
+
+        Args:
+            times: (N,) times in seconds.
+            offset_ids: (K,) follower indices, 0 based. Defaults to all followers.
+
+        Returns:
+            (N, K) array of SAMPLE_DTYPE.
+        """
+        return self.sample_at_float_indices(self.get_float_index_for_time(times), offset_ids)
+
+    def resample(self, time_delta):
+        """
+        Resamples the whole ride at a new timestep, e.g. 1 / 60 for a 60 fps export.
+        Timestamped rides come out with a fixed timestep.
+
+        Returns:
+            A new Datastore covering the same time length.
+        """
+        num_samples = int(round(self.get_time_length() / time_delta))
+        if self.timestamps is not None:
+            # Timestamped rides end on their last sample rather than one step after it.
+            num_samples += 1
+        num_samples = max(num_samples, 2)
+        samples = self.sample_at_times(np.arange(num_samples) * time_delta)
+
+        datapoints = np.empty(num_samples, dtype=self.datapoints.dtype)
+        datapoints["velocity"] = samples["speed"][:, 0]
+        datapoints["position"] = samples["position"]
+        datapoints["orientation"] = samples["orientation"]
+        datapoints["g"] = samples["g"]
+        return Datastore(datapoints, time_delta)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Resample a ride exported by protracktools.logparse at a new frame rate"
+    )
+    parser.add_argument("ride", help="Path to the ride .npz")
+    parser.add_argument("--fps", type=float, default=60.0, help="Output sample rate")
+    parser.add_argument("-o", "--output", help="Output .npz path")
+    args = parser.parse_args()
+
+    ride_path = Path(args.ride)
+    if not ride_path.exists():
+        print(f"Error: Ride not found: {ride_path}", file=sys.stderr)
+        sys.exit(1)
+
+    ride = TrainMeasurements.load(ride_path)
+    resampled = Datastore.from_measurements(ride).resample(1.0 / args.fps).to_measurements(ride.offsets)
+
+    output = Path(args.output) if args.output else ride_path.with_name(f"{ride_path.stem}_{args.fps:g}fps.npz")
+    resampled.save(output)
+    print(f"{ride} -> {resampled}")
+    print(f"Saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+Speed decay explorer for every train type at once.
+
+In game, FrictionHelper.GetFrictionValues looks up one train through the
+ProTrack_GetFrictionForTrain prepared statement and the ride is rewalked to
+see its effect. Here the same statement is run over an export of the Trains
+table for every train, and StepVelocity is stepped for every train x friction
+multiplier x element x entry speed in one broadcast per timestep.
+
+An element is a constant slope and G, e.g. a flat run at 1G or a 5 degree
+climb. For each combination this gives the speed loss against distance, and
+the break-even length: how far along the element the train gets before its
+entry speed is used up and WalkTrack would stop.
+
+The Trains export may be a SQLite database or a CSV file with a header row.
+It holds no masses, which air resistance is divided by, so every train gets
+--mass unless --train-mass gives its own. The report lists the mass used.
+
+usage: python -m protracktools.friction Trains.csv --multiplier 0.5 1 2 --speed 10 20 --train-mass Wooden 5200
+"""
+
+import csv
+import sys
+import sqlite3
+import argparse
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+from protracktools.measurements import SIMULATION_DELTA
+from protracktools.walk import FrictionValues, velocity_acceleration
+
+STATEMENTS_PATH = Path(__file__).resolve().parents[2] / "Init" / "protrack_friction.pscollection"
+STATEMENT_NAME = "ProTrack_GetFrictionForTrain"
+
+# Used for api.track.GetMassOfAllCars, which the Trains table doesn't hold.
+DEFAULT_MASS = 4000.0
+DEFAULT_MAX_LENGTH = 500.0
+DEFAULT_RESOLUTION = 1.0
+MAX_TIME = 600.0
+
+
+class PreparedStatement():
+    """
+    One <preparedstatement> from a .pscollection.
+
+    Args:
+        name: statement_name.
+        sql: sql_query, with ?1 style arguments, which sqlite3 understands as is.
+        arg_count: Number of arguments the statement takes.
+    """
+
+    def __init__(self, name, sql, arg_count):
+        self.name = name
+        self.sql = sql
+        self.arg_count = arg_count
+
+
+class Element():
+    """
+    A stretch of track at a constant slope and G.
+
+    Args:
+        name: Label for reports.
+        slope: Pitch in degrees, positive climbing.
+        g: Length of the G felt at the train origin.
+    """
+
+    def __init__(self, name, slope, g):
+        self.name = name
+        self.slope = float(slope)
+        self.g = float(g)
+
+    @property
+    def forward_y(self):
+        """ Y component of the origin's forward vector """
+        return np.sin(np.radians(self.slope))
+
+    @classmethod
+    def parse(cls, text):
+        """ Parses name:slope:g """
+        parts = text.split(":")
+        if len(parts) != 3:
+            raise ValueError(f"Element should be name:slope:g, got {text!r}")
+        return cls(parts[0], float(parts[1]), float(parts[2]))
+
+
+DEFAULT_ELEMENTS = (
+    Element("flat", 0.0, 1.0),
+    Element("airtime", 0.0, 0.0),
+    Element("climb 5", 5.0, 1.0),
+    Element("climb 15", 15.0, 1.0),
+    Element("descent 2", -2.0, 1.0),
+    Element("descent 5", -5.0, 1.0),
+)
+
+
+class DecayResult():
+    """
+    Speed decay along every element.
+
+    Attributes:
+        distances: (D,) distance grid in m.
+        speeds: (T, M, E, V, D) speed along each element, NaN once stalled.
+        break_even: (T, M, E, V) distance at which the speed reaches zero,
+            inf if the train is still moving at the end of the grid.
+    """
+
+    def __init__(self, distances, speeds, break_even):
+        self.distances = distances
+        self.speeds = speeds
+        self.break_even = break_even
+
+    def speed_loss(self, entry_speeds):
+        """ (T, M, E, V, D) speed lost since the start of each element """
+        return np.asarray(entry_speeds)[:, None] - self.speeds
+
+
+def load_prepared_statements(path):
+    """
+    Reads a .pscollection.
+
+    Returns:
+        Dict of PreparedStatement by name.
+    """
+    root = ET.parse(path).getroot()
+    statements = {}
+    for node in root.iter("preparedstatement"):
+        name = node.findtext("statement_name", "").strip()
+        sql = node.findtext("sql_query", "").strip()
+        statements[name] = PreparedStatement(name, sql, int(node.get("arg_count", 0)))
+    return statements
+
+
+def _csv_value(text):
+    if text == "":
+        return None
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def open_trains(path):
+    """
+    Opens a Trains export as a SQLite connection.
+    CSV exports are loaded into an in memory Trains table, so the prepared statement runs unchanged.
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        is_sqlite = f.read(16) == b"SQLite format 3\x00"
+    if is_sqlite:
+        return sqlite3.connect(f"file:{path.as_posix()}?mode=ro", uri=True)
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            raise ValueError(f"{path} has no header row")
+        rows = [[_csv_value(value) for value in row] for row in reader if row]
+
+    connection = sqlite3.connect(":memory:")
+    columns = ", ".join(f'"{name}"' for name in header)
+    connection.execute(f"CREATE TABLE Trains ({columns})")
+    connection.executemany(f"INSERT INTO Trains VALUES ({', '.join('?' * len(header))})", rows)
+    return connection
+
+
+def load_friction(connection, statement, mass=DEFAULT_MASS, masses=None):
+    """
+    Runs the friction statement for every train, as FrictionHelper.GetFrictionValues does.
+
+    Args:
+        connection: sqlite3 connection holding a Trains table.
+        statement: PreparedStatement taking a TrainID.
+        mass: Mass of all cars in kg, for trains not in masses. Air resistance is premultiplied by 1 / mass.
+        masses: Dict of mass in kg by TrainID, compared as strings.
+
+    Returns:
+        (train IDs, FrictionValues of (T,) arrays, (T,) masses in kg). The friction multiplier is left at 1.
+    """
+    masses = {str(train_id): float(value) for train_id, value in (masses or {}).items()}
+    if statement.arg_count != 1:
+        raise ValueError(f"{statement.name} takes {statement.arg_count} arguments, expected 1")
+
+    train_ids = []
+    rows = []
+    for (train_id,) in connection.execute("SELECT TrainID FROM Trains"):
+        row = connection.execute(statement.sql, (train_id,)).fetchone()
+        if row is None or any(value is None for value in row):
+            print(f"Warning: No friction values for {train_id}", file=sys.stderr)
+            continue
+        train_ids.append(train_id)
+        rows.append(row)
+
+    if not rows:
+        raise ValueError("No trains with friction values")
+
+    for train_id in masses.keys() - {str(train_id) for train_id in train_ids}:
+        print(f"Warning: No friction values for {train_id}, its mass is unused", file=sys.stderr)
+
+    values = np.asarray(rows, dtype=np.float64)
+    train_masses = np.array([masses.get(str(train_id), mass) for train_id in train_ids])
+    return train_ids, FrictionValues(values[:, 0], values[:, 1] / train_masses, values[:, 2]), train_masses
+
+
+def speed_decay(friction, multipliers, elements, entry_speeds, max_length=DEFAULT_MAX_LENGTH,
+                resolution=DEFAULT_RESOLUTION, time_step=SIMULATION_DELTA):
+    """
+    Steps StepVelocity along every element for every train, multiplier and entry speed.
+
+    Args:
+        friction: FrictionValues of (T,) arrays, see load_friction.
+        multipliers: (M,) friction multipliers.
+        elements: E Elements.
+        entry_speeds: (V,) speeds entering the element in m/s.
+        max_length: Length of track to follow in m.
+        resolution: Spacing of the output distance grid in m.
+        time_step: The timestep to use, Datastore.tSimulationDelta in game.
+
+    Returns:
+        DecayResult.
+    """
+    multipliers = np.asarray(multipliers, dtype=np.float64)
+    entry_speeds = np.asarray(entry_speeds, dtype=np.float64)
+    shape = (len(np.atleast_1d(friction.dynamic_friction)), len(multipliers), len(elements), len(entry_speeds))
+
+    # Axes: train, multiplier, element, entry speed.
+    broadcast = FrictionValues(
+        np.reshape(friction.static_friction, (-1, 1, 1, 1)),
+        np.reshape(friction.air_resistance, (-1, 1, 1, 1)),
+        np.reshape(friction.dynamic_friction, (-1, 1, 1, 1)),
+        multipliers[None, :, None, None],
+    )
+    forward_y = np.array([element.forward_y for element in elements])[None, None, :, None]
+    g_length = np.array([element.g for element in elements])[None, None, :, None]
+
+    distances = np.arange(0.0, max_length + resolution * 0.5, resolution)
+    velocity = np.broadcast_to(entry_speeds, shape).copy()
+    distance = np.zeros(shape)
+    break_even = np.full(shape, np.inf)
+    moving = np.ones(shape, dtype=bool)
+
+    # Each step fills in the grid points it passes, so no step history is kept.
+    speeds = np.full((velocity.size, len(distances)), np.nan)
+    speeds[:, 0] = velocity.ravel()
+    next_point = np.ones(velocity.size, dtype=np.int64)
+
+    for _ in range(int(np.ceil(MAX_TIME / time_step))):
+        accel = velocity_acceleration(velocity, forward_y, g_length, broadcast)
+        next_velocity = velocity + accel * time_step
+
+        # WalkTrack stops before walking the step that would take the velocity below zero.
+        stalled = moving & (next_velocity < 0.0)
+        fraction = velocity / np.where(stalled, velocity - next_velocity, 1.0)
+        break_even[stalled] = (distance + velocity * time_step * fraction)[stalled]
+        moving &= ~stalled
+
+        last_distance = distance.ravel()
+        last_velocity = velocity.ravel()
+        distance = np.where(moving, distance + velocity * time_step, distance)
+        velocity = np.where(moving, next_velocity, 0.0)
+
+        # Lerp along the step, which ends at the break-even point if it stalled.
+        end = np.where(moving, distance, break_even).ravel()
+        while True:
+            crossed = np.flatnonzero(distances[np.minimum(next_point, len(distances) - 1)] <= end)
+            crossed = crossed[next_point[crossed] < len(distances)]
+            if len(crossed) == 0:
+                break
+            point = next_point[crossed]
+            start = last_distance[crossed]
+            span = end[crossed] - start
+            fraction = (distances[point] - start) / np.where(span > 0.0, span, 1.0)
+            start_velocity = last_velocity[crossed]
+            speeds[crossed, point] = start_velocity + (velocity.ravel()[crossed] - start_velocity) * fraction
+            next_point[crossed] += 1
+
+        if not np.any(moving & (distance < max_length)):
+            break
+
+    speeds = speeds.reshape(shape + (len(distances),))
+    return DecayResult(distances, speeds, break_even)
+
+
+def print_report(train_ids, masses, multipliers, elements, entry_speeds, result, max_length):
+    """ Prints break-even lengths per train and element for every multiplier and entry speed """
+    name_width = max(len(str(train_id)) for train_id in train_ids) + 2
+    for m, multiplier in enumerate(multipliers):
+        for v, speed in enumerate(entry_speeds):
+            print(f"Break-even length in m, friction multiplier {multiplier:g}, entry speed {speed:g}m/s")
+            print(f"{'train':<{name_width}}{'mass kg':>9}" + "".join(f"{element.name:>12}" for element in elements))
+            for t, train_id in enumerate(train_ids):
+                cells = []
+                for e in range(len(elements)):
+                    length = result.break_even[t, m, e, v]
+                    cells.append(f"{'>' + format(max_length, 'g'):>12}" if length > max_length else f"{length:>12.1f}")
+                print(f"{str(train_id):<{name_width}}{masses[t]:>9g}" + "".join(cells))
+            print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare speed decay and break-even lengths for every train type"
+    )
+    parser.add_argument("trains", help="SQLite database or CSV export of the Trains table")
+    parser.add_argument("--statements", default=str(STATEMENTS_PATH), help="Path to protrack_friction.pscollection")
+    parser.add_argument("--multiplier", type=float, nargs="+", default=[1.0], help="Friction multipliers to try")
+    parser.add_argument("--speed", type=float, nargs="+", default=[20.0], help="Entry speeds in m/s")
+    parser.add_argument("--element", type=Element.parse, nargs="+", default=list(DEFAULT_ELEMENTS),
+                        help="Elements as name:slope:g, slope in degrees")
+    parser.add_argument("--mass", type=float, default=DEFAULT_MASS, help="Mass of all cars in kg, for every train")
+    parser.add_argument("--train-mass", nargs=2, action="append", default=[], metavar=("TRAIN", "KG"),
+                        help="Mass of all cars of one train in kg, overriding --mass, may be repeated")
+    parser.add_argument("--length", type=float, default=DEFAULT_MAX_LENGTH, help="Length of each element in m")
+    parser.add_argument("--resolution", type=float, default=DEFAULT_RESOLUTION, help="Curve spacing in m")
+    parser.add_argument("-o", "--output", help="Save the speed-loss curves to this .npz")
+    args = parser.parse_args()
+
+    for path in (Path(args.trains), Path(args.statements)):
+        if not path.exists():
+            print(f"Error: File not found: {path}", file=sys.stderr)
+            sys.exit(1)
+
+    statements = load_prepared_statements(args.statements)
+    if STATEMENT_NAME not in statements:
+        print(f"Error: {STATEMENT_NAME} not found in {args.statements}", file=sys.stderr)
+        sys.exit(1)
+
+    masses = {}
+    for train_id, mass in args.train_mass:
+        try:
+            masses[train_id] = float(mass)
+        except ValueError:
+            print(f"Error: Mass of {train_id} should be a number, got {mass!r}", file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        connection = open_trains(args.trains)
+        train_ids, friction, train_masses = load_friction(connection, statements[STATEMENT_NAME], args.mass, masses)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    result = speed_decay(friction, args.multiplier, args.element, args.speed, args.length, args.resolution)
+    print_report(train_ids, train_masses, args.multiplier, args.element, args.speed, result, args.length)
+
+    if args.output:
+        np.savez_compressed(
+            args.output,
+            train_ids=np.asarray([str(train_id) for train_id in train_ids]),
+            masses=train_masses,
+            multipliers=np.asarray(args.multiplier),
+            elements=np.asarray([element.name for element in args.element]),
+            slopes=np.asarray([element.slope for element in args.element]),
+            element_g=np.asarray([element.g for element in args.element]),
+            entry_speeds=np.asarray(args.speed),
+            distances=result.distances,
+            speed_loss=result.speed_loss(args.speed),
+            break_even=result.break_even,
+        )
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Vectorized port of FvdMode.StepPoint (Main/protrack/modes/fvdmode.lua).
+
+Orientations are kept as forward/right/up basis vectors rather than
+quaternions. Every array may carry leading batch dimensions, so many
+profiles can be integrated side by side with one call per step.
+
+Frames follow the game: Y is up, and up = forward x right.
+"""
+
+import numpy as np
+
+# FvdMode.g
+G = 9.81
+# FvdMode.gravity
+GRAVITY = np.array([0.0, -1.0, 0.0])
+# mathUtils.ApproxEquals tolerance
+APPROX_EPSILON = 1e-6
+
+# Quaternion axes in the game's frame
+FORWARD = np.array([0.0, 0.0, 1.0])
+RIGHT = np.array([1.0, 0.0, 0.0])
+UP = np.array([0.0, 1.0, 0.0])
+
+
+def dot(a, b):
+    return (a * b).sum(axis=-1)
+
+
+def cross(a, b):
+    """ Cross product over the last axis. Much cheaper than np.cross for small batches. """
+    a0, a1, a2 = a[..., 0], a[..., 1], a[..., 2]
+    b0, b1, b2 = b[..., 0], b[..., 1], b[..., 2]
+    out = np.empty(np.broadcast(a, b).shape)
+    out[..., 0] = a1 * b2 - a2 * b1
+    out[..., 1] = a2 * b0 - a0 * b2
+    out[..., 2] = a0 * b1 - a1 * b0
+    return out
+
+
+def normalised(v):
+    length = np.sqrt(dot(v, v))[..., None]
+    return v / np.where(length > 0.0, length, 1.0)
+
+
+def rotate(axis, angle, v):
+    """
+    Rotates v about a unit axis by angle (Rodrigues), the same as
+    Utils.MultQuaternionVector(Quaternion.FromAxisAngle(axis, angle), v).
+    """
+    angle = np.asarray(angle)[..., None]
+    cos = np.cos(angle)
+    sin = np.sin(angle)
+    return v * cos + cross(axis, v) * sin + axis * dot(axis, v)[..., None] * (1.0 - cos)
+
+
+def quaternion_rotate(q, v):
+    """ Rotates v by (x, y, z, w) quaternions q, as Utils.MultQuaternionVector does """
+    q = normalised(q)
+    qv = q[..., :3]
+    t = cross(qv * 2.0, v)
+    return v + t * q[..., 3:4] + cross(qv, t)
+
+
+def frame_from_quaternion(q):
+    """ Returns the (forward, right, up) basis of (x, y, z, w) quaternions """
+    q = np.asarray(q, dtype=np.float64)
+    shape = q.shape[:-1] + (3,)
+    return (
+        quaternion_rotate(q, np.broadcast_to(FORWARD, shape)),
+        quaternion_rotate(q, np.broadcast_to(RIGHT, shape)),
+        quaternion_rotate(q, np.broadcast_to(UP, shape)),
+    )
+
+
+def quaternion_from_frame(forward, right, up):
+    """ Inverse of frame_from_quaternion: (x, y, z, w) quaternions from orthonormal bases """
+    m00, m10, m20 = right[..., 0], right[..., 1], right[..., 2]
+    m01, m11, m21 = up[..., 0], up[..., 1], up[..., 2]
+    m02, m12, m22 = forward[..., 0], forward[..., 1], forward[..., 2]
+
+    # Each candidate is accurate when its component is the largest, so pick per quaternion.
+    candidates = np.stack((
+        np.stack((m21 - m12, m02 - m20, m10 - m01, 1.0 + m00 + m11 + m22), axis=-1),
+        np.stack((1.0 + m00 - m11 - m22, m01 + m10, m02 + m20, m21 - m12), axis=-1),
+        np.stack((m01 + m10, 1.0 - m00 + m11 - m22, m12 + m21, m02 - m20), axis=-1),
+        np.stack((m02 + m20, m12 + m21, 1.0 - m00 - m11 + m22, m10 - m01), axis=-1),
+    ), axis=-2)
+    traces = np.stack((m00 + m11 + m22, m00, m11, m22), axis=-1)
+    best = np.argmax(traces, axis=-1)[..., None, None]
+    q = np.take_along_axis(candidates, best, axis=-2)[..., 0, :]
+    return normalised(q)
+
+
+def frame_from_fr(forward, right):
+    """ Quaternion.FromFR: orthonormal frame from a forward and a right vector """
+    forward = normalised(forward)
+    right = normalised(right - forward * dot(right, forward)[..., None])
+    return forward, right, cross(forward, right)
+
+
+class FvdPoint():
+    """
+    Batched FvdPoint.
+
+    Attributes:
+        pos: (..., 3) coaster-space heartline position.
+        forward, right, up: (..., 3) orientation basis.
+        velo: (...) velocity.
+        heart_velo: (...) heartline velocity.
+        heart_distance: (...) heartline distance travelled, in m.
+    """
+
+    def __init__(self, pos, forward, right, up, velo, heart_velo, heart_distance):
+        self.pos = pos
+        self.forward = forward
+        self.right = right
+        self.up = up
+        self.velo = velo
+        self.heart_velo = heart_velo
+        self.heart_distance = heart_distance
+
+    @classmethod
+    def start(cls, centre, forward, up, velocity, heartline_offset=0.0, batch_shape=()):
+        """
+        Builds the first point the way FvdMode.StaticBuildEndPoint_Hook does:
+        lifted onto the heartline, with the heartline velocity equal to the velocity.
+        """
+        forward = np.asarray(forward, dtype=np.float64)
+        up = np.asarray(up, dtype=np.float64)
+        forward, right, up = frame_from_fr(forward, cross(up, forward))
+        shape = tuple(batch_shape)
+
+        def expand(v):
+            return np.broadcast_to(v, shape + np.shape(v)).copy()
+
+        return cls(
+            expand(np.asarray(centre, dtype=np.float64) + up * heartline_offset),
+            expand(forward),
+            expand(right),
+            expand(up),
+            np.full(shape, float(velocity)),
+            np.full(shape, float(velocity)),
+            np.zeros(shape),
+        )
+
+    def centre(self, heartline_offset):
+        """ Track centreline position, as passed to api.track.CreateJoinPoint """
+        return self.pos - self.up * heartline_offset
+
+
+def step_point(last, lat_g, vert_g, roll_delta, heartline_offset, time_step):
+    """
+    Steps points forward in time by time_step. Port of FvdMode.StepPoint.
+
+    Args:
+        last: The FvdPoint to build off.
+        lat_g: (...) lateral user acceleration, in G (userG:GetX()).
+        vert_g: (...) vertical user acceleration, in G (userG:GetY()).
+        roll_delta: (...) roll rate in rad / m.
+        heartline_offset: The heartline offset in m.
+        time_step: The timestep to use.
+
+    Returns:
+        The next FvdPoint.
+    """
+    prev_vert = last.up
+    prev_lat = last.right
+    prev_forward = last.forward
+
+    force = lat_g[..., None] * prev_lat + vert_g[..., None] * prev_vert + GRAVITY
+
+    vert_accel = -dot(force, prev_vert) * G
+    lat_accel = -dot(force, prev_lat) * G
+    frw_accel = dot(force, prev_forward) * G
+
+    lat_angle = (-lat_accel / last.heart_velo) * time_step
+    vert_angle = (vert_accel / last.heart_velo) * time_step
+
+    # Yaw about the old up, then pitch about the old right.
+    new_forward = rotate(prev_lat, vert_angle, rotate(prev_vert, lat_angle, prev_forward))
+    new_right = rotate(prev_vert, lat_angle, prev_lat)
+    new_up = cross(new_forward, new_right)
+
+    half_velo_step = (last.velo * 0.5 * time_step)[..., None]
+    new_pos = (
+        last.pos
+        + new_forward * half_velo_step
+        + prev_forward * half_velo_step
+        + (new_up - prev_vert) * heartline_offset
+    )
+
+    delta = new_pos - last.pos
+    dist_travelled = np.sqrt(dot(delta, delta))
+    rolled_right = normalised(rotate(new_forward, dist_travelled * roll_delta, new_right))
+
+    heart_velo = dist_travelled / time_step
+    next_velo = last.velo + frw_accel * time_step
+    heart_velo = np.where(np.abs(heart_velo) < APPROX_EPSILON, last.velo, heart_velo)
+
+    forward, right, up = frame_from_fr(new_forward, rolled_right)
+    return FvdPoint(
+        new_pos,
+        forward,
+        right,
+        up,
+        next_velo,
+        heart_velo,
+        dist_travelled + last.heart_distance,
+    )
+
+
+def simulate(start, profile, heartline_offset, time_step):
+    """
+    Integrates profiles from a start point.
+
+    Args:
+        start: FvdPoint with batch shape (...).
+        profile: (..., S, 3) per step (lat G, vert G, roll rate).
+        heartline_offset: The heartline offset in m.
+        time_step: The timestep to use.
+
+    Returns:
+        (centres (..., S + 1, 3), last point). centres[..., 0, :] is the start.
+    """
+    num_steps = profile.shape[-2]
+    centres = np.empty(profile.shape[:-2] + (num_steps + 1, 3))
+    centres[..., 0, :] = start.centre(heartline_offset)
+
+    point = start
+    for i in range(num_steps):
+        point = step_point(
+            point,
+            profile[..., i, 0],
+            profile[..., i, 1],
+            profile[..., i, 2],
+            heartline_offset,
+            time_step,
+        )
+        centres[..., i + 1, :] = point.centre(heartline_offset)
+    return centres, point
@@ -0,0 +1,556 @@
+"""
+Inverse FVD solver.
+
+FvdMode.StepPoint builds a path from a G/roll profile. This goes the other
+way: given a centreline and an entry speed, it finds the per-step lateral G,
+vertical G and roll rate profile that reproduces it.
+
+1. A tracking pass steps the vectorized StepPoint port along the target,
+   inverting the yaw/pitch/roll of each step to follow the target's frame
+   forward (with a proportional correction back onto the path) and its up
+   vector. The forward comes from the heartline, as rolling about it swings
+   the centreline sideways.
+2. The raw profile is smoothed for a batch of smoothing weights at once,
+   each a tridiagonal least squares problem penalising changes between steps.
+   This regularises the profile only; position error is not minimised here.
+3. Every smoothed profile is integrated in one batched forward run, and the
+   smoothest one within the position tolerance is kept.
+
+Without target up vectors the path is banked so the rider feels no lateral
+force, using the path curvature and the frictionless speed StepPoint implies.
+Near weightlessness that bank is ill defined and is held from the last
+sample, so expect larger errors there than with real up vectors.
+
+usage: python -m protracktools.fvdsolve ride.npz --start 12.0 --end 18.5 -o profile.csv
+       python -m protracktools.fvdsolve points.csv --speed 20 -o profile.csv
+"""
+
+import sys
+import csv
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from protracktools import fvd
+from protracktools.fvd import FvdPoint, dot, normalised, step_point, simulate
+from protracktools.measurements import TrainMeasurements, FOLLOWER_ORIGIN
+
+# FvdMode.StaticBuildEndPoint_Hook steps at this timestep.
+DEFAULT_TIME_STEP = 0.01
+DEFAULT_SMOOTHING = (0.0, 1.0, 4.0, 16.0, 64.0, 256.0)
+DEFAULT_TOLERANCE = 0.05
+
+PROFILE_LAT = 0
+PROFILE_VERT = 1
+PROFILE_ROLL = 2
+
+
+class TargetPath():
+    """
+    A centreline resampled at uniform arc length, with a tangent, frame forward and up vector per sample.
+
+    Args:
+        points: (N, 3) centreline points.
+        ups: (N, 3) up vectors, or None to bank for zero lateral G.
+        entry_speed: Speed at the first point, used to bank without ups.
+        heartline_offset: Heartline offset in m.
+        spacing: Resample spacing in m.
+        bank_threshold: Felt G below which the zero lateral G bank is only partly followed.
+    """
+
+    def __init__(self, points, ups=None, entry_speed=None, heartline_offset=0.0, spacing=0.1, bank_threshold=0.5):
+        self.bank_threshold = bank_threshold
+        points = np.asarray(points, dtype=np.float64)
+        if len(points) < 2:
+            raise ValueError("Target path needs at least 2 points")
+
+        seg = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        keep = np.concatenate(([True], seg > 1e-9))
+        points = points[keep]
+        arc = np.concatenate(([0.0], np.cumsum(seg[keep[1:]])))
+
+        self.length = arc[-1]
+        if self.length <= 0.0:
+            raise ValueError("Target path has no length")
+        num = max(int(np.ceil(self.length / spacing)), 1) + 1
+        self.s = np.linspace(0.0, self.length, num)
+        self.spacing = self.s[1] - self.s[0]
+        self.points = np.stack([np.interp(self.s, arc, points[:, i]) for i in range(3)], axis=1)
+        self.tangents = normalised(np.gradient(self.points, self.spacing, axis=0, edge_order=2))
+
+        if ups is not None:
+            ups = np.asarray(ups, dtype=np.float64)[keep]
+            ups = np.stack([np.interp(self.s, arc, ups[:, i]) for i in range(3)], axis=1)
+        else:
+            ups = self._banked_ups(entry_speed, heartline_offset)
+        # Keep ups perpendicular to the path.
+        self.ups = normalised(ups - self.tangents * dot(ups, self.tangents)[:, None])
+        self.forwards = self._frame_forwards(heartline_offset)
+
+    def _frame_forwards(self, heartline_offset):
+        """
+        Forward vectors of the track frame, which StepPoint turns with user G.
+
+        StepPoint moves the heartline along the frame forward, but rolling about
+        the heartline swings the centreline sideways, so where the path rolls its
+        tangent leans off the forward. Take the forwards from the heartline instead.
+        """
+        heartline = self.points + self.ups * heartline_offset
+        forwards = normalised(np.gradient(heartline, self.spacing, axis=0, edge_order=2))
+        return normalised(forwards - self.ups * dot(forwards, self.ups)[:, None])
+
+    def _banked_ups(self, entry_speed, heartline_offset):
+        """
+        Up vectors along the felt force (centripetal + gravity), so lateral G is zero.
+        Speed follows energy conservation, as StepPoint has no friction.
+        """
+        if entry_speed is None:
+            raise ValueError("Banking without up vectors needs an entry speed")
+
+        height = self.points[:, 1] + heartline_offset
+        speed_sq = np.maximum(entry_speed * entry_speed - 2.0 * fvd.G * (height - height[0]), 0.0)
+        curvature = np.gradient(self.tangents, self.spacing, axis=0)
+
+        felt = speed_sq[:, None] * curvature - fvd.GRAVITY * fvd.G
+        felt -= self.tangents * dot(felt, self.tangents)[:, None]
+        felt_len = np.linalg.norm(felt, axis=1)
+        directions = (felt / np.maximum(felt_len, 1e-9)[:, None]).tolist()
+        # How much to trust the felt force direction. Near weightlessness the
+        # bank is ill defined, so lean on the previous bank instead.
+        weights = np.clip(felt_len / (fvd.G * self.bank_threshold), 0.0, 1.0).tolist()
+        tangents = self.tangents.tolist()
+
+        # Sequential, as each bank follows on from the last. Plain floats are
+        # much faster than numpy for single vectors.
+        ups = []
+        ux, uy, uz = fvd.UP
+        for (dx, dy, dz), (tx, ty, tz), w in zip(directions, tangents, weights):
+            # Carry the last up onto this sample's normal plane.
+            along = ux * tx + uy * ty + uz * tz
+            ux, uy, uz = ux - tx * along, uy - ty * along, uz - tz * along
+
+            # Keep the up vector continuous through negative G, rather than flipping.
+            if dx * ux + dy * uy + dz * uz < 0.0:
+                dx, dy, dz = -dx, -dy, -dz
+
+            ux, uy, uz = w * dx + (1.0 - w) * ux, w * dy + (1.0 - w) * uy, w * dz + (1.0 - w) * uz
+            length = (ux * ux + uy * uy + uz * uz) ** 0.5
+            if length > 1e-9:
+                ux, uy, uz = ux / length, uy / length, uz / length
+            else:
+                ux, uy, uz = fvd.UP
+            ups.append((ux, uy, uz))
+        return np.array(ups)
+
+    def sample(self, s):
+        """
+        Interpolated (point, frame forward, up) at arc length s.
+        Extrapolates from the end segments outside the path, so a step
+        that finishes just past the end still aims along it.
+        """
+        i = min(max(int(s // self.spacing), 0), len(self.s) - 2)
+        t = (s - self.s[i]) / self.spacing
+        point = self.points[i] + (self.points[i + 1] - self.points[i]) * t
+        forward = normalised(self.forwards[i] + (self.forwards[i + 1] - self.forwards[i]) * t)
+        up = normalised(self.ups[i] + (self.ups[i + 1] - self.ups[i]) * t)
+        return point, forward, up
+
+    def project(self, points, guess, window):
+        """
+        Closest point on the path, searching window samples either side of guess.
+
+        Args:
+            points: (..., 3) points.
+            guess: (...) arc length guesses.
+            window: Samples to search either side.
+
+        Returns:
+            (arc length (...), distance (...)).
+        """
+        points = np.asarray(points, dtype=np.float64)
+        guess = np.asarray(guess, dtype=np.float64)
+        last_seg = len(self.s) - 2
+
+        base = np.clip(np.round(guess / self.spacing).astype(np.int64), 0, last_seg)
+        idx = np.clip(base[..., None] + np.arange(-window, window + 1), 0, last_seg)
+
+        a = self.points[idx]
+        ab = self.points[idx + 1] - a
+        t = np.clip(dot(points[..., None, :] - a, ab) / dot(ab, ab), 0.0, 1.0)
+        dist = np.linalg.norm(a + ab * t[..., None] - points[..., None, :], axis=-1)
+
+        best = np.argmin(dist, axis=-1)[..., None]
+        arc = (np.take_along_axis(idx, best, -1) + np.take_along_axis(t, best, -1))[..., 0] * self.spacing
+        return arc, np.take_along_axis(dist, best, -1)[..., 0]
+
+    def follow(self, point, arc):
+        """
+        Closest arc length to a single point, walking segment by segment from arc.
+        Much cheaper than project() for a point that only moves a little each call.
+        """
+        last_seg = len(self.s) - 2
+        i = min(max(int(arc // self.spacing), 0), last_seg)
+        direction = 0
+        while True:
+            a = self.points[i]
+            ab = self.points[i + 1] - a
+            t = dot(point - a, ab) / dot(ab, ab)
+            # Stop at the ends, or where the walk would turn back at a corner.
+            if t < 0.0 and i > 0 and direction <= 0:
+                i -= 1
+                direction = -1
+            elif t > 1.0 and i < last_seg and direction >= 0:
+                i += 1
+                direction = 1
+            else:
+                break
+        return (i + min(max(float(t), 0.0), 1.0)) * self.spacing
+
+
+def signed_angle(a, b, axis):
+    """ Angle rotating a onto b about axis, both perpendicular to axis """
+    return np.arctan2(dot(axis, fvd.cross(a, b)), dot(a, b))
+
+
+def invert_step(point, new_forward, time_step):
+    """
+    Finds the user G that turns point onto new_forward in one StepPoint,
+    undoing its yaw about the old up and pitch about the old right.
+
+    Returns:
+        (lat G, vert G)
+    """
+    lat_angle = np.arcsin(np.clip(dot(new_forward, point.right), -1.0, 1.0))
+    vert_angle = np.arctan2(-dot(new_forward, point.up), dot(new_forward, point.forward))
+
+    scale = point.heart_velo / (time_step * fvd.G)
+    lat_g = lat_angle * scale - dot(fvd.GRAVITY, point.right)
+    vert_g = -vert_angle * scale - dot(fvd.GRAVITY, point.up)
+    return lat_g, vert_g
+
+
+def rolled(point, roll_angle):
+    """ Rolls point about its forward, as the end of StepPoint does """
+    right = normalised(fvd.rotate(point.forward, roll_angle, point.right))
+    forward, right, up = fvd.frame_from_fr(point.forward, right)
+    return FvdPoint(point.pos, forward, right, up, point.velo, point.heart_velo, point.heart_distance)
+
+
+def track_profile(target, entry_speed, heartline_offset=0.0, time_step=DEFAULT_TIME_STEP, lookahead=2.0):
+    """
+    Steps along the target, inverting StepPoint at every step.
+
+    Args:
+        target: TargetPath.
+        entry_speed: Velocity at the start of the path.
+        heartline_offset: Heartline offset in m.
+        time_step: FVD timestep.
+        lookahead: Distance over which position error is steered out, in m.
+
+    Returns:
+        (S, 3) profile of (lat G, vert G, roll rate) per step.
+    """
+    point0, forward0, up0 = target.sample(0.0)
+    point = FvdPoint.start(point0, forward0, up0, entry_speed, heartline_offset)
+
+    max_steps = int(np.ceil(4.0 * target.length / max(entry_speed * time_step, 1e-3))) + 16
+    arc = 0.0
+    profile = []
+
+    while len(profile) < max_steps:
+        if point.velo <= 0.0:
+            raise ValueError(f"Train stalled {arc:.1f}m into a {target.length:.1f}m path; entry speed is too low")
+
+        step = point.velo * time_step
+        centre = point.centre(heartline_offset)
+        arc = target.follow(centre, arc)
+        if arc + 0.5 * step >= target.length:
+            break
+
+        closest, _, _ = target.sample(arc)
+        _, forward, up = target.sample(arc + step)
+
+        # Follow the frame forward ahead, steering the position error out over lookahead.
+        error = closest - centre
+        error -= forward * dot(error, forward)
+        lat_g, vert_g = invert_step(point, normalised(forward + error / lookahead), time_step)
+
+        # Roll the new frame onto the target up vector. StepPoint rolls after
+        # moving, so step unrolled and roll the result.
+        unrolled = step_point(point, lat_g, vert_g, np.float64(0.0), heartline_offset, time_step)
+        dist = unrolled.heart_distance - point.heart_distance
+        target_up = normalised(up - unrolled.forward * dot(up, unrolled.forward))
+        roll_angle = signed_angle(unrolled.up, target_up, unrolled.forward)
+        roll_delta = roll_angle / dist if dist > 1e-9 else 0.0
+
+        profile.append((float(lat_g), float(vert_g), float(roll_delta)))
+        point = rolled(unrolled, roll_delta * dist)
+
+    return np.array(profile).reshape(-1, 3)
+
+
+def smooth_profiles(profile, weights):
+    """
+    Solves min |p - profile|^2 + w |p[i + 1] - p[i]|^2 for every weight at once.
+
+    The normal equations are tridiagonal, so this is one O(S) Thomas
+    algorithm sweep over all weights and channels.
+
+    Args:
+        profile: (S, C) raw profile.
+        weights: (B,) smoothing weights.
+
+    Returns:
+        (B, S, C) smoothed profiles.
+    """
+    profile = np.asarray(profile, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)[:, None]
+    num = profile.shape[0]
+    out = np.broadcast_to(profile, weights.shape[:1] + profile.shape).copy()
+    if num < 2:
+        return out
+
+    # Diagonal 1 + w * [1, 2, ..., 2, 1], off diagonals -w.
+    diag = np.full((len(weights), num), 2.0)
+    diag[:, 0] = diag[:, -1] = 1.0
+    diag = 1.0 + weights * diag
+    off = -weights[:, 0]
+
+    c = np.empty((len(weights), num))
+    c[:, 0] = off / diag[:, 0]
+    out[:, 0] /= diag[:, 0, None]
+    for i in range(1, num):
+        denom = diag[:, i] - off * c[:, i - 1]
+        c[:, i] = off / denom
+        out[:, i] = (out[:, i] - off[:, None] * out[:, i - 1]) / denom[:, None]
+    for i in range(num - 2, -1, -1):
+        out[:, i] -= c[:, i, None] * out[:, i + 1]
+    return out
+
+
+def project_runs(target, centres, chunk=32):
+    """
+    Distance of every centre from the target, for a batch of runs.
+    Each run is followed along the path a chunk of steps at a time, guessing
+    arc lengths from the distance travelled since the last chunk, so the
+    closest point search stays local even where a run wanders.
+
+    Args:
+        target: TargetPath.
+        centres: (B, S, 3) centres.
+        chunk: Steps to project per call.
+
+    Returns:
+        (arc lengths (B, S), distances (B, S)).
+    """
+    steps = np.linalg.norm(np.diff(centres, axis=1), axis=-1)
+    window = max(int(np.ceil(steps.max(initial=0.0) / target.spacing)) + 4, 8)
+    travelled = np.concatenate((np.zeros((centres.shape[0], 1)), np.cumsum(steps, axis=1)), axis=1)
+
+    arcs = np.zeros(centres.shape[:2])
+    errors = np.zeros(centres.shape[:2])
+    arc = np.zeros(centres.shape[0])
+    last = 0
+    for start in range(0, centres.shape[1], chunk):
+        stop = min(start + chunk, centres.shape[1])
+        guess = arc[:, None] + travelled[:, start:stop] - travelled[:, last, None]
+        arcs[:, start:stop], errors[:, start:stop] = target.project(centres[:, start:stop], guess, window)
+        arc = arcs[:, stop - 1]
+        last = stop - 1
+    return arcs, errors
+
+
+class FvdFit():
+    """
+    Result of solve().
+
+    Attributes:
+        profile: (S, 3) per step (lat G, vert G, roll rate in rad / m).
+        centres: (S + 1, 3) centreline the profile produces.
+        errors: (S + 1,) distance of each centre from the target.
+        error_by_metre: Worst error within each metre of the target.
+        end_error: Distance between the produced and target end points.
+        smoothing: Smoothing weight that was picked.
+        time_step: FVD timestep of the profile.
+        length: Target length in m.
+    """
+
+    def __init__(self, profile, centres, errors, error_by_metre, end_error, smoothing, time_step, length):
+        self.profile = profile
+        self.centres = centres
+        self.errors = errors
+        self.error_by_metre = error_by_metre
+        self.end_error = end_error
+        self.smoothing = smoothing
+        self.time_step = time_step
+        self.length = length
+
+    @property
+    def max_error(self):
+        return float(self.errors.max())
+
+    @property
+    def rms_error(self):
+        return float(np.sqrt(np.mean(self.errors ** 2)))
+
+    @property
+    def error_per_metre(self):
+        """ End point drift per metre of track """
+        return self.end_error / self.length if self.length > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"<FvdFit steps={len(self.profile)} length={self.length:.1f}m smoothing={self.smoothing:g} "
+            f"rms={self.rms_error:.4f}m max={self.max_error:.4f}m end={self.end_error:.4f}m>"
+        )
+
+
+def solve(points, entry_speed, ups=None, heartline_offset=0.0, time_step=DEFAULT_TIME_STEP,
+          smoothing=DEFAULT_SMOOTHING, tolerance=DEFAULT_TOLERANCE, spacing=0.1, lookahead=2.0):
+    """
+    Fits a G/roll profile to a centreline.
+
+    Args:
+        points: (N, 3) target centreline.
+        entry_speed: Velocity at the first point, in m/s.
+        ups: (N, 3) target up vectors, or None to bank for zero lateral G.
+        heartline_offset: Heartline offset in m.
+        time_step: FVD timestep.
+        smoothing: Smoothing weights to try.
+        tolerance: Largest acceptable position error in m. The smoothest
+            profile within it wins, otherwise the most accurate one.
+        spacing: Target resample spacing in m.
+        lookahead: Distance over which tracking error is steered out, in m.
+
+    Returns:
+        FvdFit.
+    """
+    target = TargetPath(points, ups, entry_speed, heartline_offset, spacing)
+    raw = track_profile(target, entry_speed, heartline_offset, time_step, lookahead)
+
+    weights = np.asarray(smoothing, dtype=np.float64)
+    candidates = smooth_profiles(raw, weights)
+
+    point0, forward0, up0 = target.sample(0.0)
+    start = FvdPoint.start(point0, forward0, up0, entry_speed, heartline_offset, batch_shape=(len(weights),))
+    centres, _ = simulate(start, candidates, heartline_offset, time_step)
+
+    # Residuals against the target, following each run along the path.
+    arcs, errors = project_runs(target, centres)
+    end_errors = np.linalg.norm(centres[:, -1] - target.points[-1], axis=-1)
+
+    worst = errors.max(axis=1)
+    within = np.flatnonzero(worst <= tolerance)
+    best = within[np.argmax(weights[within])] if len(within) else int(np.argmin(worst))
+
+    num_metres = max(int(np.ceil(target.length)), 1)
+    error_by_metre = np.zeros(num_metres)
+    np.maximum.at(error_by_metre, np.clip(arcs[best].astype(np.int64), 0, num_metres - 1), errors[best])
+
+    return FvdFit(
+        candidates[best],
+        centres[best],
+        errors[best],
+        error_by_metre,
+        float(end_errors[best]),
+        float(weights[best]),
+        time_step,
+        target.length,
+    )
+
+
+def load_target(path, start=None, end=None):
+    """
+    Loads a target from a ride .npz (follower 1 between start and end seconds)
+    or a CSV of x,y,z[,ux,uy,uz] rows.
+
+    Returns:
+        (points, ups or None, entry speed or None)
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        ride = TrainMeasurements.load(path)
+        times = ride.times
+        mask = np.ones(len(ride), dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        if not np.any(mask):
+            raise ValueError(f"No samples between {start if start is not None else 0.0:g}s and "
+                             f"{end if end is not None else ride.duration:g}s, the ride is {ride.duration:.2f}s long")
+        orientation = ride.orientation[mask, FOLLOWER_ORIGIN]
+        _, _, ups = fvd.frame_from_quaternion(orientation)
+        return ride.position[mask, FOLLOWER_ORIGIN], ups, float(ride.velocity[mask][0])
+
+    rows = []
+    with open(path, "r", newline="") as f:
+        for row in csv.reader(f):
+            try:
+                rows.append([float(o) for o in row])
+            except ValueError:
+                # Header
+                continue
+    if not rows:
+        raise ValueError(f"No x,y,z rows in {path}")
+    data = np.array(rows)
+    ups = data[:, 3:6] if data.shape[1] >= 6 else None
+    return data[:, :3], ups, None
+
+
+def write_profile(path, fit):
+    distances = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(fit.centres, axis=0), axis=1))))
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "distance", "lat_g", "vert_g", "roll_rate"])
+        for i, (lat_g, vert_g, roll) in enumerate(fit.profile):
+            writer.writerow([f"{i * fit.time_step:.4f}", f"{distances[i]:.4f}", f"{lat_g:.5f}", f"{vert_g:.5f}",
+                             f"{roll:.6f}"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit an FVD G/roll profile to an existing track section"
+    )
+    parser.add_argument("target", help="Ride .npz from protracktools.logparse, or a CSV of x,y,z[,ux,uy,uz]")
+    parser.add_argument("--start", type=float, help="Section start time in the ride, in seconds")
+    parser.add_argument("--end", type=float, help="Section end time in the ride, in seconds")
+    parser.add_argument("--speed", type=float, help="Entry speed in m/s (defaults to the ride's)")
+    parser.add_argument("--heartline", type=float, default=0.0, help="Heartline offset in m")
+    parser.add_argument("--bank", action="store_true", help="Ignore target up vectors and bank for zero lateral G")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Largest acceptable error in m")
+    parser.add_argument("-o", "--output", help="Output profile CSV")
+    args = parser.parse_args()
+
+    target_path = Path(args.target)
+    if not target_path.exists():
+        print(f"Error: Target not found: {target_path}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        points, ups, speed = load_target(target_path, args.start, args.end)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    speed = args.speed if args.speed is not None else speed
+    if speed is None:
+        print("Error: An entry speed is required (--speed)", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        fit = solve(points, speed, None if args.bank else ups, args.heartline, tolerance=args.tolerance)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(fit)
+    print(f"  End point drift: {fit.error_per_metre * 1000.0:.2f}mm per metre")
+    print(f"  Worst metre: {fit.error_by_metre.max():.4f}m at {int(np.argmax(fit.error_by_metre))}m")
+
+    if args.output:
+        write_profile(args.output, fit)
+        print(f"  Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,580 @@
+"""
+Streaming parser for Utils.PrintTable dumps.
+
+Utils.PrintTable (Main/protrack/utils.lua) writes one logger line per key and
+per value, indenting nested tables by two spaces per level:
+
+    {
+      1 =
+        {
+          originVelocity =
+            12.5
+          measurements =
+            {
+            ...
+
+The parser consumes the log line by line, rebuilding nested tables as dicts.
+Any table that looks like a TrainMeasurement is converted into array rows as
+soon as it closes and then dropped, so memory stays bounded by one measurement
+no matter how long the ride is.
+
+Throughput is bound by per line Python work, about 2us a line. On a 33 MB dump
+(580k lines) that is roughly 27 MB/s at best on an idle machine, and 15-20 MB/s
+in single runs under load. Reading the lines alone runs at about 800 MB/s;
+stripping the logger prefix takes about a quarter of the time, rebuilding the
+tables half and converting measurements the rest.
+
+usage: python -m protracktools.logparse path/to/log.txt -o ride.npz --train-length 12
+"""
+
+import re
+import sys
+import argparse
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from protracktools.measurements import MeasurementBuilder, SIMULATION_DELTA, walk_offsets
+
+# Logger name used by Utils.PrintTable
+DEFAULT_LOGGER = "ProTrackUtil"
+
+# Whatever the logger writes between its name and the message, e.g. "]: " or "] [INFO] ".
+_AFTER_LOGGER = re.compile(r"[\]\):>]*(?:\s*\[?(?:INFO|Info|info)\]?:?)? ?")
+
+_NUMBER = re.compile(
+    r"(?<![\w.])[-+]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|nan|inf)(?![\w.])",
+    re.IGNORECASE
+)
+_NUMBER_START = frozenset("-+.0123456789niNI")
+_TRANSFORM_LABEL = re.compile(r"\b(pos(?:ition)?|or(?:ientation)?|rot(?:ation)?|quat(?:ernion)?)\b", re.IGNORECASE)
+# "Label=(1, 2, 3)", how userdata like Vector3 and TransformQ usually print.
+_LABELLED_GROUP = re.compile(r"(\w*)[\s=:]*\(([^()]*)\)")
+
+_OPEN = "{"
+_CLOSE = "}"
+_KEY_SUFFIX = " ="
+_METATABLE_OPEN = "metatable.__index = {"
+_METATABLE_SEEN = "metatable.__index = [already seen]"
+
+
+class _AlreadySeen():
+    """ Marker for a "(already seen)" line. The real value was printed earlier in the dump. """
+
+    def __repr__(self):
+        return "ALREADY_SEEN"
+
+
+ALREADY_SEEN = _AlreadySeen()
+
+_NAN = float("nan")
+_NAN3 = [_NAN] * 3
+_NAN4 = [_NAN] * 4
+
+# Returned from an on_table callback to drop the table from its parent.
+DROP = object()
+
+
+def iter_payloads(lines, logger=DEFAULT_LOGGER):
+    """
+    Strips the logger prefix from each line, skipping lines from other loggers.
+
+    Args:
+        lines: Iterable of raw log lines.
+        logger: Logger name to filter on, or None if the lines are the bare dump.
+
+    Yields:
+        The message of each line, indentation included.
+    """
+    if logger is None:
+        for line in lines:
+            yield line.rstrip("\r\n")
+        return
+
+    after = _AFTER_LOGGER.match
+    skip = len(logger)
+    # The separator after the logger name is the same on every line, so match
+    # it once and fall back to the regex only when it changes.
+    separator = None
+    for line in lines:
+        idx = line.find(logger)
+        if idx < 0:
+            continue
+        start = idx + skip
+        if separator is not None and line.startswith(separator, start):
+            start += len(separator)
+        else:
+            end = after(line, start).end()
+            separator = line[start:end]
+            start = end
+        if line[-1:] == "\n":
+            yield line[start:-1].rstrip("\r")
+        else:
+            yield line[start:]
+
+
+def parse_scalar(text):
+    """
+    Converts a printed primitive back into a Python value.
+    Anything that isn't a number or boolean (userdata, functions) stays a string.
+    """
+    if text == "true":
+        return True
+    if text == "false":
+        return False
+    if text[:1] not in _NUMBER_START:
+        return text
+    try:
+        if text.isdigit():
+            return int(text)
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parse_key(text):
+    if text.isdigit():
+        return int(text)
+    return text
+
+
+class PrintTableParser():
+    """
+    Incremental parser for PrintTable output.
+
+    Feed it one message at a time. feed() returns the root table once a full
+    dump has been read and None while one is still in progress. Lines that
+    can't belong to the dump, outside it or not indented under the open
+    table, are ignored.
+
+    Args:
+        on_table: Optional callback, on_table(table, depth), called when a table
+            closes. Its return value replaces the table in its parent. Returning
+            DROP removes the entry entirely.
+    """
+
+    def __init__(self, on_table=None):
+        self.on_table = on_table
+        # Frames are [table, indent, pending key, pending key has value]
+        self._stack = []
+        self._skip_indent = None
+
+    @property
+    def in_dump(self):
+        return len(self._stack) > 0
+
+    @property
+    def pending_key(self):
+        """ The key of the innermost open table currently awaiting a value """
+        if not self._stack:
+            return None
+        return self._stack[-1][2]
+
+    def reset(self):
+        self._stack = []
+        self._skip_indent = None
+
+    def _value(self, value):
+        """ Delivers a value to the open key, or returns it as a finished root value. """
+        if not self._stack:
+            return value
+
+        frame = self._stack[-1]
+        if frame[2] is not None and not frame[3]:
+            if value is not DROP:
+                frame[0][frame[2]] = value
+            frame[3] = True
+        return None
+
+    def feed(self, payload):
+        stripped = payload.lstrip(" ")
+        indent = len(payload) - len(stripped)
+
+        # Inside a userdata metatable listing; skip to its closing brace.
+        if self._skip_indent is not None:
+            if stripped == _CLOSE and indent == self._skip_indent:
+                self._skip_indent = None
+            return None
+
+        if stripped == _OPEN:
+            self._stack.append([{}, indent, None, False])
+            return None
+
+        if stripped == _CLOSE:
+            # Pop back to the matching brace, recovering from truncated dumps.
+            while len(self._stack) > 1 and self._stack[-1][1] > indent:
+                self._stack.pop()
+            if not self._stack:
+                return None
+
+            table = self._stack.pop()[0]
+            if self.on_table is not None:
+                table = self.on_table(table, len(self._stack))
+            return self._value(table)
+
+        if stripped[-2:] == _KEY_SUFFIX and self._stack:
+            frame = self._stack[-1]
+            if frame[2] is not None and not frame[3]:
+                # The previous key had no value printed (cut off by maxIndent).
+                frame[0][frame[2]] = None
+            frame[2] = parse_key(stripped[:-2])
+            frame[3] = False
+            return None
+
+        if not self._stack or indent <= self._stack[-1][1]:
+            # Not part of the dump, e.g. WalkTrack's "Exit! ..." lines on the same logger.
+            return None
+
+        if stripped[-1:] == "{" and stripped == _METATABLE_OPEN:
+            self._skip_indent = indent
+            return None
+
+        if stripped[-1:] == "]" and stripped == _METATABLE_SEEN:
+            return None
+
+        if stripped[-1:] == ")" and stripped.endswith("(already seen)"):
+            return self._value(ALREADY_SEEN)
+
+        return self._value(parse_scalar(stripped))
+
+
+def iter_tables(lines, logger=DEFAULT_LOGGER, on_table=None):
+    """
+    Yields every table dumped by PrintTable in a log.
+
+    Args:
+        lines: Iterable of raw log lines.
+        logger: Logger name to filter on.
+        on_table: See PrintTableParser.
+    """
+    parser = PrintTableParser(on_table)
+    for payload in iter_payloads(lines, logger):
+        value = parser.feed(payload)
+        if value is not None:
+            yield value
+
+
+def _numbers(text):
+    return [float(o) for o in _NUMBER.findall(text)]
+
+
+def _labelled_groups(text):
+    """
+    Fast path for reprs made of "Label=(1, 2, 3)" groups, which splits each
+    group on commas rather than searching for numbers.
+
+    Returns:
+        List of (label, numbers), or None if a group isn't just numbers.
+    """
+    try:
+        return [(label, [float(n) for n in nums.split(",")]) for label, nums in _LABELLED_GROUP.findall(text)]
+    except ValueError:
+        return None
+
+
+def _strip_userdata_name(text):
+    """ Drops the "<Name> " prefix PrintTable puts on userdata with a metatable name """
+    if text[:1] == "<":
+        end = text.find(">")
+        if end >= 0:
+            return text[end + 1:]
+    return text
+
+
+def _lookup(table, *names):
+    """ Case insensitive lookup of the first key starting with any of names """
+    for key, value in table.items():
+        if isinstance(key, str):
+            lower = key.lower()
+            for name in names:
+                if lower.startswith(name):
+                    return value
+    return None
+
+
+def vector_from_value(value, width=3):
+    """
+    Converts a printed vector into a list of floats.
+
+    Args:
+        value: Either a userdata repr string or a table of x/y/z(/w) fields.
+        width: Number of components.
+
+    Returns:
+        The components, or None if the value was already seen or unreadable.
+    """
+    if isinstance(value, str):
+        text = _strip_userdata_name(value)
+        groups = _labelled_groups(text)
+        if groups is not None and len(groups) == 1 and len(groups[0][1]) >= width:
+            return groups[0][1][:width]
+
+        nums = _numbers(text)
+        if len(nums) >= width:
+            return nums[:width]
+        return None
+
+    if isinstance(value, dict):
+        names = "xyzw"[:width]
+        out = []
+        for i, name in enumerate(names):
+            comp = value.get(name, value.get(name.upper(), value.get(i + 1)))
+            if not isinstance(comp, (int, float)):
+                return None
+            out.append(float(comp))
+        return out
+
+    return None
+
+
+def transform_from_value(value):
+    """
+    Converts a printed TransformQ into (position, orientation).
+
+    Labelled reprs ("Pos ... Or ...") are split on their labels. Unlabelled
+    reprs with seven numbers are read in TransformQ.FromOrPos order:
+    orientation (x, y, z, w) followed by position (x, y, z).
+
+    Returns:
+        Tuple of lists, or None if the value was already seen or unreadable.
+    """
+    if isinstance(value, dict):
+        pos = vector_from_value(_lookup(value, "pos"), 3)
+        orientation = vector_from_value(_lookup(value, "or", "rot", "quat"), 4)
+        if pos is None or orientation is None:
+            return None
+        return pos, orientation
+
+    if not isinstance(value, str):
+        return None
+
+    text = _strip_userdata_name(value)
+    groups = _labelled_groups(text)
+    if groups is not None and len(groups) == 2:
+        pos = None
+        orientation = None
+        for label, nums in groups:
+            if _TRANSFORM_LABEL.fullmatch(label) is None:
+                break
+            if label[:1] in "pP":
+                pos = nums
+            else:
+                orientation = nums
+        if pos is not None and len(pos) >= 3 and orientation is not None and len(orientation) >= 4:
+            return pos[:3], orientation[:4]
+
+    parts = _TRANSFORM_LABEL.split(text)
+    if len(parts) >= 5:
+        pos = None
+        orientation = None
+        # parts alternates [prefix, label, numbers, label, numbers, ...]
+        for i in range(1, len(parts) - 1, 2):
+            nums = _numbers(parts[i + 1])
+            if parts[i][:1] in "pP":
+                pos = nums[:3] if len(nums) >= 3 else None
+            else:
+                orientation = nums[:4] if len(nums) >= 4 else None
+        if pos is None or orientation is None:
+            return None
+        return pos, orientation
+
+    nums = _numbers(text)
+    if len(nums) < 7:
+        return None
+    return nums[4:7], nums[0:4]
+
+
+def is_train_measurement(table):
+    return isinstance(table, dict) and "originVelocity" in table and "measurements" in table
+
+
+class MeasurementCollector():
+    """
+    on_table callback that converts TrainMeasurement tables into array rows.
+
+    Values printed as "(already seen)" are filled from the same follower in
+    the previous sample, falling back to the previous follower in this sample.
+    This covers the G force patch in WalkTrack, where the first two samples
+    share their G vectors.
+
+    Args:
+        parser: The parser this collector is attached to, used to read the
+            datapoint index each TrainMeasurement was printed under.
+    """
+
+    def __init__(self, parser=None):
+        self.parser = parser
+        self.builder = MeasurementBuilder()
+        self.keys = array("q")
+        self._last_g = None
+        self._last_pos = None
+        self._last_or = None
+
+    def __call__(self, table, depth):
+        if not is_train_measurement(table):
+            return table
+
+        key = self.parser.pending_key if self.parser is not None else None
+        if not isinstance(key, int):
+            key = len(self.keys) + 1
+
+        if self.add(table):
+            self.keys.append(key)
+        return DROP
+
+    def add(self, table):
+        """ Converts and appends one TrainMeasurement table. Returns False if it had no followers. """
+        followers = table["measurements"]
+        if not isinstance(followers, dict):
+            return False
+
+        follower_keys = sorted(k for k in followers if isinstance(k, int))
+        num_followers = len(follower_keys)
+        if self.builder.num_followers is not None and num_followers != self.builder.num_followers:
+            raise ValueError(
+                f"TrainMeasurement has {num_followers} followers, expected {self.builder.num_followers}"
+            )
+
+        g = []
+        pos = []
+        orientation = []
+
+        for i, key in enumerate(follower_keys):
+            follower = followers[key]
+            if not isinstance(follower, dict):
+                follower = {}
+
+            vec = vector_from_value(follower.get("g"), 3)
+            if vec is None:
+                if self._last_g is not None:
+                    vec = self._last_g[3 * i:3 * i + 3]
+                elif i > 0:
+                    vec = g[-3:]
+                else:
+                    vec = _NAN3
+            g.extend(vec)
+
+            transform = transform_from_value(follower.get("transform"))
+            if transform is not None:
+                pos.extend(transform[0])
+                orientation.extend(transform[1])
+            elif self._last_pos is not None:
+                pos.extend(self._last_pos[3 * i:3 * i + 3])
+                orientation.extend(self._last_or[4 * i:4 * i + 4])
+            else:
+                pos.extend(_NAN3)
+                orientation.extend(_NAN4)
+
+        velocity = table["originVelocity"]
+        if not isinstance(velocity, (int, float)):
+            velocity = _NAN
+
+        self.builder.append(velocity, g, pos, orientation)
+        self._last_g = g
+        self._last_pos = pos
+        self._last_or = orientation
+        return True
+
+    def build(self, offsets=None, time_delta=SIMULATION_DELTA):
+        measurements = self.builder.build(offsets, time_delta)
+        keys = np.frombuffer(self.keys, dtype=np.int64)
+        # pairs() gives no ordering guarantee, so restore the datapoint order.
+        if len(keys) > 1 and np.any(np.diff(keys) < 0):
+            order = np.argsort(keys, kind="stable")
+            measurements.velocity = measurements.velocity[order]
+            measurements.g = measurements.g[order]
+            measurements.position = measurements.position[order]
+            measurements.orientation = measurements.orientation[order]
+        return measurements
+
+
+def iter_measurements(lines, logger=DEFAULT_LOGGER, offsets=None, time_delta=SIMULATION_DELTA):
+    """
+    Yields one TrainMeasurements per dump that contained TrainMeasurement tables,
+    e.g. each Utils.PrintTable(Datastore.datapoints) call in the log.
+
+    Args:
+        lines: Iterable of raw log lines.
+        logger: Logger name to filter on.
+        offsets: Follower offsets in metres, if known.
+        time_delta: Simulation timestep used by WalkTrack.
+    """
+    parser = PrintTableParser()
+    collector = MeasurementCollector(parser)
+    parser.on_table = collector
+
+    for payload in iter_payloads(lines, logger):
+        if parser.feed(payload) is None:
+            continue
+        if collector.builder.count > 0:
+            yield collector.build(offsets, time_delta)
+        collector = MeasurementCollector(parser)
+        parser.on_table = collector
+
+    # Log ended mid dump; return what was read.
+    if collector.builder.count > 0:
+        yield collector.build(offsets, time_delta)
+
+
+def open_log(path):
+    return open(path, "r", encoding="utf-8", errors="replace", buffering=1 << 20)
+
+
+def load_measurements(path, logger=DEFAULT_LOGGER, offsets=None, time_delta=SIMULATION_DELTA):
+    """
+    Reads every TrainMeasurement dump in a log file.
+
+    Returns:
+        List of TrainMeasurements, in log order.
+    """
+    with open_log(path) as f:
+        return list(iter_measurements(f, logger, offsets, time_delta))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert Utils.PrintTable dumps of Datastore.datapoints into NumPy arrays"
+    )
+    parser.add_argument("log", help="Path to the game log")
+    parser.add_argument("-o", "--output", help="Output .npz path. Multiple dumps get an index suffix.")
+    parser.add_argument("--logger", default=DEFAULT_LOGGER, help="Logger name the dump was written with")
+    parser.add_argument("--raw", action="store_true", help="Input is a bare dump without logger prefixes")
+    offset_group = parser.add_mutually_exclusive_group()
+    offset_group.add_argument("--train-length", type=float,
+                              help="Train length in m, for the offsets protrackManager.NewWalk walks with")
+    offset_group.add_argument("--offsets", type=float, nargs="+", help="Follower offsets in m, origin first")
+    args = parser.parse_args()
+
+    log_path = Path(args.log)
+    if not log_path.exists():
+        print(f"Error: Log not found: {log_path}", file=sys.stderr)
+        sys.exit(1)
+
+    offsets = None
+    if args.train_length is not None:
+        offsets = walk_offsets(args.train_length)
+    elif args.offsets is not None:
+        offsets = np.array(args.offsets)
+
+    rides = load_measurements(log_path, None if args.raw else args.logger, offsets)
+    if not rides:
+        print("No TrainMeasurement dumps found.")
+        sys.exit(1)
+    if offsets is not None:
+        for ride in rides:
+            if ride.num_followers != len(offsets):
+                print(f"Error: Got {len(offsets)} offsets for a ride with {ride.num_followers} followers",
+                      file=sys.stderr)
+                sys.exit(1)
+
+    output = Path(args.output) if args.output else log_path.with_suffix(".npz")
+    for i, ride in enumerate(rides):
+        print(f"[{i}] {ride}")
+        out_path = output if len(rides) == 1 else output.with_name(f"{output.stem}_{i}{output.suffix}")
+        ride.save(out_path)
+        print(f"  Saved to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
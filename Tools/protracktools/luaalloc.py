@@ -0,0 +1,956 @@
+"""
+Static allocation report for the mod's hot Lua paths.
+
+protrackManager.Advance runs every frame and Utils.WalkTrack runs once per
+simulation step, so anything they allocate adds to the game's GC pressure.
+This parses the Lua sources with a small pure-Python Lua 5.4 parser, builds a
+call graph from the entry points and ranks every allocation site reachable
+from them:
+
+- table: table constructors, {...}
+- closure: functions created inside another function
+- concat: string concatenation, one per a .. b .. c chain
+- vector: Vector3/Quaternion/TransformQ temporaries, from their constructors,
+  from methods known to return a new one (GetPos, ToWorld, ...) and from
+  arithmetic on values known to be vectors
+
+Sites are scored by loop_weight ** loop depth, multiplied by how often their
+function runs per entry call: the largest product of loop weights over the
+call sites leading to it. Calls are resolved through local functions,
+require aliases, self and, for methods on unknown objects, every function of
+that name, so the graph over-approximates rather than misses paths.
+
+usage: python -m protracktools.luaalloc --entry Advance WalkTrack --top 30
+"""
+
+import re
+import sys
+import argparse
+from pathlib import Path
+
+MAIN_PATH = Path(__file__).resolve().parents[2] / "Main"
+DEFAULT_ENTRIES = ("Advance", "WalkTrack")
+DEFAULT_LOOP_WEIGHT = 10.0
+# Caps the frequency of functions on recursive or deep paths, in loop weights.
+MAX_FREQUENCY_DEPTH = 6
+
+KIND_TABLE = "table"
+KIND_CLOSURE = "closure"
+KIND_CONCAT = "concat"
+KIND_VECTOR = "vector"
+KINDS = (KIND_TABLE, KIND_CLOSURE, KIND_CONCAT, KIND_VECTOR)
+
+# Game modules whose functions return new userdata, except the ones listed as scalar.
+VECTOR_MODULES = {"Vector2", "Vector3", "Quaternion", "TransformQ"}
+SCALAR_FUNCTIONS = {"Dot", "Length", "LengthSq", "Distance", "DistanceSq", "ApproxEquals"}
+# Methods returning a new Vector3, Quaternion or TransformQ.
+VECTOR_METHODS = {
+    "GetPos", "GetOr", "GetF", "GetU", "GetR", "GetTransform", "GetTransformQ",
+    "ToWorld", "ToWorldPos", "ToWorldDir", "ToLocal", "ToLocalPos", "ToLocalDir",
+    "ToYawPitchRoll", "Normalised", "Inverse",
+}
+VECTOR_OPERATORS = {"+", "-", "*", "/"}
+
+KEYWORDS = {
+    "and", "break", "do", "else", "elseif", "end", "false", "for", "function", "goto", "if", "in",
+    "local", "nil", "not", "or", "repeat", "return", "then", "true", "until", "while",
+}
+OPERATORS = (
+    "...", "..", "==", "~=", "<=", ">=", "//", "::", "<<", ">>",
+    "+", "-", "*", "/", "%", "^", "#", "&", "~", "|", "<", ">", "=",
+    "(", ")", "{", "}", "[", "]", ";", ":", ",", ".",
+)
+# Left and right priorities, as in lparser.c.
+BINARY_PRIORITY = {
+    "or": (1, 1), "and": (2, 2),
+    "<": (3, 3), ">": (3, 3), "<=": (3, 3), ">=": (3, 3), "~=": (3, 3), "==": (3, 3),
+    "|": (4, 4), "~": (5, 5), "&": (6, 6), "<<": (7, 7), ">>": (7, 7),
+    "..": (9, 8), "+": (10, 10), "-": (10, 10),
+    "*": (11, 11), "/": (11, 11), "//": (11, 11), "%": (11, 11),
+    "^": (14, 13),
+}
+UNARY_PRIORITY = 12
+
+NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+NUMBER_RE = re.compile(r"0[xX][0-9a-fA-F.]*(?:[pP][+-]?\d+)?|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+LONG_BRACKET_RE = re.compile(r"\[(=*)\[")
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "a": "\a", "b": "\b", "f": "\f", "v": "\v"}
+
+
+class LuaSyntaxError(ValueError):
+    pass
+
+
+class Token():
+    """ kind is 'name', 'number', 'string', 'eof', or the keyword/operator itself """
+
+    def __init__(self, kind, value, line):
+        self.kind = kind
+        self.value = value
+        self.line = line
+
+
+def _read_long_bracket(source, i, line, what):
+    """ Reads a [==[ ... ]==] block starting at i. Returns (text, end index, end line) """
+    match = LONG_BRACKET_RE.match(source, i)
+    close = "]" + match.group(1) + "]"
+    end = source.find(close, match.end())
+    if end < 0:
+        raise LuaSyntaxError(f"line {line}: unfinished long {what}")
+    text = source[match.end():end]
+    if text.startswith("\n"):
+        text = text[1:]
+    return text, end + len(close), line + source.count("\n", i, end)
+
+
+def _read_string(source, i, line):
+    """ Reads a quoted string starting at i. Returns (value, end index, end line) """
+    quote = source[i]
+    i += 1
+    chars = []
+    while True:
+        if i >= len(source) or source[i] == "\n":
+            raise LuaSyntaxError(f"line {line}: unfinished string")
+        c = source[i]
+        if c == quote:
+            return "".join(chars), i + 1, line
+        if c != "\\":
+            chars.append(c)
+            i += 1
+            continue
+
+        e = source[i + 1:i + 2]
+        i += 2
+        if e in ESCAPES:
+            chars.append(ESCAPES[e])
+        elif e == "\n":
+            chars.append("\n")
+            line += 1
+        elif e == "z":
+            while i < len(source) and source[i].isspace():
+                line += source[i] == "\n"
+                i += 1
+        elif e == "x":
+            chars.append(chr(int(source[i:i + 2], 16)))
+            i += 2
+        elif e == "u":
+            end = source.index("}", i)
+            chars.append(chr(int(source[i + 1:end], 16)))
+            i = end + 1
+        elif e.isdigit():
+            digits = re.match(r"\d{1,3}", source[i - 1:]).group(0)
+            chars.append(chr(int(digits)))
+            i += len(digits) - 1
+        else:
+            chars.append(e)
+
+
+def tokenize(source):
+    """ Splits Lua source into Tokens, dropping comments """
+    tokens = []
+    i = 0
+    line = 1
+    n = len(source)
+    if source.startswith("#"):
+        # Shebang line.
+        i = source.find("\n")
+        i = n if i < 0 else i
+
+    while i < n:
+        c = source[i]
+        if c == "\n":
+            line += 1
+            i += 1
+        elif c in " \t\r\f\v":
+            i += 1
+        elif source.startswith("--", i):
+            if LONG_BRACKET_RE.match(source, i + 2):
+                _, i, line = _read_long_bracket(source, i + 2, line, "comment")
+            else:
+                end = source.find("\n", i)
+                i = n if end < 0 else end
+        elif c.isalpha() or c == "_":
+            name = NAME_RE.match(source, i).group(0)
+            tokens.append(Token(name if name in KEYWORDS else "name", name, line))
+            i += len(name)
+        elif c.isdigit() or (c == "." and source[i + 1:i + 2].isdigit()):
+            number = NUMBER_RE.match(source, i).group(0)
+            tokens.append(Token("number", number, line))
+            i += len(number)
+        elif c in "\"'":
+            value, i, end_line = _read_string(source, i, line)
+            tokens.append(Token("string", value, line))
+            line = end_line
+        elif LONG_BRACKET_RE.match(source, i):
+            value, i, end_line = _read_long_bracket(source, i, line, "string")
+            tokens.append(Token("string", value, line))
+            line = end_line
+        else:
+            for op in OPERATORS:
+                if source.startswith(op, i):
+                    tokens.append(Token(op, op, line))
+                    i += len(op)
+                    break
+            else:
+                raise LuaSyntaxError(f"line {line}: unexpected character {c!r}")
+
+    tokens.append(Token("eof", None, line))
+    return tokens
+
+
+class LuaFunction():
+    """
+    A function found in the sources.
+
+    Attributes:
+        key: Unique "file:line" key.
+        name: Name as declared, e.g. Utils.WalkTrack, or <anonymous>.
+        file: Path relative to the source root.
+        line: Line of the function keyword.
+        parent: Key of the enclosing function, None for file level functions.
+        creation_depth: Loop depth in the parent where the closure is created.
+        sites: AllocationSites inside this function, not counting nested functions.
+        calls: CallSites inside this function.
+    """
+
+    def __init__(self, key, name, file, line, parent=None, creation_depth=0):
+        self.key = key
+        self.name = name
+        self.file = file
+        self.line = line
+        self.parent = parent
+        self.creation_depth = creation_depth
+        self.sites = []
+        self.calls = []
+
+    def __str__(self):
+        return f"{self.name} ({self.file}:{self.line})"
+
+
+class AllocationSite():
+    def __init__(self, kind, line, loop_depth, detail=""):
+        self.kind = kind
+        self.line = line
+        self.loop_depth = loop_depth
+        self.detail = detail
+
+
+class CallSite():
+    """
+    A call to resolve once every file is parsed.
+
+    Args:
+        target: ("key", key), ("module", module, path), ("qualified", path) or ("unknown", None).
+        method: Method name for a:b() calls, else None.
+        line: Source line.
+        loop_depth: Loop depth of the call.
+    """
+
+    def __init__(self, target, method, line, loop_depth):
+        self.target = target
+        self.method = method
+        self.line = line
+        self.loop_depth = loop_depth
+
+
+class _Binding():
+    """ What the parser knows about a local """
+
+    def __init__(self, function_key=None, module=None, is_vector=False):
+        self.function_key = function_key
+        self.module = module
+        self.is_vector = is_vector
+
+
+class _Expr():
+    """ What the parser knows about an expression """
+
+    def __init__(self, path=None, binding=None, is_vector=False, function=None, module=None, concat=False):
+        self.path = path
+        self.binding = binding
+        self.is_vector = is_vector
+        self.function = function
+        self.module = module
+        self.concat = concat
+
+
+class _Context():
+    def __init__(self, function, owner):
+        self.function = function
+        self.owner = owner
+        self.loop_depth = 0
+
+
+class LuaFile():
+    """
+    Functions and module information from one parsed file.
+
+    Attributes:
+        path: Path relative to the source root.
+        functions: LuaFunctions by key, including the file's main chunk.
+        qualified: Keys of file level functions by dotted name, e.g. Utils.WalkTrack.
+        returned: Name of the table the file returns, if any.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.functions = {}
+        self.qualified = {}
+        self.returned = None
+
+
+class _Parser():
+    """ Recursive descent over Lua 5.4, recording allocations and calls as it goes """
+
+    def __init__(self, tokens, lua_file):
+        self.tokens = tokens
+        self.pos = 0
+        self.file = lua_file
+        self.scopes = []
+        self.contexts = []
+
+    # Tokens
+
+    @property
+    def token(self):
+        return self.tokens[self.pos]
+
+    def peek(self, offset=1):
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def check(self, kind):
+        return self.token.kind == kind
+
+    def accept(self, kind):
+        if self.token.kind == kind:
+            return self.next()
+        return None
+
+    def expect(self, kind, opener=None):
+        if self.token.kind != kind:
+            where = f" to close {opener.kind} at line {opener.line}" if opener else ""
+            found = self.token.value if self.token.value is not None else "<eof>"
+            raise LuaSyntaxError(f"line {self.token.line}: expected {kind!r}{where}, got {found!r}")
+        return self.next()
+
+    def name(self):
+        return self.expect("name").value
+
+    # Scopes and recording
+
+    def declare(self, name, binding=None):
+        self.scopes[-1][name] = binding or _Binding()
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    @property
+    def context(self):
+        return self.contexts[-1]
+
+    def site(self, kind, line, detail=""):
+        self.context.function.sites.append(AllocationSite(kind, line, self.context.loop_depth, detail))
+
+    def loop_body(self, parse):
+        self.context.loop_depth += 1
+        parse()
+        self.context.loop_depth -= 1
+
+    # Chunks and blocks
+
+    def chunk(self):
+        main = LuaFunction(f"{self.file.path}:0", "<main>", self.file.path, 0)
+        self.file.functions[main.key] = main
+        self.contexts.append(_Context(main, None))
+        self.scopes.append({})
+        self.block(top_level=True)
+        self.expect("eof")
+
+    def block(self, top_level=False):
+        self.scopes.append({})
+        while self.token.kind not in ("return", "eof", "end", "else", "elseif", "until"):
+            self.statement()
+        if self.check("return"):
+            self.next()
+            exprs = []
+            if self.token.kind not in ("eof", "end", "else", "elseif", "until", ";"):
+                exprs = self.exprlist()
+            self.accept(";")
+            if top_level and len(exprs) == 1 and exprs[0].path and len(exprs[0].path) == 1:
+                self.file.returned = exprs[0].path[0]
+        self.scopes.pop()
+
+    def statement(self):
+        token = self.token
+        kind = token.kind
+        if kind == ";":
+            self.next()
+        elif kind == "if":
+            self.next()
+            self.expr()
+            self.expect("then")
+            self.block()
+            while self.check("elseif"):
+                self.next()
+                self.expr()
+                self.expect("then")
+                self.block()
+            if self.accept("else"):
+                self.block()
+            self.expect("end", token)
+        elif kind == "while":
+            self.next()
+            self.loop_body(self.expr)
+            self.expect("do")
+            self.loop_body(self.block)
+            self.expect("end", token)
+        elif kind == "do":
+            self.next()
+            self.block()
+            self.expect("end", token)
+        elif kind == "for":
+            self.for_statement()
+        elif kind == "repeat":
+            self.next()
+            self.context.loop_depth += 1
+            self.block()
+            self.expect("until", token)
+            self.expr()
+            self.context.loop_depth -= 1
+        elif kind == "function":
+            self.function_statement()
+        elif kind == "local":
+            self.next()
+            if self.accept("function"):
+                name = self.name()
+                binding = _Binding()
+                self.declare(name, binding)
+                function = self.function_body(token.line, name, owner=self.context.owner)
+                binding.function_key = function.key
+            else:
+                self.local_statement()
+        elif kind == "::":
+            self.next()
+            self.name()
+            self.expect("::")
+        elif kind == "return":
+            raise LuaSyntaxError(f"line {token.line}: 'return' must be the last statement in a block")
+        elif kind == "break":
+            self.next()
+        elif kind == "goto":
+            self.next()
+            self.name()
+        else:
+            self.expression_statement()
+
+    def for_statement(self):
+        token = self.next()
+        names = [self.name()]
+        if self.accept("="):
+            self.expr()
+            self.expect(",")
+            self.expr()
+            if self.accept(","):
+                self.expr()
+        else:
+            while self.accept(","):
+                names.append(self.name())
+            self.expect("in")
+            self.exprlist()
+        self.expect("do")
+        self.scopes.append({name: _Binding() for name in names})
+        self.loop_body(self.block)
+        self.scopes.pop()
+        self.expect("end", token)
+
+    def function_statement(self):
+        token = self.next()
+        path = [self.name()]
+        while self.accept("."):
+            path.append(self.name())
+        method = self.accept(":") is not None
+        if method:
+            path.append(self.name())
+
+        binding = self.lookup(path[0]) if len(path) == 1 else None
+        display = ".".join(path[:-1]) + (":" if method else ".") + path[-1] if len(path) > 1 else path[0]
+        owner = ".".join(path[:-1]) if len(path) > 1 else self.context.owner
+        function = self.function_body(token.line, display, method=method, owner=owner, qualified=".".join(path))
+        if binding is not None:
+            binding.function_key = function.key
+
+    def local_statement(self):
+        names = []
+        while True:
+            names.append(self.name())
+            if self.accept("<"):
+                # Lua 5.4 attribute, <const> or <close>.
+                self.name()
+                self.expect(">")
+            if not self.accept(","):
+                break
+        exprs = self.exprlist() if self.accept("=") else []
+        for i, name in enumerate(names):
+            expr = exprs[i] if i < len(exprs) else None
+            self.declare(name, self.binding_for(name, expr))
+
+    def binding_for(self, name, expr):
+        if expr is None:
+            return _Binding()
+        if expr.function is not None:
+            expr.function.name = name
+            return _Binding(function_key=expr.function.key)
+        if expr.binding is not None and expr.path and len(expr.path) == 1:
+            # local x = y shares what we know about y.
+            return expr.binding
+        return _Binding(module=expr.module, is_vector=expr.is_vector)
+
+    def expression_statement(self):
+        targets = [self.suffixed_expr()]
+        if not self.check("=") and not self.check(","):
+            return
+        while self.accept(","):
+            targets.append(self.suffixed_expr())
+        self.expect("=")
+        exprs = self.exprlist()
+        for target, expr in zip(targets, exprs):
+            if not target.path:
+                continue
+            if expr.function is not None:
+                qualified = ".".join(target.path)
+                expr.function.name = qualified
+                if len(target.path) == 1 and target.binding is not None:
+                    target.binding.function_key = expr.function.key
+                elif expr.function.parent == self.file_main_key:
+                    self.file.qualified[qualified] = expr.function.key
+            elif len(target.path) == 1 and target.binding is not None:
+                target.binding.is_vector = expr.is_vector
+
+    # Functions
+
+    @property
+    def file_main_key(self):
+        return f"{self.file.path}:0"
+
+    def function_body(self, line, name, method=False, owner=None, qualified=None):
+        parent = self.context
+        nested = parent.function.key != self.file_main_key
+        if nested:
+            self.site(KIND_CLOSURE, line, name)
+
+        key = f"{self.file.path}:{line}"
+        while key in self.file.functions:
+            key += "'"
+        function = LuaFunction(key, name, self.file.path, line, parent.function.key, parent.loop_depth)
+        self.file.functions[key] = function
+        if qualified is not None and not nested:
+            self.file.qualified[qualified] = key
+
+        self.expect("(")
+        params = ["self"] if method else []
+        if not self.check(")"):
+            while True:
+                if self.accept("..."):
+                    break
+                params.append(self.name())
+                if not self.accept(","):
+                    break
+        self.expect(")")
+
+        self.contexts.append(_Context(function, owner))
+        self.scopes.append({param: _Binding() for param in params})
+        self.block()
+        self.scopes.pop()
+        self.contexts.pop()
+        self.expect("end")
+        return function
+
+    # Expressions
+
+    def exprlist(self):
+        exprs = [self.expr()]
+        while self.accept(","):
+            exprs.append(self.expr())
+        return exprs
+
+    def expr(self, limit=0):
+        token = self.token
+        if token.kind in ("not", "-", "#", "~"):
+            self.next()
+            operand = self.expr(UNARY_PRIORITY)
+            left = _Expr(is_vector=token.kind == "-" and operand.is_vector)
+            if left.is_vector:
+                self.site(KIND_VECTOR, token.line, "unary -")
+        else:
+            left = self.simple_expr()
+
+        while self.token.kind in BINARY_PRIORITY and BINARY_PRIORITY[self.token.kind][0] > limit:
+            op = self.next()
+            right = self.expr(BINARY_PRIORITY[op.kind][1])
+            if op.kind == "..":
+                # a .. b .. c is a single concatenation.
+                if not right.concat:
+                    self.site(KIND_CONCAT, op.line)
+                left = _Expr(concat=True)
+            elif op.kind in VECTOR_OPERATORS and (left.is_vector or right.is_vector):
+                self.site(KIND_VECTOR, op.line, f"operator {op.kind}")
+                left = _Expr(is_vector=True)
+            else:
+                left = _Expr()
+        return left
+
+    def simple_expr(self):
+        token = self.token
+        kind = token.kind
+        if kind in ("number", "string", "nil", "true", "false", "..."):
+            self.next()
+            return _Expr()
+        if kind == "{":
+            self.table_constructor()
+            return _Expr()
+        if kind == "function":
+            self.next()
+            return _Expr(function=self.function_body(token.line, "<anonymous>", owner=self.context.owner))
+        return self.suffixed_expr()
+
+    def table_constructor(self):
+        opener = self.expect("{")
+        self.site(KIND_TABLE, opener.line)
+        while not self.check("}"):
+            if self.check("["):
+                self.next()
+                self.expr()
+                self.expect("]")
+                self.expect("=")
+                self.expr()
+            elif self.check("name") and self.peek().kind == "=":
+                self.next()
+                self.next()
+                self.expr()
+            else:
+                self.expr()
+            if not self.accept(",") and not self.accept(";"):
+                break
+        self.expect("}", opener)
+
+    def primary_expr(self):
+        token = self.token
+        if token.kind == "name":
+            self.next()
+            binding = self.lookup(token.value)
+            return _Expr(
+                path=[token.value],
+                binding=binding,
+                is_vector=binding is not None and binding.is_vector,
+                module=binding.module if binding is not None else None,
+            )
+        if token.kind == "(":
+            self.next()
+            inner = self.expr()
+            self.expect(")", token)
+            return _Expr(is_vector=inner.is_vector, function=inner.function)
+        raise LuaSyntaxError(f"line {token.line}: unexpected {token.value if token.value is not None else '<eof>'!r}")
+
+    def suffixed_expr(self):
+        expr = self.primary_expr()
+        while True:
+            kind = self.token.kind
+            if kind == ".":
+                self.next()
+                field = self.name()
+                path = expr.path + [field] if expr.path else None
+                expr = _Expr(path=path, binding=expr.binding if path else None, module=expr.module)
+            elif kind == "[":
+                self.next()
+                self.expr()
+                self.expect("]")
+                expr = _Expr()
+            elif kind == ":":
+                line = self.next().line
+                method = self.name()
+                self.call_args()
+                expr = self.call(expr, method, line)
+            elif kind in ("(", "{", "string"):
+                line = self.token.line
+                args = self.call_args()
+                expr = self.call(expr, None, line, args)
+            else:
+                return expr
+
+    def call_args(self):
+        """ Returns the string argument of f"x" / f("x") calls, else None """
+        token = self.token
+        if token.kind == "string":
+            self.next()
+            return token.value
+        if token.kind == "{":
+            self.table_constructor()
+            return None
+        self.expect("(")
+        if self.accept(")"):
+            return None
+        first = self.token
+        exprs = self.exprlist()
+        self.expect(")", token)
+        if len(exprs) == 1 and first.kind == "string" and self.tokens[self.pos - 2] is first:
+            return first.value
+        return None
+
+    def call(self, callee, method, line, string_arg=None):
+        """ Records a call and works out what it returns """
+        path = callee.path
+        binding = callee.binding
+        depth = self.context.loop_depth
+
+        if path is None:
+            target = ("unknown", None)
+        elif len(path) == 1 and method is None and binding is not None and binding.function_key:
+            target = ("key", binding.function_key)
+        elif binding is not None and binding.module is not None:
+            target = ("module", binding.module, path[1:])
+        elif path[0] == "self" and self.context.owner:
+            target = ("qualified", self.context.owner.split(".") + path[1:])
+        else:
+            target = ("qualified", path)
+        self.context.function.calls.append(CallSite(target, method, line, depth))
+
+        # Files alias it with local require = global.require.
+        if path == ["require"] and string_arg is not None and (binding is None or binding.function_key is None):
+            return _Expr(module=string_arg)
+
+        # Globals are looked up by name, locals by what they were required as.
+        module = binding.module if binding is not None else (path[0] if path else None)
+        if method is not None:
+            is_vector = method in VECTOR_METHODS
+            name = method
+        else:
+            is_vector = path is not None and len(path) == 2 and module in VECTOR_MODULES \
+                and path[1] not in SCALAR_FUNCTIONS
+            name = ".".join(path) if path else ""
+        if is_vector:
+            self.site(KIND_VECTOR, line, name)
+        return _Expr(is_vector=is_vector)
+
+
+def parse_file(path, root):
+    """
+    Parses one Lua file.
+
+    Returns:
+        LuaFile.
+    """
+    lua_file = LuaFile(Path(path).relative_to(root).as_posix())
+    source = Path(path).read_text(encoding="utf-8", errors="replace")
+    try:
+        _Parser(tokenize(source), lua_file).chunk()
+    except LuaSyntaxError as e:
+        raise LuaSyntaxError(f"{lua_file.path}: {e}") from None
+    return lua_file
+
+
+class CallGraph():
+    """
+    Every parsed function with its resolved callees.
+
+    Args:
+        files: Parsed LuaFiles.
+    """
+
+    def __init__(self, files):
+        self.files = {lua_file.path: lua_file for lua_file in files}
+        self.functions = {}
+        for lua_file in files:
+            self.functions.update(lua_file.functions)
+
+        self.modules = {
+            path[:-len(".lua")].replace("/", "."): path for path in self.files if path.endswith(".lua")
+        }
+        self.by_name = {}
+        for function in self.functions.values():
+            short = re.split(r"[.:]", function.name)[-1]
+            self.by_name.setdefault(short, []).append(function.key)
+
+        # key -> [(callee key, loop depth)]
+        self.edges = {key: [] for key in self.functions}
+        for function in self.functions.values():
+            if function.parent is not None and not function.parent.endswith(":0"):
+                # Closures may be handed off as callbacks, so assume the creator runs them.
+                self.edges[function.parent].append((function.key, function.creation_depth))
+            for call in function.calls:
+                for callee in self.resolve(function.file, call):
+                    self.edges[function.key].append((callee, call.loop_depth))
+
+    def _qualified(self, file, path):
+        lua_file = self.files.get(file)
+        if lua_file is None or not path:
+            return None
+        return lua_file.qualified.get(".".join(path))
+
+    def resolve(self, file, call):
+        """ Returns the keys of the functions a CallSite may reach """
+        kind = call.target[0]
+        key = None
+        if kind == "key":
+            key = call.target[1]
+        elif kind == "module":
+            module_file = self.modules.get(call.target[1])
+            if module_file is not None:
+                returned = self.files[module_file].returned
+                path = ([returned] if returned else []) + call.target[2]
+                if call.method is not None:
+                    path = path + [call.method]
+                key = self._qualified(module_file, path)
+            else:
+                # A game module, not ours.
+                return []
+        elif kind == "qualified":
+            path = call.target[1] + ([call.method] if call.method is not None else [])
+            key = self._qualified(file, path)
+
+        if key is not None:
+            return [key]
+        if call.method is not None:
+            return self.by_name.get(call.method, [])
+        return []
+
+    def find(self, name):
+        """ Keys of functions named name, or ending in .name / :name """
+        return [
+            key for key, function in self.functions.items()
+            if function.name == name or re.split(r"[.:]", function.name)[-1] == name
+        ]
+
+    def frequencies(self, entries, loop_weight=DEFAULT_LOOP_WEIGHT):
+        """
+        How often each reachable function runs per entry call, as the largest
+        product of loop weights on any call path to it.
+
+        Returns:
+            (frequency by key, caller key by key along the heaviest path).
+        """
+        cap = loop_weight ** MAX_FREQUENCY_DEPTH
+        frequency = {key: 1.0 for key in entries}
+        caller = {key: None for key in entries}
+        pending = list(entries)
+        while pending:
+            key = pending.pop()
+            for callee, depth in self.edges[key]:
+                value = min(frequency[key] * loop_weight ** depth, cap)
+                if value > frequency.get(callee, 0.0):
+                    frequency[callee] = value
+                    caller[callee] = key
+                    pending.append(callee)
+        return frequency, caller
+
+    def call_path(self, caller, key):
+        names = []
+        seen = set()
+        while key is not None and key not in seen:
+            seen.add(key)
+            names.append(self.functions[key].name)
+            key = caller[key]
+        return " < ".join(names)
+
+
+class RankedSite():
+    def __init__(self, site, function, score):
+        self.site = site
+        self.function = function
+        self.score = score
+
+
+def rank(graph, entries, loop_weight=DEFAULT_LOOP_WEIGHT):
+    """
+    Scores every allocation site reachable from the entries.
+
+    Returns:
+        (RankedSites, highest first, frequency by key, caller by key).
+    """
+    frequency, caller = graph.frequencies(entries, loop_weight)
+    ranked = []
+    for key, function_frequency in frequency.items():
+        function = graph.functions[key]
+        for site in function.sites:
+            ranked.append(RankedSite(site, function, function_frequency * loop_weight ** site.loop_depth))
+    ranked.sort(key=lambda r: (-r.score, r.function.file, r.site.line))
+    return ranked, frequency, caller
+
+
+def print_report(graph, entries, ranked, frequency, caller, top):
+    print("Entry points: " + ", ".join(str(graph.functions[key]) for key in entries))
+    print(f"Reachable functions: {len(frequency)} of {len(graph.functions)}, allocation sites: {len(ranked)}")
+    print()
+
+    rows = ranked[:top]
+    location_width = max([len(f"{r.function.file}:{r.site.line}") for r in rows] + [8]) + 2
+    name_width = max([len(r.function.name) for r in rows] + [8]) + 2
+    print(f"{'rank':>4} {'score':>9}  {'kind':<8}{'loop':>5}  {'location':<{location_width}}"
+          f"{'function':<{name_width}}detail")
+    for i, r in enumerate(rows):
+        location = f"{r.function.file}:{r.site.line}"
+        print(f"{i + 1:>4} {r.score:>9g}  {r.site.kind:<8}{r.site.loop_depth:>5}  {location:<{location_width}}"
+              f"{r.function.name:<{name_width}}{r.site.detail}")
+    print()
+
+    totals = {}
+    for r in ranked:
+        entry = totals.setdefault(r.function.key, {kind: 0.0 for kind in KINDS})
+        entry[r.site.kind] += r.score
+    ordered = sorted(totals.items(), key=lambda item: -sum(item[1].values()))
+
+    print(f"{'rank':>4} {'score':>9}" + "".join(f"{kind:>9}" for kind in KINDS) + f"{'runs':>8}  function, called via")
+    for i, (key, scores) in enumerate(ordered[:top]):
+        function = graph.functions[key]
+        print(f"{i + 1:>4} {sum(scores.values()):>9g}" + "".join(f"{scores[kind]:>9g}" for kind in KINDS)
+              + f"{frequency[key]:>8g}  {graph.call_path(caller, key)} ({function.file}:{function.line})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rank allocations on the mod's per-frame and per-step Lua paths"
+    )
+    parser.add_argument("root", nargs="?", default=str(MAIN_PATH), help="Lua source root, require paths start here")
+    parser.add_argument("--entry", nargs="+", default=list(DEFAULT_ENTRIES),
+                        help="Entry point functions, by full or short name")
+    parser.add_argument("--loop-weight", type=float, default=DEFAULT_LOOP_WEIGHT,
+                        help="Assumed iterations per loop level")
+    parser.add_argument("--top", type=int, default=30, help="Rows per table")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    if not root.is_dir():
+        print(f"Error: Source root not found: {root}", file=sys.stderr)
+        sys.exit(1)
+
+    files = []
+    for path in sorted(root.rglob("*.lua")):
+        try:
+            files.append(parse_file(path, root))
+        except LuaSyntaxError as e:
+            print(f"Warning: Skipping {e}", file=sys.stderr)
+
+    graph = CallGraph(files)
+    entries = []
+    for name in args.entry:
+        found = graph.find(name)
+        if not found:
+            print(f"Warning: No function named {name}", file=sys.stderr)
+        entries.extend(key for key in found if key not in entries)
+    if not entries:
+        print("Error: No entry points found", file=sys.stderr)
+        sys.exit(1)
+
+    ranked, frequency, caller = rank(graph, entries, args.loop_weight)
+    print_report(graph, entries, ranked, frequency, caller, args.top)
+
+
+if __name__ == "__main__":
+    main()
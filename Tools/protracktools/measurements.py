@@ -0,0 +1,170 @@
+"""
+Array-backed TrainMeasurement storage.
+
+Mirrors the layout produced by Utils.WalkTrack (see Main/protrack/utils.lua):
+one TrainMeasurement per simulation step, each holding the origin velocity
+and one TrackMeasurement (g + transform) per follower. Follower 1 is the
+train origin, followers 2.. are the additional offsets passed to WalkTrack.
+"""
+
+from array import array
+
+import numpy as np
+
+# Datastore.tSimulationDelta
+SIMULATION_DELTA = 1.0 / 30.0
+
+# Follower indices as laid out by protrackManager.NewWalk (0 based).
+FOLLOWER_ORIGIN = 0
+FOLLOWER_FRONT = 1
+FOLLOWER_REAR = 2
+
+
+def walk_offsets(train_length):
+    """
+    Returns the follower offsets protrackManager.NewWalk walks with:
+    the origin, then the front and rear of the train at +/- trainLength / 2.
+    """
+    half_length = train_length / 2.0
+    return np.array([0.0, half_length, -half_length])
+
+
+class TrainMeasurements():
+    """
+    Contiguous arrays for a whole ride.
+
+    Attributes:
+        velocity: (T,) origin velocity in m/s.
+        g: (T, F, 3) local G force per follower (x = lateral, y = vertical).
+        position: (T, F, 3) coaster-space position per follower.
+        orientation: (T, F, 4) coaster-space orientation per follower (x, y, z, w).
+        offsets: (F,) track offset of each follower from the origin, in metres.
+        time_delta: Spacing between samples, in seconds.
+        timestamps: (T,) explicit sample times in seconds for rides walked with a
+            variable timestep, or None when samples are time_delta apart.
+    """
+
+    def __init__(self, velocity, g, position, orientation, offsets=None, time_delta=SIMULATION_DELTA,
+                 timestamps=None):
+        self.velocity = np.ascontiguousarray(velocity, dtype=np.float64)
+        self.g = np.ascontiguousarray(g, dtype=np.float64)
+        self.position = np.ascontiguousarray(position, dtype=np.float64)
+        self.orientation = np.ascontiguousarray(orientation, dtype=np.float64)
+        num_followers = self.g.shape[1] if self.g.ndim == 3 else 0
+        if offsets is None:
+            offsets = np.full(num_followers, np.nan)
+        self.offsets = np.asarray(offsets, dtype=np.float64)
+        self.time_delta = float(time_delta)
+        self.timestamps = None if timestamps is None else np.ascontiguousarray(timestamps, dtype=np.float64)
+
+        num_samples = self.velocity.shape[0]
+        arrays = (("g", self.g, 3), ("position", self.position, 3), ("orientation", self.orientation, 4))
+        for name, arr, width in arrays:
+            if arr.ndim != 3 or arr.shape[0] != num_samples or arr.shape[1] != num_followers or arr.shape[2] != width:
+                raise ValueError(f"{name} must have shape ({num_samples}, {num_followers}, {width}), got {arr.shape}")
+        if self.timestamps is not None and self.timestamps.shape != (num_samples,):
+            raise ValueError(f"timestamps must have shape ({num_samples},), got {self.timestamps.shape}")
+
+    def __len__(self):
+        return self.velocity.shape[0]
+
+    def __str__(self):
+        return f"<TrainMeasurements samples={len(self)} followers={self.num_followers} length={self.duration:.2f}s>"
+
+    @property
+    def num_followers(self):
+        return self.g.shape[1]
+
+    @property
+    def duration(self):
+        """ Matches Datastore.GetTimeLength. Timestamped rides end at their last sample. """
+        if self.timestamps is not None:
+            return float(self.timestamps[-1]) if len(self) else 0.0
+        return len(self) * self.time_delta
+
+    @property
+    def times(self):
+        """ Timestamp of every sample, matching Datastore.GetTimeForFloatIndex """
+        if self.timestamps is not None:
+            return self.timestamps
+        return np.arange(len(self), dtype=np.float64) * self.time_delta
+
+    def save(self, path):
+        arrays = {}
+        if self.timestamps is not None:
+            arrays["timestamps"] = self.timestamps
+        np.savez(
+            path,
+            velocity=self.velocity,
+            g=self.g,
+            position=self.position,
+            orientation=self.orientation,
+            offsets=self.offsets,
+            time_delta=np.float64(self.time_delta),
+            **arrays,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["velocity"],
+                data["g"],
+                data["position"],
+                data["orientation"],
+                data["offsets"],
+                float(data["time_delta"]),
+                data["timestamps"] if "timestamps" in data.files else None,
+            )
+
+
+class MeasurementBuilder():
+    """
+    Appends TrainMeasurements one at a time into flat growable buffers,
+    so building a ride of T samples is O(T) without holding Python objects.
+    """
+
+    def __init__(self, num_followers=None):
+        self.num_followers = num_followers
+        self.count = 0
+        self._velocity = array("d")
+        self._g = array("d")
+        self._position = array("d")
+        self._orientation = array("d")
+
+    def append(self, velocity, g, position, orientation):
+        """
+        Appends one TrainMeasurement.
+
+        Args:
+            velocity: Origin velocity.
+            g: Per follower G, flattened to F * 3 floats.
+            position: Per follower positions, flattened to F * 3 floats.
+            orientation: Per follower orientations, flattened to F * 4 floats.
+        """
+        if self.num_followers is None:
+            self.num_followers = len(g) // 3
+
+        self._velocity.append(velocity)
+        self._g.extend(g)
+        self._position.extend(position)
+        self._orientation.extend(orientation)
+        self.count += 1
+
+    def build(self, offsets=None, time_delta=SIMULATION_DELTA, timestamps=None):
+        n = self.count
+        num_followers = self.num_followers or 0
+
+        def to_array(buffer, shape):
+            # Copy so the builder's buffers stay resizable.
+            return np.frombuffer(buffer, dtype=np.float64).copy().reshape(shape) if n else np.empty(shape)
+
+        return TrainMeasurements(
+            to_array(self._velocity, (n,)),
+            to_array(self._g, (n, num_followers, 3)),
+            to_array(self._position, (n, num_followers, 3)),
+            to_array(self._orientation, (n, num_followers, 4)),
+            offsets,
+            time_delta,
+            timestamps,
+        )
@@ -0,0 +1,307 @@
+"""
+Position to time lookup for simulated rides.
+
+Rides are otherwise only navigable by time. RideIndex buckets the segments
+between consecutive follower positions into a uniform grid, so the nearest
+point on the ride to any number of world positions is found in one batched
+pass. Results are float indices with the same meaning as
+Datastore.SampleDatapointAtFloatIndex (0 based, between datapoint floor(i)
+and floor(i) + 1), plus the matching time.
+
+A query searches the cube of cells around it, growing the cube until the
+best match is closer than anything outside it could be. Points far from the
+ride instead bound their distance to every occupied cell, and only check the
+segments in cells that could hold something closer.
+
+Lookups are only microseconds each when batched. Every call to nearest pays
+about 200us of numpy overhead whatever the ride size, so pass all positions
+in one call rather than looping over them.
+
+usage: python -m protracktools.spatial ride.npz --point 10 2 -35 --align other.npz
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from protracktools import fvd
+from protracktools.datastore import Datastore
+from protracktools.measurements import TrainMeasurements, FOLLOWER_ORIGIN
+
+# Default cell size, in mean segment lengths, and its lower bound in m. The bound keeps
+# points a metre or two off densely sampled rides inside the cube searches: with cells
+# sized from the spacing alone they fall back to bounding every cell, which is far slower.
+CELL_SEGMENTS = 4.0
+MIN_CELL_SIZE = 2.0
+# Cube half widths, in cells, searched before falling back to every occupied cell.
+SEARCH_RADII = (1, 2, 4)
+# Queries bounded against every occupied cell at once in the fallback.
+FALLBACK_CHUNK = 64
+
+# One nearest point on the ride.
+NEAREST_DTYPE = np.dtype([
+    ("float_index", np.float64),
+    ("time", np.float64),
+    ("distance", np.float64),
+    ("position", np.float64, (3,)),
+])
+
+
+def _shell_offsets(inner, outer):
+    """ Cell offsets in the cube of half width outer, but not in the one of half width inner """
+    r = np.arange(-outer, outer + 1)
+    offsets = np.stack(np.meshgrid(r, r, r, indexing="ij"), axis=-1).reshape(-1, 3)
+    return offsets[np.abs(offsets).max(axis=1) > inner]
+
+
+# Offsets searched at each of SEARCH_RADII, beyond the previous radius.
+_SHELLS = [_shell_offsets(inner, outer) for inner, outer in zip((-1,) + SEARCH_RADII[:-1], SEARCH_RADII)]
+
+
+def _expand_ranges(starts, counts):
+    """ Concatenates arange(start, start + count) for every range """
+    total = int(counts.sum())
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(total)
+
+
+class RideIndex():
+    """
+    Grid index over one follower's path.
+
+    Args:
+        datastore: Datastore holding the ride.
+        follower: Follower index to index, 0 based.
+        cell_size: Grid cell size in m. Defaults to a few mean segment lengths.
+    """
+
+    def __init__(self, datastore, follower=FOLLOWER_ORIGIN, cell_size=None):
+        if not datastore.has_data():
+            raise ValueError("Indexing requires the datastore to have data! See Datastore.has_data().")
+
+        positions = datastore.datapoints["position"][:, follower]
+        self.datastore = datastore
+        self.follower = follower
+        self.segment_starts = positions[:-1]
+        self.segment_deltas = positions[1:] - positions[:-1]
+        self.segment_lengths_sq = fvd.dot(self.segment_deltas, self.segment_deltas)
+
+        if cell_size is None:
+            mean_length = float(np.mean(np.sqrt(self.segment_lengths_sq)))
+            cell_size = max(CELL_SEGMENTS * mean_length, MIN_CELL_SIZE)
+        self.cell_size = float(cell_size)
+        self.origin = positions.min(axis=0)
+
+        # Every cell a segment's bounding box touches lists that segment.
+        lo = np.minimum(positions[:-1], positions[1:])
+        hi = np.maximum(positions[:-1], positions[1:])
+        cell_lo = np.floor((lo - self.origin) / self.cell_size).astype(np.int64)
+        cell_hi = np.floor((hi - self.origin) / self.cell_size).astype(np.int64)
+        self.shape = cell_hi.max(axis=0) + 1
+
+        span = cell_hi - cell_lo + 1
+        counts = span.prod(axis=1)
+        segments = np.repeat(np.arange(len(span)), counts)
+        local = _expand_ranges(np.zeros(len(span), dtype=np.int64), counts)
+        span_x = span[segments, 0]
+        span_y = span[segments, 1]
+        cells = cell_lo[segments] + np.stack(
+            (local % span_x, (local // span_x) % span_y, local // (span_x * span_y)), axis=-1
+        )
+
+        keys = self._keys(cells)
+        order = np.argsort(keys, kind="stable")
+        self.cell_segments = segments[order]
+        self.cell_keys, self.cell_starts, cell_counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self.cell_ends = self.cell_starts + cell_counts
+
+        nx, ny, nz = self.shape
+        self.cell_corners = self.origin + self.cell_size * np.stack(
+            (self.cell_keys // (ny * nz), (self.cell_keys // nz) % ny, self.cell_keys % nz), axis=-1
+        )
+        # A point on the ride near each cell. Segments only touch their cells' bounding boxes,
+        # so this bounds the distance to the ride where the cell corners can't.
+        centres = self.cell_corners + self.cell_size * 0.5
+        first_segments = self.cell_segments[self.cell_starts]
+        _, t = self._closest(centres, first_segments)
+        self.cell_points = self.segment_starts[first_segments] + self.segment_deltas[first_segments] * t[:, None]
+
+    @classmethod
+    def from_measurements(cls, measurements, follower=FOLLOWER_ORIGIN, cell_size=None):
+        return cls(Datastore.from_measurements(measurements), follower, cell_size)
+
+    def _keys(self, cells):
+        """ Flattens (..., 3) cell coordinates, -1 outside the grid """
+        nx, ny, nz = self.shape
+        inside = np.all((cells >= 0) & (cells < self.shape), axis=-1)
+        keys = (cells[..., 0] * ny + cells[..., 1]) * nz + cells[..., 2]
+        return np.where(inside, keys, -1)
+
+    def _closest(self, points, segments):
+        """ Squared distance and segment fraction of the closest point on each segment """
+        starts = self.segment_starts[segments]
+        deltas = self.segment_deltas[segments]
+        lengths_sq = self.segment_lengths_sq[segments]
+        t = fvd.dot(points - starts, deltas) / np.where(lengths_sq > 0.0, lengths_sq, 1.0)
+        t = np.clip(t, 0.0, 1.0)
+        offset = starts + deltas * t[..., None] - points
+        return fvd.dot(offset, offset), t
+
+    def _check(self, points, queries, segments, best):
+        """
+        Checks candidate segments, updating best = (squared distances, segments, fractions) in place.
+        queries must be non decreasing.
+        """
+        if len(queries) == 0:
+            return
+        dist_sq, t = self._closest(points[queries], segments)
+
+        # Closest candidate per query.
+        groups = np.flatnonzero(np.concatenate(([True], queries[1:] != queries[:-1])))
+        group_min = np.minimum.reduceat(dist_sq, groups)
+        hits = np.flatnonzero(dist_sq == np.repeat(group_min, np.diff(np.append(groups, len(queries)))))
+        first = hits[np.concatenate(([True], queries[hits[1:]] != queries[hits[:-1]]))]
+
+        q = queries[first]
+        better = dist_sq[first] < best[0][q]
+        q = q[better]
+        first = first[better]
+        best[0][q] = dist_sq[first]
+        best[1][q] = segments[first]
+        best[2][q] = t[first]
+
+    def _search_cells(self, points, cells, offsets, best):
+        """ Checks every segment listed in the given cell offsets around each point """
+        keys = self._keys(cells[:, None, :] + offsets[None, :, :])
+        slots = np.clip(np.searchsorted(self.cell_keys, keys), 0, len(self.cell_keys) - 1)
+        found = (keys >= 0) & (self.cell_keys[slots] == keys)
+        starts = self.cell_starts[slots][found]
+        counts = self.cell_ends[slots][found] - starts
+
+        queries = np.repeat(np.nonzero(found)[0], counts)
+        self._check(points, queries, self.cell_segments[_expand_ranges(starts, counts)], best)
+
+    def _search_all_cells(self, points, best):
+        """
+        Checks the segments of every cell that could hold the closest point: those
+        whose box is nearer than the nearest of the cells' points on the ride.
+        """
+        lower = np.maximum(self.cell_corners - points[:, None, :], 0.0)
+        lower = np.maximum(lower, points[:, None, :] - (self.cell_corners + self.cell_size))
+        lower_sq = fvd.dot(lower, lower)
+        to_ride = self.cell_points - points[:, None, :]
+        upper_sq = np.minimum(fvd.dot(to_ride, to_ride).min(axis=1), best[0])
+
+        queries, cells = np.nonzero(lower_sq <= upper_sq[:, None])
+        starts = self.cell_starts[cells]
+        counts = self.cell_ends[cells] - starts
+        queries = np.repeat(queries, counts)
+        self._check(points, queries, self.cell_segments[_expand_ranges(starts, counts)], best)
+
+    def nearest(self, points):
+        """
+        Finds the closest point on the ride to each of points.
+
+        Args:
+            points: (N, 3) positions, in the same space as the ride.
+
+        Returns:
+            (N,) array of NEAREST_DTYPE.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        num_points = len(points)
+        best_dist_sq = np.full(num_points, np.inf)
+        best_segment = np.zeros(num_points, dtype=np.int64)
+        best_t = np.zeros(num_points)
+
+        scaled = (points - self.origin) / self.cell_size
+        cells = np.floor(scaled).astype(np.int64)
+        fraction = scaled - cells
+        # Distance to the nearest face of the point's own cell.
+        margin = np.minimum(fraction, 1.0 - fraction).min(axis=1) * self.cell_size
+
+        pending = np.arange(num_points)
+        for radius, offsets in zip(SEARCH_RADII, _SHELLS):
+            best = (best_dist_sq[pending], best_segment[pending], best_t[pending])
+            self._search_cells(points[pending], cells[pending], offsets, best)
+            best_dist_sq[pending], best_segment[pending], best_t[pending] = best
+
+            # Segments not found lie wholly outside the searched cube.
+            bound = radius * self.cell_size + margin[pending]
+            pending = pending[best_dist_sq[pending] > bound * bound]
+            if len(pending) == 0:
+                break
+
+        for start in range(0, len(pending), FALLBACK_CHUNK):
+            chunk = pending[start:start + FALLBACK_CHUNK]
+            best = (best_dist_sq[chunk], best_segment[chunk], best_t[chunk])
+            self._search_all_cells(points[chunk], best)
+            best_dist_sq[chunk], best_segment[chunk], best_t[chunk] = best
+
+        out = np.empty(num_points, dtype=NEAREST_DTYPE)
+        out["float_index"] = best_segment + best_t
+        out["time"] = self.datastore.get_time_for_float_index(out["float_index"])
+        out["distance"] = np.sqrt(best_dist_sq)
+        out["position"] = self.segment_starts[best_segment] + self.segment_deltas[best_segment] * best_t[:, None]
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Look up ride times from positions, or align another ride against this one"
+    )
+    parser.add_argument("ride", help="Path to the ride .npz to index")
+    parser.add_argument("--follower", type=int, default=FOLLOWER_ORIGIN, help="Follower to index, 0 based")
+    parser.add_argument("--cell-size", type=float, help="Grid cell size in m")
+    parser.add_argument("--point", type=float, nargs=3, action="append", metavar=("X", "Y", "Z"),
+                        help="Position to look up, may be repeated")
+    parser.add_argument("--align", help="Another ride .npz to map onto this one, sample by sample")
+    args = parser.parse_args()
+
+    paths = [Path(args.ride)] + ([Path(args.align)] if args.align else [])
+    for path in paths:
+        if not path.exists():
+            print(f"Error: Ride not found: {path}", file=sys.stderr)
+            sys.exit(1)
+
+    ride = TrainMeasurements.load(paths[0])
+    if not 0 <= args.follower < ride.num_followers:
+        print(f"Error: Follower {args.follower} out of range, the ride has {ride.num_followers}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        start = time.perf_counter()
+        index = RideIndex.from_measurements(ride, args.follower, args.cell_size)
+        build_time = time.perf_counter() - start
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{ride}, {len(index.cell_keys)} cells of {index.cell_size:.2f}m, built in {build_time * 1000.0:.1f}ms")
+
+    if args.point:
+        found = index.nearest(args.point)
+        samples = index.datastore.sample_at_float_indices(found["float_index"], [args.follower])[:, 0]
+        print(f"{'point':<30}{'index':>10}{'time':>9}{'dist':>8}{'lat G':>8}{'vert G':>8}{'speed':>8}")
+        for point, hit, sample in zip(args.point, found, samples):
+            label = "(" + ", ".join(f"{v:g}" for v in point) + ")"
+            print(f"{label:<30}{hit['float_index']:>10.2f}{hit['time']:>8.2f}s{hit['distance']:>7.2f}m"
+                  f"{sample['g'][0]:>8.2f}{sample['g'][1]:>8.2f}{sample['speed']:>8.2f}")
+
+    if args.align:
+        other = TrainMeasurements.load(paths[1])
+        follower = min(args.follower, other.num_followers - 1)
+        start = time.perf_counter()
+        found = index.nearest(other.position[:, follower])
+        query_time = time.perf_counter() - start
+        offsets = found["time"] - other.times
+        print(f"Aligned {len(other)} samples in {query_time * 1000.0:.1f}ms "
+              f"({query_time / len(other) * 1e6:.2f}us each)")
+        print(f"  distance: mean {found['distance'].mean():.3f}m, max {found['distance'].max():.3f}m")
+        print(f"  time offset: mean {offsets.mean():+.3f}s, min {offsets.min():+.3f}s, max {offsets.max():+.3f}s")
+
+
+if __name__ == "__main__":
+    main()
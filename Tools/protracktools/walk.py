@@ -0,0 +1,621 @@
+"""
+Offline port of Utils.WalkTrack (Main/protrack/utils.lua), with an adaptive timestep.
+
+WalkTrack always steps at Datastore.tSimulationDelta. Slow sections spend
+steps where nothing changes, while fast transitions are under resolved for the
+finite difference heartline acceleration. walk_track_adaptive picks each step
+by step doubling: a full step and two half steps are taken from the same
+state, and the G missed between samples plus the velocity difference between
+the two is the error estimate. Rides walked this way carry explicit
+timestamps, which Datastore binary searches.
+
+Offline there is no TrackLib, so the track is rebuilt from a recorded ride:
+positions and up vectors are interpolated along arc length smoothly enough
+for the heartline to be differenced twice.
+
+usage: python -m protracktools.walk ride.npz --tolerance 0.02 0.05 0.1
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from protracktools import fvd
+from protracktools.datastore import Datastore
+from protracktools.measurements import (
+    TrainMeasurements,
+    MeasurementBuilder,
+    SIMULATION_DELTA,
+    FOLLOWER_ORIGIN,
+    walk_offsets,
+)
+
+# Utils.WalkTrack gravity
+GRAVITY = 9.81
+# kg/m^3, as used by StepVelocity
+AIR_DENSITY = 1.225
+
+DEFAULT_TOLERANCE = 0.05
+
+
+class FrictionValues():
+    """
+    FrictionHelper.GetFrictionValues.
+
+    Args:
+        static_friction: Static friction.
+        air_resistance: Air resistance, premultiplied by 1 / mass.
+        dynamic_friction: Dynamic friction.
+        friction_multiplier: The ride's friction multiplier.
+    """
+
+    def __init__(self, static_friction=0.0, air_resistance=0.0, dynamic_friction=0.0, friction_multiplier=1.0):
+        self.static_friction = static_friction
+        self.air_resistance = air_resistance
+        self.dynamic_friction = dynamic_friction
+        self.friction_multiplier = friction_multiplier
+
+    def __str__(self):
+        return (f"<FrictionValues static={self.static_friction:g} air={self.air_resistance:g} "
+                f"dynamic={self.dynamic_friction:g} multiplier={self.friction_multiplier:g}>")
+
+
+def velocity_acceleration(velocity, forward_y, g_length, friction):
+    """
+    Acceleration along the track from StepVelocity: slope minus friction and drag.
+    Broadcasts over all arguments, including the friction values.
+
+    Args:
+        velocity: Origin velocity in m/s.
+        forward_y: Y component of the origin's forward vector.
+        g_length: Length of the origin's local G.
+        friction: FrictionValues.
+    """
+    slope_accel = GRAVITY * -forward_y
+    g_drag_multiplier = np.minimum(g_length, 1.0)
+    air_resist = 0.5 * AIR_DENSITY * (velocity * velocity) * friction.air_resistance
+    friction_accel = ((friction.dynamic_friction * g_drag_multiplier * GRAVITY + air_resist)
+                      * friction.friction_multiplier)
+    return slope_accel - friction_accel
+
+
+def _quintic_weights(u, seg):
+    """ Quintic Hermite weights for value, slope and curvature at both ends of a segment """
+    u2 = u * u
+    u3 = u2 * u
+    u4 = u3 * u
+    u5 = u4 * u
+    seg2 = seg * seg
+    return (
+        1.0 - 10.0 * u3 + 15.0 * u4 - 6.0 * u5,
+        (u - 6.0 * u3 + 8.0 * u4 - 3.0 * u5) * seg,
+        (0.5 * u2 - 1.5 * u3 + 1.5 * u4 - 0.5 * u5) * seg2,
+        10.0 * u3 - 15.0 * u4 + 6.0 * u5,
+        (-4.0 * u3 + 7.0 * u4 - 3.0 * u5) * seg,
+        (0.5 * u3 - u4 + 0.5 * u5) * seg2,
+    )
+
+
+class TrackPath():
+    """
+    A track parameterised by distance, standing in for a TrackLib track origin.
+
+    Positions and up vectors are quintic Hermite interpolated, matching the
+    slope and curvature estimated at the recorded points, so heartline
+    positions are smooth enough to difference twice.
+
+    Args:
+        positions: (N, 3) track positions.
+        orientations: (N, 4) track orientations (x, y, z, w).
+    """
+
+    def __init__(self, positions, orientations):
+        positions = np.asarray(positions, dtype=np.float64)
+        orientations = np.asarray(orientations, dtype=np.float64)
+
+        seg = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+        keep = np.concatenate(([True], seg > 1e-9))
+        positions = positions[keep]
+        if len(positions) < 2:
+            raise ValueError("Track path needs at least 2 distinct positions")
+
+        self.segment_lengths = seg[keep[1:]]
+        self.distances = np.concatenate(([0.0], np.cumsum(self.segment_lengths)))
+        self.length = float(self.distances[-1])
+
+        tangents, _, ups = fvd.frame_from_quaternion(orientations[keep])
+        self.tangents = tangents
+
+        def derivative(values):
+            return np.gradient(values, self.distances, axis=0, edge_order=2)
+
+        curvatures = derivative(tangents)
+        up_slopes = derivative(ups)
+        self.position_knots = (positions, tangents, curvatures)
+        self.up_knots = (ups, up_slopes, derivative(up_slopes))
+        self.tangent_knots = (tangents, curvatures, derivative(curvatures))
+
+    @classmethod
+    def from_measurements(cls, ride, follower=FOLLOWER_ORIGIN):
+        return cls(ride.position[:, follower], ride.orientation[:, follower])
+
+    def sample_frames(self, distance):
+        """
+        Samples the track at distances along it. Past either end the track
+        carries on around the circle it ends on, so followers ahead of or
+        behind the recording don't see a jump in G where it runs out.
+
+        Returns:
+            (positions, forward, right, up), each (..., 3).
+        """
+        distance = np.asarray(distance, dtype=np.float64)
+        overshoot = distance - np.clip(distance, 0.0, self.length)
+        distance = distance - overshoot
+        i = np.clip(np.searchsorted(self.distances, distance, side="right") - 1, 0, len(self.distances) - 2)
+        weights = _quintic_weights((distance - self.distances[i]) / self.segment_lengths[i], self.segment_lengths[i])
+
+        def interpolate(knots):
+            value, slope, curvature = knots
+            ends = (value[i], slope[i], curvature[i], value[i + 1], slope[i + 1], curvature[i + 1])
+            return sum(weight[..., None] * end for weight, end in zip(weights, ends))
+
+        positions = interpolate(self.position_knots)
+        forward = fvd.normalised(interpolate(self.tangent_knots))
+        up = interpolate(self.up_knots)
+        up = fvd.normalised(up - forward * fvd.dot(up, forward)[..., None])
+
+        past_end = (overshoot > 0.0)[..., None]
+        tangent = np.where(past_end, self.tangents[-1], self.tangents[0])
+        curvature = np.where(past_end, self.position_knots[2][-1], self.position_knots[2][0])
+        curvature = curvature - tangent * fvd.dot(curvature, tangent)[..., None]
+        bend = np.sqrt(fvd.dot(curvature, curvature))
+        normal = curvature / np.maximum(bend, 1e-12)[..., None]
+        angle = bend * overshoot
+        # sin(angle) / bend and (1 - cos(angle)) / bend, finite on straights.
+        along = overshoot * np.sinc(angle / np.pi)
+        across = 0.5 * overshoot * angle * np.sinc(angle / (2.0 * np.pi)) ** 2
+        positions += tangent * along[..., None] + normal * across[..., None]
+
+        axis = fvd.cross(tangent, normal)
+        forward = fvd.rotate(axis, angle, forward)
+        up = fvd.rotate(axis, angle, up)
+        return positions, forward, fvd.cross(up, forward), up
+
+    def sample(self, distance):
+        """
+        Samples the track at distances along it.
+
+        Returns:
+            (positions (..., 3), orientations (..., 4)).
+        """
+        positions, forward, right, up = self.sample_frames(distance)
+        return positions, fvd.quaternion_from_frame(forward, right, up)
+
+
+class WalkState():
+    """
+    TrainState, with every follower's TrackState held in (F, 3) arrays.
+
+    Attributes:
+        time: Time of this state in seconds.
+        distance: Origin distance along the track.
+        velocity: Origin velocity.
+        position, orientation: (F, 3) and (F, 4) track transforms.
+        forward: (F, 3) track forward vectors.
+        heartline_position, heartline_velocity: (F, 3) world space heartline state.
+        g: (F, 3) local G.
+    """
+
+    def __init__(self, time, distance, velocity, position, orientation, forward,
+                 heartline_position, heartline_velocity, g):
+        self.time = time
+        self.distance = distance
+        self.velocity = velocity
+        self.position = position
+        self.orientation = orientation
+        self.forward = forward
+        self.heartline_position = heartline_position
+        self.heartline_velocity = heartline_velocity
+        self.g = g
+
+
+def start_state(path, offsets, speed, start_g, heartline_offset, start_distance=0.0):
+    """ GetStartingTrainState """
+    offsets = np.asarray(offsets, dtype=np.float64)
+    position, forward, right, up = path.sample_frames(start_distance + offsets)
+    return WalkState(
+        0.0,
+        float(start_distance),
+        float(speed),
+        position,
+        fvd.quaternion_from_frame(forward, right, up),
+        forward,
+        position + up * heartline_offset,
+        forward * speed,
+        np.broadcast_to(np.asarray(start_g, dtype=np.float64), position.shape).copy(),
+    )
+
+
+def step_state(path, state, offsets, friction, heartline_offset, time_step):
+    """
+    StepVelocity, WalkTrainState and StepTrainState for one step.
+
+    Returns:
+        The next WalkState.
+    """
+    g_length = np.sqrt(fvd.dot(state.g[FOLLOWER_ORIGIN], state.g[FOLLOWER_ORIGIN]))
+    accel = velocity_acceleration(state.velocity, state.forward[FOLLOWER_ORIGIN, 1], g_length, friction)
+    next_velocity = state.velocity + accel * time_step
+
+    distance = state.distance + state.velocity * time_step
+    position, forward, right, up = path.sample_frames(distance + offsets)
+
+    heartline_position = position + up * heartline_offset
+    heartline_velocity = (heartline_position - state.heartline_position) / time_step
+    accel_ws = (heartline_velocity - state.heartline_velocity) / time_step
+    accel_ws[:, 1] += GRAVITY
+
+    # ToLocalDir: x is lateral, y is vertical, z is longitudinal.
+    g = np.stack((fvd.dot(accel_ws, right), fvd.dot(accel_ws, up), fvd.dot(accel_ws, forward)), axis=-1) / GRAVITY
+    return WalkState(
+        state.time + time_step,
+        float(distance),
+        float(next_velocity),
+        position,
+        fvd.quaternion_from_frame(forward, right, up),
+        forward,
+        heartline_position,
+        heartline_velocity,
+        g,
+    )
+
+
+class WalkResult():
+    """
+    A walked ride and what it cost.
+
+    Attributes:
+        measurements: TrainMeasurements, timestamped for adaptive walks.
+        evaluations: Number of step_state or track_g calls made.
+        rejected: Number of adaptive steps retried with a smaller step.
+    """
+
+    def __init__(self, measurements, evaluations, rejected=0):
+        self.measurements = measurements
+        self.evaluations = evaluations
+        self.rejected = rejected
+
+    def __str__(self):
+        return (f"<WalkResult samples={len(self.measurements)} evaluations={self.evaluations} "
+                f"rejected={self.rejected} length={self.measurements.duration:.2f}s>")
+
+
+def walk_track(path, offsets, speed, start_g, friction, heartline_offset=0.0, time_step=SIMULATION_DELTA,
+               start_distance=0.0, max_time=600.0):
+    """
+    Utils.WalkTrack at a fixed timestep.
+
+    Args:
+        path: TrackPath to walk.
+        offsets: (F,) follower offsets, including the origin's 0.
+        speed: Starting speed.
+        start_g: Starting local G.
+        friction: FrictionValues.
+        heartline_offset: Heartline height in m.
+        time_step: The timestep of the simulation.
+        start_distance: Origin distance along the path to start from.
+        max_time: Stop after this long, for frictionless loops.
+
+    Returns:
+        WalkResult.
+    """
+    offsets = np.asarray(offsets, dtype=np.float64)
+    state = start_state(path, offsets, speed, start_g, heartline_offset, start_distance)
+    builder = MeasurementBuilder()
+    evaluations = 0
+
+    while state.velocity > 0.0 and state.time <= max_time:
+        next_state = step_state(path, state, offsets, friction, heartline_offset, time_step)
+        evaluations += 1
+        if next_state.velocity < 0.0:
+            break
+
+        # Valid spot, record this point.
+        builder.append(state.velocity, state.g.ravel(), state.position.ravel(), state.orientation.ravel())
+
+        # Exit if we walked off the end of the track.
+        if next_state.distance > path.length:
+            break
+        state = next_state
+
+    if builder.count == 0:
+        raise ValueError("Walk produced no samples, the train doesn't move from the start")
+    measurements = builder.build(offsets, time_step)
+    if len(measurements) >= 2:
+        # Quick patch from WalkTrack: the first G is replaced by the second.
+        measurements.g[0] = measurements.g[1]
+    return WalkResult(measurements, evaluations)
+
+
+def track_g(path, distance, velocity, accel, offsets, heartline_offset=0.0, probe_time=SIMULATION_DELTA / 8.0):
+    """
+    G at the heartline for trains at any number of track distances, in one batch.
+
+    Rather than differencing against the previous step like WalkTrack, each
+    heartline is sampled probe_time either side of the train along the track
+    and the centred second difference gives the acceleration, so the result
+    doesn't depend on the walk's timestep. Longitudinal acceleration is added
+    along the track direction.
+
+    Where the probes would straddle an end of the path, where the recording
+    gives way to its extension, they are shifted to the follower's side of it
+    and the second difference is taken one sided.
+
+    Args:
+        path: TrackPath.
+        distance: (N,) origin distances.
+        velocity: (N,) origin velocities.
+        accel: (N,) origin accelerations along the track.
+        offsets: (F,) follower offsets.
+        heartline_offset: Heartline height in m.
+        probe_time: Time either side of each train to sample.
+
+    Returns:
+        (g (N, F, 3), positions (N, F, 3), orientations (N, F, 4)) at the given distances.
+    """
+    distance = np.asarray(distance, dtype=np.float64)
+    velocity = np.asarray(velocity, dtype=np.float64)
+    follower_distance = distance[:, None] + offsets[None, :]
+    reach = (velocity * probe_time)[:, None]
+    at_start = (follower_distance - reach < 0.0) & (follower_distance + reach > 0.0)
+    at_end = (follower_distance - reach < path.length) & (follower_distance + reach > path.length)
+    shift = np.where(at_start, np.where(follower_distance < 0.0, -1, 1), 0)
+    shift = np.where(at_end & ~at_start, np.where(follower_distance > path.length, 1, -1), shift)
+
+    probes = (shift[..., None] + np.array([-1, 0, 1])) * reach[..., None]
+    position, forward, right, up = path.sample_frames(follower_distance[..., None] + probes)
+
+    heartline = position + up * heartline_offset
+    # The probe at the follower itself
+    centre = (1 - shift)[..., None, None]
+    position, forward, right, up = (
+        np.take_along_axis(v, centre, axis=2)[:, :, 0] for v in (position, forward, right, up)
+    )
+    accel_ws = (heartline[:, :, 2] - 2.0 * heartline[:, :, 1] + heartline[:, :, 0]) / (probe_time * probe_time)
+    accel_ws += forward * np.asarray(accel, dtype=np.float64)[:, None, None]
+    accel_ws[..., 1] += GRAVITY
+
+    g = np.stack((fvd.dot(accel_ws, right), fvd.dot(accel_ws, up), fvd.dot(accel_ws, forward)), axis=-1) / GRAVITY
+    return g, position, fvd.quaternion_from_frame(forward, right, up)
+
+
+def walk_track_adaptive(path, offsets, speed, start_g, friction, heartline_offset=0.0, tolerance=DEFAULT_TOLERANCE,
+                        min_step=SIMULATION_DELTA / 8.0, max_step=SIMULATION_DELTA * 8.0, start_distance=0.0,
+                        max_time=600.0):
+    """
+    Utils.WalkTrack with step doubling on the heartline acceleration.
+
+    WalkTrack's G differences the heartline against the last two steps, so
+    it would change with the timestep and lag by a step. Here G comes from
+    track_g instead, and the timestep only decides where samples are taken.
+
+    Each step is taken once at h and twice at h / 2. The error is the larger of
+      - how far the G half way along is from the lerp of the G at either end,
+        i.e. what Datastore sampling would miss between the two samples,
+      - the velocity difference between the two, as a longitudinal G.
+    Steps with error above tolerance are retried smaller. Otherwise the
+    distance and velocity are extrapolated from both (2 * halves - full),
+    which takes the velocity integration to second order, and h scales with
+    the square root of tolerance / error. A jump in G, like a curve entered
+    without a transition, gives an error no step can shrink, so steps
+    across one are retried down to min_step.
+
+    Args:
+        tolerance: Largest error accepted per step in G, on any follower and axis.
+        min_step: Smallest timestep. Steps this small are always accepted.
+        max_step: Largest timestep.
+        Remaining arguments are as walk_track.
+
+    Returns:
+        WalkResult with timestamped measurements. Evaluations count the
+        track_g calls, which dominate the cost.
+    """
+    offsets = np.asarray(offsets, dtype=np.float64)
+    probe_time = min_step
+
+    def acceleration(velocity, g, orientation):
+        """ StepVelocity's acceleration at a sampled spot """
+        forward_y = fvd.frame_from_quaternion(orientation[FOLLOWER_ORIGIN])[0][1]
+        g_length = np.sqrt(fvd.dot(g[FOLLOWER_ORIGIN], g[FOLLOWER_ORIGIN]))
+        return float(velocity_acceleration(velocity, forward_y, g_length, friction))
+
+    def sample(distance, velocity, accel):
+        g, position, orientation = track_g(path, [distance], [velocity], [accel], offsets, heartline_offset, probe_time)
+        return g[0], position[0], orientation[0]
+
+    # The starting G is measured rather than walked, so it only feeds the first friction value.
+    _, position, orientation = sample(start_distance, speed, 0.0)
+    accel = acceleration(speed, np.broadcast_to(start_g, offsets.shape + (3,)), orientation)
+    g, position, orientation = sample(start_distance, speed, accel)
+    time, distance, velocity = 0.0, float(start_distance), float(speed)
+
+    builder = MeasurementBuilder()
+    times = []
+    step = float(np.clip(SIMULATION_DELTA, min_step, max_step))
+    evaluations = 2
+    rejected = 0
+
+    while velocity > 0.0 and time <= max_time:
+        accel = acceleration(velocity, g, orientation)
+        half_step = step * 0.5
+
+        # StepVelocity and WalkTrainState, once at h and twice at h / 2.
+        full_distance = distance + velocity * step
+        full_velocity = velocity + accel * step
+        half_distance = distance + velocity * half_step
+        half_velocity = velocity + accel * half_step
+        half_g, _, half_orientation = sample(half_distance, half_velocity, accel)
+        half_accel = acceleration(half_velocity, half_g, half_orientation)
+        end_distance = half_distance + half_velocity * half_step
+        end_velocity = half_velocity + half_accel * half_step
+
+        next_distance = 2.0 * end_distance - full_distance
+        next_velocity = 2.0 * end_velocity - full_velocity
+        next_g, next_position, next_orientation = sample(next_distance, next_velocity, half_accel)
+        evaluations += 2
+
+        g_error = float(np.abs(half_g - 0.5 * (g + next_g)).max())
+        velocity_error = abs(end_velocity - full_velocity) / (GRAVITY * step)
+        error = max(g_error, velocity_error)
+        scale = 0.9 * np.sqrt(tolerance / error) if error > 0.0 else 2.0
+        if error > tolerance and step > min_step:
+            rejected += 1
+            step = max(step * float(np.clip(scale, 0.2, 0.9)), min_step)
+            continue
+
+        # The same exits as WalkTrack, recording this state first if it walked off the track.
+        if next_velocity < 0.0:
+            break
+        builder.append(velocity, g.ravel(), position.ravel(), orientation.ravel())
+        times.append(time)
+        if next_distance > path.length:
+            break
+
+        time += step
+        distance, velocity = next_distance, next_velocity
+        g, position, orientation = next_g, next_position, next_orientation
+        step = float(np.clip(step * np.clip(scale, 0.5, 2.0), min_step, max_step))
+
+    if builder.count == 0:
+        raise ValueError("Adaptive walk produced no samples, the train doesn't move from the start")
+    return WalkResult(builder.build(offsets, SIMULATION_DELTA, times), evaluations, rejected)
+
+
+def reference_g(path, measurements, heartline_offset=0.0, start_distance=0.0):
+    """
+    Replaces the G of a fixed step walk with track_g along the same trajectory.
+
+    WalkTrack's G differences against the steps before it, so it lags half
+    a step and starts with a patched, transient first sample. Comparing
+    walks against track_g instead puts every walk on the same estimator.
+    Distances and accelerations are rebuilt the way step_state integrates them.
+
+    Args:
+        path: TrackPath the walk was taken on.
+        measurements: TrainMeasurements from walk_track.
+        heartline_offset: Heartline height in m.
+        start_distance: Origin distance the walk started from.
+
+    Returns:
+        TrainMeasurements.
+    """
+    velocity = measurements.velocity
+    time_delta = measurements.time_delta
+    distance = start_distance + np.concatenate(([0.0], np.cumsum(velocity[:-1]) * time_delta))
+    accel = np.diff(velocity) / time_delta
+    accel = np.append(accel, accel[-1:] if len(accel) else 0.0)
+    g, _, _ = track_g(path, distance, velocity, accel, measurements.offsets, heartline_offset)
+    return TrainMeasurements(velocity, g, measurements.position, measurements.orientation, measurements.offsets,
+                             time_delta, measurements.timestamps)
+
+
+def g_error(measurements, reference, follower=FOLLOWER_ORIGIN):
+    """
+    Compares G against a reference walk, sampling measurements at every
+    reference sample the way Datastore would, so detail lost between samples counts.
+
+    Args:
+        measurements: TrainMeasurements to check.
+        reference: TrainMeasurements walked with a fine fixed timestep, see reference_g.
+        follower: Follower to compare.
+
+    Returns:
+        (max, rms) G error, over all axes.
+    """
+    times = reference.times
+    # Skip anything past the end of measurements.
+    keep = times <= measurements.times[-1]
+    samples = Datastore.from_measurements(measurements).sample_at_times(times[keep], [follower])
+    error = np.linalg.norm(samples["g"][:, 0] - reference.g[keep, follower], axis=-1)
+    if len(error) == 0:
+        return 0.0, 0.0
+    return float(error.max()), float(np.sqrt(np.mean(error * error)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rewalk a recorded ride with adaptive timesteps and compare cost and G error to fixed steps"
+    )
+    parser.add_argument("ride", help="Path to the ride .npz from protracktools.logparse")
+    parser.add_argument("--tolerance", type=float, nargs="+", default=[DEFAULT_TOLERANCE],
+                        help="Per step G tolerances to try")
+    parser.add_argument("--reference-divisions", type=int, default=8,
+                        help="Reference timestep is the simulation delta divided by this")
+    parser.add_argument("--heartline", type=float, default=0.0, help="Heartline offset in m")
+    parser.add_argument("--train-length", type=float,
+                        help="Train length in m, for rides recorded without follower offsets")
+    parser.add_argument("--air-resistance", type=float, default=0.0, help="Air resistance, premultiplied by 1 / mass")
+    parser.add_argument("--dynamic-friction", type=float, default=0.0, help="Dynamic friction")
+    parser.add_argument("--friction-multiplier", type=float, default=1.0, help="Ride friction multiplier")
+    parser.add_argument("-o", "--output", help="Save the last adaptive walk to this .npz")
+    args = parser.parse_args()
+
+    ride_path = Path(args.ride)
+    if not ride_path.exists():
+        print(f"Error: Ride not found: {ride_path}", file=sys.stderr)
+        sys.exit(1)
+
+    ride = TrainMeasurements.load(ride_path)
+    try:
+        path = TrackPath.from_measurements(ride)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    offsets = ride.offsets
+    if args.train_length is not None:
+        offsets = walk_offsets(args.train_length)
+        if len(offsets) != ride.num_followers:
+            print(f"Error: --train-length gives {len(offsets)} followers, the ride has {ride.num_followers}",
+                  file=sys.stderr)
+            sys.exit(1)
+    elif np.isnan(offsets).any():
+        print("Error: Ride has no follower offsets, pass --train-length", file=sys.stderr)
+        sys.exit(1)
+
+    friction = FrictionValues(0.0, args.air_resistance, args.dynamic_friction, args.friction_multiplier)
+    walk_args = (path, offsets, ride.velocity[0], ride.g[0, FOLLOWER_ORIGIN], friction, args.heartline)
+
+    try:
+        reference = walk_track(*walk_args, time_step=SIMULATION_DELTA / args.reference_divisions)
+        fixed = walk_track(*walk_args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    reference_measurements = reference_g(path, reference.measurements, args.heartline)
+    print(f"Track: {path.length:.1f}m, {friction}")
+    print(f"{'walk':<22}{'samples':>9}{'evals':>9}{'evals saved':>13}{'max G err':>11}{'rms G err':>11}")
+
+    def print_row(label, result, errors):
+        # Adaptive walks evaluate the track several times per sample kept, so the cost is evaluations.
+        saved = 1.0 - result.evaluations / fixed.evaluations
+        print(f"{label:<22}{len(result.measurements):>9}{result.evaluations:>9}{saved:>12.0%}"
+              f"{errors[0]:>11.4f}{errors[1]:>11.4f}")
+
+    print_row(f"reference 1/{round(1.0 / (SIMULATION_DELTA / args.reference_divisions))}s", reference, (0.0, 0.0))
+    print_row(f"fixed 1/{round(1.0 / SIMULATION_DELTA)}s", fixed, g_error(fixed.measurements, reference_measurements))
+
+    adaptive = None
+    for tolerance in args.tolerance:
+        adaptive = walk_track_adaptive(*walk_args, tolerance=tolerance)
+        print_row(f"adaptive {tolerance:g}G", adaptive, g_error(adaptive.measurements, reference_measurements))
+
+    if args.output and adaptive is not None:
+        adaptive.measurements.save(args.output)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()